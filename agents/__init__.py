@@ -1,3 +1,10 @@
-from agents.ollama_agent import OllamaConfig, run_resume_agent
+from agents.async_agent import run_resume_agent_async, run_resume_agent_stream_async
+from agents.ollama_agent import OllamaConfig, run_resume_agent, run_resume_agent_stream
 
-__all__ = ["OllamaConfig", "run_resume_agent"]
+__all__ = [
+    "OllamaConfig",
+    "run_resume_agent",
+    "run_resume_agent_async",
+    "run_resume_agent_stream",
+    "run_resume_agent_stream_async",
+]
@@ -0,0 +1,265 @@
+"""Admission control in front of Ollama: one concurrency limit and priority queue shared by every process."""
+
+from __future__ import annotations
+
+import asyncio
+import itertools
+import math
+import os
+import socket
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Callable, Iterator
+
+from agents.concurrency import ADAPTIVE_CONCURRENCY
+from agents.router import routers_capacity
+from core.db import (
+    claim_admission_slot,
+    fetch_admission_counts,
+    heartbeat_admission,
+    release_admission,
+)
+
+PRIORITIES = {"interactive": 0, "batch": 10}
+ADMISSION_MAX_CONCURRENCY = int(os.getenv("OLLAMA_MAX_CONCURRENCY", "2"))
+ADMISSION_MAX_WAIT_SECONDS = float(os.getenv("OLLAMA_MAX_QUEUE_WAIT_SECONDS", "30"))
+ADMISSION_POLL_SECONDS = 0.1
+ADMISSION_HEARTBEAT_SECONDS = 5.0
+ADMISSION_STALE_SECONDS = 30.0
+INITIAL_SERVICE_SECONDS = 15.0
+SERVICE_EWMA_ALPHA = 0.2
+
+
+class AdmissionRejected(RuntimeError):
+    def __init__(self, estimated_wait: float, retry_after: int):
+        super().__init__(
+            f"Ollama ocupado: espera estimada de {estimated_wait:.0f}s. Tente novamente em {retry_after}s."
+        )
+        self.estimated_wait = estimated_wait
+        self.retry_after = retry_after
+
+
+def _owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        max_concurrency: int,
+        max_wait_seconds: float,
+        capacity: Callable[[], int | None] | None = None,
+    ):
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.max_wait_seconds = float(max_wait_seconds)
+        self._capacity = capacity
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._tickets: dict[str, tuple[str, int]] = {}
+        self._seq = itertools.count()
+        self._heartbeat: threading.Thread | None = None
+        self._service_seconds = INITIAL_SERVICE_SECONDS
+        self._admitted = 0
+        self._rejected = 0
+        self._completed = 0
+        self._max_queue_depth = 0
+
+    def _limit(self) -> int:
+        if self._capacity is None:
+            return self.max_concurrency
+        try:
+            limit = self._capacity()
+        except Exception:
+            limit = None
+        return max(1, min(int(limit), self.max_concurrency)) if limit is not None else self.max_concurrency
+
+    def _running_locked(self) -> int:
+        return sum(1 for state, _ in self._tickets.values() if state == "running")
+
+    def _local_counts(self) -> dict[str, Any]:
+        with self._lock:
+            running, active = self._running_locked(), bool(self._tickets)
+        return {"running": running, "waiting": {}, "owners": int(active)}
+
+    def _shared_counts(self) -> dict[str, Any]:
+        try:
+            return fetch_admission_counts(ADMISSION_STALE_SECONDS)
+        except Exception:
+            return self._local_counts()
+
+    def _estimated_wait(self, counts: dict[str, Any], level: int, limit: int) -> float:
+        waiting = counts["waiting"]
+        if counts["running"] < limit and not sum(waiting.values()):
+            return 0.0
+        ahead = sum(count for priority, count in waiting.items() if priority <= level)
+        rounds = math.ceil((ahead + 1) / limit)
+        return rounds * self._service_seconds
+
+    def estimated_wait(self, priority: str = "interactive") -> float:
+        return self._estimated_wait(self._shared_counts(), PRIORITIES.get(priority, 0), self._limit())
+
+    def ensure_admissible(self, priority: str = "interactive") -> None:
+        counts = self._shared_counts()
+        estimated = self._estimated_wait(counts, PRIORITIES.get(priority, 0), self._limit())
+        with self._lock:
+            self._max_queue_depth = max(self._max_queue_depth, sum(counts["waiting"].values()))
+            if estimated <= self.max_wait_seconds:
+                return
+            self._rejected += 1
+        raise AdmissionRejected(estimated, max(1, math.ceil(estimated - self.max_wait_seconds)))
+
+    def _enqueue(self, priority: str) -> str:
+        self.ensure_admissible(priority)
+        ticket = f"{_owner()}:{next(self._seq)}"
+        with self._lock:
+            self._tickets[ticket] = ("waiting", PRIORITIES.get(priority, 0))
+        self._ensure_heartbeat()
+        return ticket
+
+    def _claim(self, ticket: str) -> bool:
+        limit = self._limit()
+        with self._lock:
+            if ticket not in self._tickets:
+                return False
+            level = self._tickets[ticket][1]
+        try:
+            granted = claim_admission_slot(ticket, _owner(), level, limit, ADMISSION_STALE_SECONDS)
+        except Exception:
+            with self._lock:
+                granted = self._running_locked() < limit
+        with self._lock:
+            if ticket not in self._tickets:
+                return False
+            if granted and self._tickets[ticket][0] == "waiting":
+                self._tickets[ticket] = ("running", level)
+                self._admitted += 1
+        return granted
+
+    def _abandon(self, ticket: str) -> None:
+        with self._wakeup:
+            self._tickets.pop(ticket, None)
+            self._wakeup.notify_all()
+        try:
+            release_admission(ticket)
+        except Exception:
+            pass
+
+    def _timeout_error(self) -> AdmissionRejected:
+        waited = self.max_wait_seconds * 2
+        return AdmissionRejected(waited, max(1, math.ceil(self._service_seconds)))
+
+    def _wait_limit(self, timeout: float | None) -> float:
+        limit = self.max_wait_seconds * 2
+        return limit if timeout is None else max(0.0, min(limit, timeout))
+
+    def acquire(self, priority: str = "interactive", timeout: float | None = None) -> str:
+        deadline = time.monotonic() + self._wait_limit(timeout)
+        ticket = self._enqueue(priority)
+        while not self._claim(ticket):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self._abandon(ticket)
+                raise self._timeout_error()
+            with self._wakeup:
+                self._wakeup.wait(min(ADMISSION_POLL_SECONDS, remaining))
+        return ticket
+
+    async def acquire_async(self, priority: str = "interactive", timeout: float | None = None) -> str:
+        deadline = time.monotonic() + self._wait_limit(timeout)
+        ticket = await asyncio.to_thread(self._enqueue, priority)
+        try:
+            while not await asyncio.to_thread(self._claim, ticket):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise self._timeout_error()
+                await asyncio.sleep(min(ADMISSION_POLL_SECONDS, remaining))
+        except BaseException:
+            await asyncio.shield(asyncio.to_thread(self._abandon, ticket))
+            raise
+        return ticket
+
+    def release(self, ticket: str, service_seconds: float, *, completed: bool = True) -> None:
+        with self._wakeup:
+            self._tickets.pop(ticket, None)
+            if completed:
+                self._completed += 1
+                self._service_seconds = (
+                    SERVICE_EWMA_ALPHA * service_seconds + (1 - SERVICE_EWMA_ALPHA) * self._service_seconds
+                )
+            self._wakeup.notify_all()
+        try:
+            release_admission(ticket)
+        except Exception:
+            pass
+
+    def _ensure_heartbeat(self) -> None:
+        if self._heartbeat is not None and self._heartbeat.is_alive():
+            return
+        with self._lock:
+            if self._heartbeat is not None and self._heartbeat.is_alive():
+                return
+            self._heartbeat = threading.Thread(
+                target=self._heartbeat_loop, name="llm-admission-heartbeat", daemon=True
+            )
+            self._heartbeat.start()
+
+    def _heartbeat_loop(self) -> None:
+        while True:
+            time.sleep(ADMISSION_HEARTBEAT_SECONDS)
+            with self._lock:
+                tickets = list(self._tickets)
+            try:
+                heartbeat_admission(tickets)
+            except Exception:
+                pass
+
+    @contextmanager
+    def slot(self, priority: str = "interactive", timeout: float | None = None) -> Iterator[None]:
+        ticket = self.acquire(priority, timeout)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(ticket, time.perf_counter() - started)
+
+    @asynccontextmanager
+    async def slot_async(self, priority: str = "interactive", timeout: float | None = None) -> AsyncIterator[None]:
+        ticket = await self.acquire_async(priority, timeout)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            await asyncio.shield(asyncio.to_thread(self.release, ticket, time.perf_counter() - started))
+
+    def snapshot(self) -> dict[str, Any]:
+        counts = self._shared_counts()
+        limit = self._limit()
+        depth_by_priority = {name: counts["waiting"].get(level, 0) for name, level in PRIORITIES.items()}
+        with self._lock:
+            local_in_flight = self._running_locked()
+            return {
+                "max_concurrency": limit,
+                "adaptive": self._capacity is not None,
+                "max_wait_seconds": self.max_wait_seconds,
+                "in_flight": counts["running"],
+                "in_flight_local": local_in_flight,
+                "processes": counts["owners"],
+                "queue_depth": sum(depth_by_priority.values()),
+                "queue_depth_by_priority": depth_by_priority,
+                "max_queue_depth": self._max_queue_depth,
+                "admitted": self._admitted,
+                "rejected": self._rejected,
+                "completed": self._completed,
+                "avg_service_seconds": round(self._service_seconds, 2),
+                "estimated_wait_seconds": {
+                    name: round(self._estimated_wait(counts, level, limit), 1) for name, level in PRIORITIES.items()
+                },
+            }
+
+
+ADMISSION = AdmissionController(
+    ADMISSION_MAX_CONCURRENCY,
+    ADMISSION_MAX_WAIT_SECONDS,
+    capacity=routers_capacity if ADAPTIVE_CONCURRENCY else None,
+)
@@ -0,0 +1,272 @@
+"""Asyncio variant of the Ollama agent for the FastAPI backend."""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Any, AsyncIterator
+
+import httpx
+
+from agents.admission import ADMISSION
+from agents.llm_cache import get_cached_response, store_response
+from agents.ollama_agent import (
+    AgentFlow,
+    OllamaConfig,
+    _BlockingCall,
+    _StageCall,
+    _StreamReader,
+    _agent_flow,
+    _cache_key_for,
+    _call_timeouts,
+    _chat_payload,
+    _check_deadline,
+    _coalesce_timeout,
+    _connection_error,
+    _elapsed_ms,
+    _first_token_event,
+    _http_status_error,
+    _prepare_context,
+    _stage_end_events,
+    _stage_failure,
+    with_deadline,
+)
+from agents.resilience import resilient_stream_async
+from agents.router import get_router
+from agents.single_flight import LOCAL_FLIGHTS, agent_fingerprint, run_coalesced_async
+from agents.structured_output import IncrementalJSONParser
+
+HTTP_MAX_CONNECTIONS = 512
+HTTP_MAX_KEEPALIVE = 64
+HTTP_CONNECT_TIMEOUT_SECONDS = 5.0
+
+_client: httpx.AsyncClient | None = None
+_client_loop: asyncio.AbstractEventLoop | None = None
+
+
+def _get_client() -> httpx.AsyncClient:
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _client.is_closed or _client_loop is not loop:
+        _client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+            ),
+        )
+        _client_loop = loop
+    return _client
+
+
+async def aclose_http_client() -> None:
+    global _client, _client_loop
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+    _client = None
+    _client_loop = None
+
+
+async def _ollama_chat_stream_async(
+    config: OllamaConfig,
+    messages: list[dict[str, str]],
+    *,
+    schema: dict[str, Any] | None = None,
+    usage: dict[str, Any] | None = None,
+    stage: str = "chat",
+) -> AsyncIterator[str]:
+    payload = _chat_payload(config, messages, stream=True, schema=schema)
+    key = _cache_key_for(config, payload)
+    if usage is not None:
+        usage.update(model=config.model, cached=False, num_predict=config.num_predict)
+    if key:
+        cached = await asyncio.to_thread(get_cached_response, key)
+        if cached is not None:
+            if usage is not None:
+                usage["cached"] = True
+            yield cached
+            return
+
+    validator = IncrementalJSONParser() if schema is not None else None
+    started = time.perf_counter()
+    parts: list[str] = []
+    router = get_router(config.base_url)
+
+    async def attempt() -> AsyncIterator[str]:
+        _check_deadline(config)
+        timeout, admission_timeout = _call_timeouts(config)
+        async with ADMISSION.slot_async(config.priority, admission_timeout):
+            with router.lease(config.model) as endpoint:
+                reader = _StreamReader(config, validator, parts, usage, started, stage)
+                try:
+                    async with _get_client().stream(
+                        "POST",
+                        f"{endpoint.url}/api/chat",
+                        json=payload,
+                        timeout=httpx.Timeout(timeout, connect=min(timeout, HTTP_CONNECT_TIMEOUT_SECONDS)),
+                    ) as resp:
+                        resp.raise_for_status()
+                        async for line in resp.aiter_lines():
+                            token, stop = reader.feed(line)
+                            if token:
+                                yield token
+                            if stop:
+                                break
+                        else:
+                            raise ConnectionResetError("stream encerrado antes do chunk final")
+                    reader.observe(endpoint)
+                except httpx.HTTPStatusError as exc:
+                    status = exc.response.status_code
+                    raise _http_status_error(config, endpoint, status, str(exc), reader.sent) from exc
+                except (httpx.HTTPError, ConnectionError) as exc:
+                    timed_out = isinstance(exc, httpx.ReadTimeout)
+                    raise _connection_error(config, endpoint, str(exc), reader.sent, timed_out) from exc
+
+    async for token in resilient_stream_async(config.base_url, attempt, deadline_at=config.deadline_at):
+        yield token
+
+    if key and (validator is None or validator.complete):
+        await asyncio.to_thread(store_response, key, config.model, "".join(parts), _elapsed_ms(started))
+
+
+async def _stream_stage_async(call: _StageCall) -> AsyncIterator[dict[str, Any]]:
+    started = time.perf_counter()
+    parts: list[str] = []
+    failure, interrupted = None, False
+    call.usage[call.stage] = {}
+    try:
+        stream = _ollama_chat_stream_async(
+            call.config, call.messages, schema=call.schema, usage=call.usage[call.stage], stage=call.stage
+        )
+        async for token in stream:
+            if not parts:
+                yield _first_token_event(call, started)
+            parts.append(token)
+            yield {"event": "token", "stage": call.stage, "content": token}
+    except Exception as exc:
+        failure, interrupted = _stage_failure(call, exc)
+    for event in _stage_end_events(call, started, parts, failure, interrupted):
+        yield event
+
+
+async def _drive_async(flow: AgentFlow) -> AsyncIterator[dict[str, Any]]:
+    reply: Any = None
+    failure: Exception | None = None
+    while True:
+        try:
+            step = flow.throw(failure) if failure is not None else flow.send(reply)
+        except StopIteration:
+            return
+        reply, failure = None, None
+        try:
+            if isinstance(step, _StageCall):
+                async for reply in _stream_stage_async(step):
+                    yield reply
+            elif isinstance(step, _BlockingCall):
+                reply = await asyncio.to_thread(step.fn, *step.args)
+            else:
+                yield step
+        except Exception as exc:
+            failure = exc
+
+
+async def _flow_result_async(events: AsyncIterator[dict[str, Any]]) -> dict[str, Any]:
+    result: dict[str, Any] = {}
+    async for event in events:
+        if event["event"] == "done":
+            result = event["result"]
+    return result
+
+
+async def run_resume_agent_async(
+    *,
+    candidate_name: str,
+    area: str,
+    resume_skills: list[str],
+    section_metrics: dict[str, list[tuple]],
+    job_title: str,
+    job_description: str,
+    config: OllamaConfig,
+    analise_id: int | None = None,
+    sections: list[str] | None = None,
+) -> dict[str, Any]:
+    config = with_deadline(config)
+    safe_context = await asyncio.to_thread(
+        _prepare_context,
+        candidate_name=candidate_name,
+        area=area,
+        resume_skills=resume_skills,
+        section_metrics=section_metrics,
+        job_title=job_title,
+        job_description=job_description,
+        config=config,
+        analise_id=analise_id,
+        sections=sections,
+    )
+
+    async def run() -> dict[str, Any]:
+        return await _flow_result_async(_drive_async(_agent_flow(safe_context, config, analise_id)))
+
+    if not config.coalesce:
+        return await run()
+    return await run_coalesced_async(
+        agent_fingerprint(safe_context, config),
+        run,
+        across_processes=config.coalesce_across_processes,
+        timeout=_coalesce_timeout(config),
+    )
+
+
+async def run_resume_agent_stream_async(
+    *,
+    candidate_name: str,
+    area: str,
+    resume_skills: list[str],
+    section_metrics: dict[str, list[tuple]],
+    job_title: str,
+    job_description: str,
+    config: OllamaConfig,
+    analise_id: int | None = None,
+    sections: list[str] | None = None,
+) -> AsyncIterator[dict[str, Any]]:
+    config = with_deadline(config)
+    safe_context = await asyncio.to_thread(
+        _prepare_context,
+        candidate_name=candidate_name,
+        area=area,
+        resume_skills=resume_skills,
+        section_metrics=section_metrics,
+        job_title=job_title,
+        job_description=job_description,
+        config=config,
+        analise_id=analise_id,
+        sections=sections,
+    )
+    events = _drive_async(_agent_flow(safe_context, config, analise_id))
+    if not config.coalesce:
+        async for event in events:
+            yield event
+        return
+
+    key = agent_fingerprint(safe_context, config)
+    flight, leader = LOCAL_FLIGHTS.begin(key)
+    if not leader:
+        yield {"event": "status", "stage": "coalesced"}
+        try:
+            result = await flight.wait_async(_coalesce_timeout(config))
+        except TimeoutError:
+            async for event in events:
+                yield event
+            return
+        yield {"event": "done", "result": result}
+        return
+
+    try:
+        async for event in events:
+            if event["event"] == "done":
+                LOCAL_FLIGHTS.finish(key, flight, result=event["result"])
+            yield event
+    except BaseException as exc:
+        LOCAL_FLIGHTS.finish(key, flight, error=exc)
+        raise
+    finally:
+        LOCAL_FLIGHTS.finish(key, flight, error=RuntimeError("A execução terminou sem resultado."))
@@ -0,0 +1,187 @@
+"""Batched final synthesis: several candidates against one vacancy in a single Ollama call."""
+
+from __future__ import annotations
+
+import json
+import os
+import time
+from dataclasses import dataclass, replace
+from typing import Any
+
+from agents.admission import AdmissionRejected
+from agents.context_builder import BuiltContext, build_batch_entry, build_batch_shared_context, estimate_tokens
+from agents.ollama_agent import (
+    ModelNotFound,
+    OllamaConfig,
+    _agent_job_description,
+    _build_result,
+    _build_safe_context,
+    _elapsed_ms,
+    _normalize_final_output,
+    _ollama_chat,
+    _read_prompt,
+    _run_tools,
+    _safe_json,
+    _stage_messages,
+    _static_prefix,
+    stage_config,
+)
+from agents.resilience import CircuitOpen, OllamaUnavailable
+from agents.resume_index import retrieve_passages
+from agents.structured_output import MalformedJSONError, batch_final_schema, schema_errors
+from agents.usage import record_agent_usage
+
+BATCH_CONTEXT_TOKENS = int(os.getenv("OLLAMA_CONTEXT_LENGTH", "4096"))
+BATCH_CONTEXT_MARGIN = 0.9
+BATCH_MAX_CANDIDATES = 8
+BATCH_PROMPT = "batch_synthesis_prompt.txt"
+BACKEND_ERRORS = (AdmissionRejected, CircuitOpen, ModelNotFound, OllamaUnavailable)
+
+
+@dataclass
+class BatchCandidate:
+    analise_id: int
+    safe_context: dict[str, Any]
+    tool_results: list[dict[str, Any]]
+    entry: BuiltContext
+
+
+def prepare_candidate(
+    *,
+    analise_id: int,
+    candidate_name: str,
+    area: str,
+    resume_skills: list[str],
+    section_metrics: dict[str, list[tuple]],
+    job_title: str,
+    job_description: str,
+) -> BatchCandidate:
+    safe_context = _build_safe_context(
+        candidate_name=candidate_name,
+        area=area,
+        resume_skills=resume_skills,
+        section_metrics=section_metrics,
+        job_title=job_title,
+        job_description=job_description,
+        resume_passages=retrieve_passages(analise_id, job_description),
+    )
+    tool_results = _run_tools({}, safe_context)
+    entry = build_batch_entry(analise_id, safe_context, tool_results)
+    return BatchCandidate(analise_id, safe_context, tool_results, entry)
+
+
+def pack_candidates(
+    candidates: list[BatchCandidate],
+    fixed_tokens: int,
+    output_tokens: int,
+    context_tokens: int = BATCH_CONTEXT_TOKENS,
+    max_size: int = BATCH_MAX_CANDIDATES,
+) -> list[list[BatchCandidate]]:
+    available = int(context_tokens * BATCH_CONTEXT_MARGIN) - fixed_tokens
+    packs: list[list[BatchCandidate]] = []
+    current: list[BatchCandidate] = []
+    used = 0
+    for candidate in candidates:
+        cost = candidate.entry.stats["tokens"] + output_tokens
+        if current and (used + cost > available or len(current) >= max_size):
+            packs.append(current)
+            current, used = [], 0
+        current.append(candidate)
+        used += cost
+    if current:
+        packs.append(current)
+    return packs
+
+
+def _batch_messages(shared: BuiltContext, pack: list[BatchCandidate]) -> list[dict[str, str]]:
+    entries = [{"contexto": c.entry.context, "tools": c.entry.tool_summary} for c in pack]
+    data = (
+        f"Vaga:\n{shared.context_json()}\n\n"
+        f"Resultados de tools da vaga:\n{shared.tool_summary_json()}\n\n"
+        f"Candidatos ({len(pack)}):\n{json.dumps(entries, ensure_ascii=False, separators=(',', ':'), default=str)}"
+    )
+    return _stage_messages(_read_prompt(BATCH_PROMPT), data)
+
+
+def split_batch_output(raw_items: Any, pack: list[BatchCandidate]) -> dict[int, dict[str, Any]]:
+    item_schema = batch_final_schema(len(pack))["properties"]["candidatos"]["items"]
+    expected = {c.analise_id for c in pack}
+    valid: dict[int, dict[str, Any]] = {}
+    for item in raw_items if isinstance(raw_items, list) else []:
+        if not isinstance(item, dict) or schema_errors(item, item_schema):
+            continue
+        candidate_id = item["candidate_id"]
+        if candidate_id in expected and candidate_id not in valid:
+            valid[candidate_id] = {key: value for key, value in item.items() if key != "candidate_id"}
+    return valid
+
+
+def _synthesize_pack(
+    pack: list[BatchCandidate],
+    shared: BuiltContext,
+    config: OllamaConfig,
+    output_tokens: int,
+) -> dict[int, dict[str, Any]]:
+    batch_config = replace(config, num_predict=output_tokens * len(pack), adaptive_num_predict=False)
+    usage: dict[str, Any] = {}
+    started = time.perf_counter()
+    messages = _batch_messages(shared, pack)
+    try:
+        raw = _ollama_chat(batch_config, messages, schema=batch_final_schema(len(pack)), usage=usage, stage="batch")
+    except MalformedJSONError:
+        raw = ""
+    timings = {"batch": {"total_ms": _elapsed_ms(started)}}
+    record_agent_usage({"batch": usage})
+    valid = split_batch_output(_safe_json(raw).get("candidatos"), pack)
+
+    results: dict[int, dict[str, Any]] = {}
+    for position, candidate in enumerate(pack):
+        if candidate.analise_id not in valid:
+            continue
+        final_json = _normalize_final_output(valid[candidate.analise_id], candidate.tool_results)
+        result = _build_result(
+            config,
+            {},
+            candidate.tool_results,
+            final_json,
+            timings,
+            {},
+            {"batch": {**candidate.entry.stats, "shared_tokens": shared.stats["tokens"]}},
+            {"batch": usage},
+        )
+        result["parameters"].pop("planning")
+        result["batched"] = {"size": len(pack), "position": position}
+        results[candidate.analise_id] = result
+    return results
+
+
+def run_batched_synthesis(
+    candidates: list[dict[str, Any]],
+    job_title: str,
+    job_description: str,
+    config: OllamaConfig,
+) -> dict[int, dict[str, Any]]:
+    if len(candidates) < 2:
+        return {}
+    job_description = _agent_job_description(job_description, config)
+    prepared = [
+        prepare_candidate(**candidate, job_title=job_title, job_description=job_description)
+        for candidate in candidates
+    ]
+    shared = build_batch_shared_context(prepared[0].safe_context, prepared[0].tool_results)
+    fixed_tokens = (
+        estimate_tokens(_static_prefix()) + estimate_tokens(_read_prompt(BATCH_PROMPT)) + shared.stats["tokens"]
+    )
+    output_tokens = stage_config(config, "final").num_predict
+
+    results: dict[int, dict[str, Any]] = {}
+    for pack in pack_candidates(prepared, fixed_tokens, output_tokens):
+        if len(pack) < 2:
+            continue
+        try:
+            results.update(_synthesize_pack(pack, shared, config, output_tokens))
+        except BACKEND_ERRORS:
+            raise
+        except Exception:
+            continue
+    return results
@@ -0,0 +1,101 @@
+"""AIMD limit on in-flight requests per Ollama endpoint, driven by latency and errors."""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import deque
+from typing import Any
+
+ADAPTIVE_CONCURRENCY = os.getenv("OLLAMA_ADAPTIVE_CONCURRENCY", "1") != "0"
+INITIAL_LIMIT = float(os.getenv("OLLAMA_INITIAL_LIMIT", "2"))
+MIN_LIMIT = 1.0
+MAX_LIMIT = float(os.getenv("OLLAMA_MAX_LIMIT_PER_ENDPOINT", "8"))
+LATENCY_TOLERANCE = float(os.getenv("OLLAMA_LATENCY_TOLERANCE", "2.0"))
+LATENCY_DECREASE = 0.8
+ERROR_DECREASE = 0.5
+BASELINE_SAMPLES = 50
+THROUGHPUT_WINDOW_SECONDS = 60.0
+
+
+class AdaptiveLimit:
+    def __init__(
+        self,
+        initial: float = INITIAL_LIMIT,
+        minimum: float = MIN_LIMIT,
+        maximum: float = MAX_LIMIT,
+        tolerance: float = LATENCY_TOLERANCE,
+    ):
+        self.minimum = max(1.0, float(minimum))
+        self.maximum = max(self.minimum, float(maximum))
+        self.limit = min(self.maximum, max(self.minimum, float(initial)))
+        self.tolerance = max(1.0, float(tolerance))
+        self._lock = threading.Lock()
+        self._latencies: dict[str, deque[float]] = {}
+        self._completions: deque[tuple[float, int]] = deque()
+        self._last_decrease = 0.0
+        self._last_latency: float | None = None
+        self.updated_at = 0.0
+        self.increases = 0
+        self.decreases = 0
+        self.errors = 0
+
+    @property
+    def value(self) -> int:
+        return int(self.limit)
+
+    def _decrease_locked(self, factor: float, started: float | None) -> None:
+        if started is not None and started < self._last_decrease:
+            return
+        self.limit = max(self.minimum, self.limit * factor)
+        self._last_decrease = time.monotonic()
+        self.decreases += 1
+
+    def _trim_locked(self, now: float) -> None:
+        while self._completions and now - self._completions[0][0] > THROUGHPUT_WINDOW_SECONDS:
+            self._completions.popleft()
+
+    def on_success(self, started: float, latency: float, tokens: int, in_flight: int, stage: str = "chat") -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._completions.append((now, max(0, int(tokens))))
+            self._trim_locked(now)
+            self._last_latency = latency
+            self.updated_at = time.time()
+            latencies = self._latencies.setdefault(stage, deque(maxlen=BASELINE_SAMPLES))
+            latencies.append(latency)
+            baseline = min(latencies)
+            if len(latencies) > 1 and latency > baseline * self.tolerance:
+                self._decrease_locked(LATENCY_DECREASE, started)
+            elif in_flight >= self.value and self.limit < self.maximum:
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+                self.increases += 1
+
+    def on_error(self, started: float | None = None) -> None:
+        with self._lock:
+            self.errors += 1
+            self.updated_at = time.time()
+            self._decrease_locked(ERROR_DECREASE, started)
+
+    def snapshot(self) -> dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            self._trim_locked(now)
+            span = THROUGHPUT_WINDOW_SECONDS
+            if self._completions:
+                span = min(span, max(1.0, now - self._completions[0][0]))
+            return {
+                "limit": self.value,
+                "limit_raw": round(self.limit, 2),
+                "baseline_latency_ms": {
+                    stage: round(min(latencies) * 1000) for stage, latencies in sorted(self._latencies.items())
+                },
+                "last_latency_ms": round(self._last_latency * 1000) if self._last_latency is not None else None,
+                "calls_per_minute": round(len(self._completions) * 60.0 / span, 1),
+                "tokens_per_second": round(sum(t for _, t in self._completions) / span, 1),
+                "increases": self.increases,
+                "decreases": self.decreases,
+                "errors": self.errors,
+                "updated_at": self.updated_at,
+            }
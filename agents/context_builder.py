@@ -0,0 +1,202 @@
+"""Token-budgeted context assembly for the agent prompts."""
+
+from __future__ import annotations
+
+import json
+import math
+from dataclasses import dataclass, field
+from typing import Any
+
+CHARS_PER_TOKEN = 3.6
+STAGE_PROMPT_BUDGETS = {"planning": 900, "final": 2100, "section": 1300}
+SECTION_TOOLS = ("keyword_gap_analysis",)
+BATCH_SHARED_KEYS = ("job_title", "job_description")
+BATCH_SHARED_TOOLS = ("extract_keywords",)
+MIN_JOB_DESCRIPTION_TOKENS = 120
+MAX_CONTEXT_SKILLS = 25
+MAX_SUMMARY_ITEMS = 12
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text or "") / CHARS_PER_TOKEN)
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+@dataclass
+class BuiltContext:
+    stage: str
+    context: dict[str, Any]
+    tool_summary: list[dict[str, Any]] | None = None
+    stats: dict[str, Any] = field(default_factory=dict)
+
+    def context_json(self) -> str:
+        return _dumps(self.context)
+
+    def tool_summary_json(self) -> str:
+        return _dumps(self.tool_summary or [])
+
+
+def compact_section_metrics(section_metrics: dict[str, list]) -> dict[str, dict[str, int]]:
+    compact: dict[str, dict[str, int]] = {}
+    for section, items in (section_metrics or {}).items():
+        scores: dict[str, int] = {}
+        for item in items or []:
+            if isinstance(item, (list, tuple)) and len(item) >= 2:
+                try:
+                    scores[str(item[0])] = int(item[1])
+                except (TypeError, ValueError):
+                    continue
+        compact[section] = scores
+    return compact
+
+
+def _summarize_output(tool: str, output: dict[str, Any]) -> dict[str, Any]:
+    if tool == "extract_keywords":
+        return {"keywords": output.get("keywords", [])[:MAX_SUMMARY_ITEMS]}
+    if tool == "keyword_gap_analysis":
+        return {
+            "compatibility": output.get("compatibility"),
+            "present": output.get("present", [])[:MAX_SUMMARY_ITEMS],
+            "missing": output.get("missing", [])[:MAX_SUMMARY_ITEMS],
+        }
+    if tool == "section_score_summary":
+        return {"section_scores": output.get("section_scores", {})}
+    if tool == "prioritize_actions":
+        return {"actions": output.get("actions", [])}
+    return output
+
+
+def summarize_tool_results(tool_results: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    summary: list[dict[str, Any]] = []
+    seen: set[str] = set()
+    for item in tool_results:
+        tool = str(item.get("tool"))
+        output = item.get("output")
+        if isinstance(output, dict):
+            if tool in seen:
+                continue
+            seen.add(tool)
+            summary.append({"tool": tool, "output": _summarize_output(tool, output)})
+        elif item.get("error"):
+            summary.append({"tool": tool, "error": str(item["error"])[:120]})
+    return summary
+
+
+def _trim_to_tokens(text: str, max_tokens: int) -> str:
+    max_chars = int(max_tokens * CHARS_PER_TOKEN)
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    space = cut.rfind(" ")
+    return (cut[:space] if space > max_chars * 0.8 else cut).rstrip() + " [...]"
+
+
+def _fit_budget(context: dict[str, Any], fixed_tokens: int, budget: int) -> list[str]:
+    trimmed: list[str] = []
+    if len(context.get("resume_skills", [])) > MAX_CONTEXT_SKILLS:
+        context["resume_skills"] = context["resume_skills"][:MAX_CONTEXT_SKILLS]
+        trimmed.append("resume_skills")
+
+    description = context.get("job_description", "")
+    without_description = dict(context, job_description="")
+    available = budget - fixed_tokens - estimate_tokens(_dumps(without_description))
+    available = max(available, MIN_JOB_DESCRIPTION_TOKENS)
+    if estimate_tokens(description) > available:
+        context["job_description"] = _trim_to_tokens(description, available)
+        trimmed.append("job_description")
+    return trimmed
+
+
+def _base_context(safe_context: dict[str, Any]) -> dict[str, Any]:
+    context = dict(safe_context)
+    context["resume_skills"] = list(safe_context.get("resume_skills", []))
+    context["section_metrics"] = compact_section_metrics(safe_context.get("section_metrics", {}))
+    return context
+
+
+def build_planning_context(safe_context: dict[str, Any], budget: int | None = None) -> BuiltContext:
+    budget = budget or STAGE_PROMPT_BUDGETS["planning"]
+    context = _base_context(safe_context)
+    context.pop("resume_passages", None)
+    trimmed = _fit_budget(context, 0, budget)
+    built = BuiltContext(stage="planning", context=context)
+    built.stats = {
+        "raw_tokens": estimate_tokens(_dumps(safe_context)),
+        "tokens": estimate_tokens(built.context_json()),
+        "budget": budget,
+        "trimmed": trimmed,
+    }
+    return built
+
+
+def build_final_context(
+    safe_context: dict[str, Any],
+    tool_results: list[dict[str, Any]],
+    budget: int | None = None,
+) -> BuiltContext:
+    budget = budget or STAGE_PROMPT_BUDGETS["final"]
+    context = _base_context(safe_context)
+    tool_summary = summarize_tool_results(tool_results)
+    trimmed = _fit_budget(context, estimate_tokens(_dumps(tool_summary)), budget)
+    built = BuiltContext(stage="final", context=context, tool_summary=tool_summary)
+    built.stats = {
+        "raw_tokens": estimate_tokens(_dumps(safe_context)) + estimate_tokens(_dumps(tool_results)),
+        "tokens": estimate_tokens(built.context_json()) + estimate_tokens(built.tool_summary_json()),
+        "budget": budget,
+        "trimmed": trimmed,
+    }
+    return built
+
+
+def build_section_context(
+    safe_context: dict[str, Any],
+    tool_results: list[dict[str, Any]],
+    sections: list[str],
+    budget: int | None = None,
+) -> BuiltContext:
+    budget = budget or STAGE_PROMPT_BUDGETS["section"]
+    context = _base_context(safe_context)
+    context["section_metrics"] = {key: context["section_metrics"].get(key, {}) for key in sections}
+    tool_summary = [item for item in summarize_tool_results(tool_results) if item["tool"] in SECTION_TOOLS]
+    trimmed = _fit_budget(context, estimate_tokens(_dumps(tool_summary)), budget)
+    built = BuiltContext(stage="section", context=context, tool_summary=tool_summary)
+    built.stats = {
+        "raw_tokens": estimate_tokens(_dumps(safe_context)) + estimate_tokens(_dumps(tool_results)),
+        "tokens": estimate_tokens(built.context_json()) + estimate_tokens(built.tool_summary_json()),
+        "budget": budget,
+        "trimmed": trimmed,
+    }
+    return built
+
+
+def build_batch_shared_context(safe_context: dict[str, Any], tool_results: list[dict[str, Any]]) -> BuiltContext:
+    context = {key: safe_context.get(key, "") for key in BATCH_SHARED_KEYS}
+    tool_summary = [item for item in summarize_tool_results(tool_results) if item["tool"] in BATCH_SHARED_TOOLS]
+    built = BuiltContext(stage="batch", context=context, tool_summary=tool_summary)
+    built.stats = {"tokens": estimate_tokens(built.context_json()) + estimate_tokens(built.tool_summary_json())}
+    return built
+
+
+def build_batch_entry(
+    candidate_id: int,
+    safe_context: dict[str, Any],
+    tool_results: list[dict[str, Any]],
+) -> BuiltContext:
+    context = _base_context(safe_context)
+    for key in BATCH_SHARED_KEYS:
+        context.pop(key, None)
+    trimmed: list[str] = []
+    if len(context.get("resume_skills", [])) > MAX_CONTEXT_SKILLS:
+        context["resume_skills"] = context["resume_skills"][:MAX_CONTEXT_SKILLS]
+        trimmed.append("resume_skills")
+    context = {"candidate_id": candidate_id, **context}
+    tool_summary = [item for item in summarize_tool_results(tool_results) if item["tool"] not in BATCH_SHARED_TOOLS]
+    built = BuiltContext(stage="batch", context=context, tool_summary=tool_summary)
+    built.stats = {
+        "tokens": estimate_tokens(built.context_json()) + estimate_tokens(built.tool_summary_json()),
+        "trimmed": trimmed,
+    }
+    return built
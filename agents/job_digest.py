@@ -0,0 +1,149 @@
+"""Map-reduce digest of long job descriptions into a compact requirement list."""
+
+from __future__ import annotations
+
+import re
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable
+
+DIGEST_THRESHOLD_CHARS = 6000
+CHUNK_CHARS = 2500
+HEAD_CHARS = 600
+MAX_REQUIREMENTS = 25
+MIN_REQUIREMENT_CHARS = 8
+MAX_REQUIREMENT_CHARS = 220
+DIGEST_WORKERS = 4
+REQUIREMENT_CUES = (
+    "requisito",
+    "requerid",
+    "obrigat",
+    "desejáve",
+    "desejave",
+    "diferencia",
+    "experiência",
+    "experiencia",
+    "conhecimento",
+    "domínio",
+    "dominio",
+    "formação",
+    "formacao",
+    "inglês",
+    "ingles",
+    "certifica",
+    "vivência",
+    "vivencia",
+    "required",
+    "requirement",
+    "experience",
+    "knowledge",
+    "must",
+    "nice to have",
+)
+MUST_CUES = ("obrigat", "requisito", "essencia", "imprescind", "required", "must")
+BULLET_RE = re.compile(r"^\s*(?:[-*•·–]|\d+[.)])\s+")
+
+RequirementExtractor = Callable[[str], list[str]]
+
+
+@dataclass
+class JobDigest:
+    head: str
+    requirements: list[str] = field(default_factory=list)
+    chunks: int = 0
+    source_chars: int = 0
+    llm_chunks: int = 0
+
+    def to_text(self) -> str:
+        lines = [
+            self.head,
+            "",
+            f"Requisitos extraídos da vaga completa ({self.chunks} trechos, {self.source_chars} caracteres):",
+        ]
+        lines += [f"- {item}" for item in self.requirements]
+        return "\n".join(lines)
+
+
+def split_description(text: str, chunk_chars: int = CHUNK_CHARS) -> list[str]:
+    pieces: list[str] = []
+    for paragraph in re.split(r"\n\s*\n", text or ""):
+        paragraph = paragraph.strip()
+        while len(paragraph) > chunk_chars:
+            cut = paragraph.rfind("\n", 0, chunk_chars)
+            cut = cut if cut > chunk_chars // 2 else chunk_chars
+            pieces.append(paragraph[:cut].strip())
+            paragraph = paragraph[cut:].strip()
+        if paragraph:
+            pieces.append(paragraph)
+
+    chunks: list[str] = []
+    for piece in pieces:
+        if chunks and len(chunks[-1]) + len(piece) + 2 <= chunk_chars:
+            chunks[-1] = f"{chunks[-1]}\n\n{piece}"
+        else:
+            chunks.append(piece)
+    return chunks
+
+
+def extract_requirements(chunk: str) -> list[str]:
+    found: list[str] = []
+    for line in (chunk or "").splitlines():
+        if line.rstrip().endswith(":"):
+            continue
+        bullet = bool(BULLET_RE.match(line))
+        text = BULLET_RE.sub("", line).strip(" .;:\t")
+        if not MIN_REQUIREMENT_CHARS <= len(text) <= MAX_REQUIREMENT_CHARS:
+            continue
+        if bullet or any(cue in text.lower() for cue in REQUIREMENT_CUES):
+            found.append(text)
+    return found
+
+
+def _requirement_key(text: str) -> str:
+    return " ".join(re.findall(r"\w+", text.casefold()))
+
+
+def merge_requirements(mapped: list[tuple[list[str], list[str]]], limit: int = MAX_REQUIREMENTS) -> list[str]:
+    scores: dict[str, float] = {}
+    first_seen: dict[str, tuple[int, str]] = {}
+    for found, from_llm in mapped:
+        for text in found + from_llm:
+            key = _requirement_key(text)
+            if not key:
+                continue
+            must = 2.0 if any(cue in key for cue in MUST_CUES) else 0.0
+            scores[key] = scores.get(key, 0.0) + 1.0 + must
+            first_seen.setdefault(key, (len(first_seen), text.strip()[:MAX_REQUIREMENT_CHARS]))
+    ranked = sorted(scores, key=lambda key: (-scores[key], first_seen[key][0]))
+    return [first_seen[key][1] for key in ranked[:limit]]
+
+
+def _map_chunk(chunk: str, extract_llm: RequirementExtractor | None) -> tuple[list[str], list[str]]:
+    from_llm: list[str] = []
+    if extract_llm is not None:
+        try:
+            from_llm = extract_llm(chunk)
+        except Exception:
+            from_llm = []
+    return extract_requirements(chunk), from_llm
+
+
+def _head(text: str) -> str:
+    head = text[:HEAD_CHARS]
+    stop = max(head.rfind("\n"), head.rfind(". "))
+    return (head[: stop + 1] if stop > HEAD_CHARS // 2 else head).strip()
+
+
+def digest_job_description(text: str, extract_llm: RequirementExtractor | None = None) -> JobDigest:
+    text = (text or "").strip()
+    chunks = split_description(text)
+    with ThreadPoolExecutor(max_workers=max(1, min(DIGEST_WORKERS, len(chunks)))) as pool:
+        mapped = list(pool.map(lambda chunk: _map_chunk(chunk, extract_llm), chunks))
+
+    return JobDigest(
+        head=_head(text),
+        requirements=merge_requirements(mapped),
+        chunks=len(chunks),
+        source_chars=len(text),
+        llm_chunks=sum(1 for _, from_llm in mapped if from_llm),
+    )
@@ -0,0 +1,81 @@
+"""Persistent response cache for Ollama chat calls, shared through SQLite."""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+from typing import Any
+
+from core.db import evict_llm_cache, fetch_llm_cache, fetch_llm_cache_stats, upsert_llm_cache
+
+CACHE_MAX_ENTRIES = 2000
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+CACHE_MAX_AGE_SECONDS = 7 * 24 * 3600
+CACHE_MAX_TEMPERATURE = 0.5
+EVICT_EVERY_WRITES = 50
+
+logger = logging.getLogger(__name__)
+
+_writes_lock = threading.Lock()
+_writes_since_evict = 0
+
+
+def _digest(value: Any) -> str:
+    return hashlib.sha256(json.dumps(value, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def cache_key(payload: dict[str, Any]) -> str:
+    options = dict(payload.get("options", {}))
+    if payload.get("format") is not None:
+        options.pop("num_predict", None)
+    return _digest(
+        {
+            "model": payload.get("model"),
+            "options": options,
+            "format": payload.get("format"),
+            "messages": _digest(payload.get("messages", [])),
+        }
+    )
+
+
+def is_cacheable(config) -> bool:
+    return bool(getattr(config, "use_cache", True)) and float(config.temperature) <= CACHE_MAX_TEMPERATURE
+
+
+def get_cached_response(key: str) -> str | None:
+    try:
+        return fetch_llm_cache(key, CACHE_MAX_AGE_SECONDS)
+    except sqlite3.Error:
+        logger.warning("Falha ao ler o cache de respostas do Ollama.", exc_info=True)
+        return None
+
+
+def store_response(key: str, model: str, content: str, latency_ms: int) -> None:
+    global _writes_since_evict
+    if not content:
+        return
+    try:
+        upsert_llm_cache(key, model, content, latency_ms)
+        with _writes_lock:
+            _writes_since_evict += 1
+            should_evict = _writes_since_evict >= EVICT_EVERY_WRITES
+            if should_evict:
+                _writes_since_evict = 0
+        if should_evict:
+            evict_llm_cache(CACHE_MAX_ENTRIES, CACHE_MAX_BYTES, CACHE_MAX_AGE_SECONDS)
+    except sqlite3.Error:
+        logger.warning("Falha ao gravar no cache de respostas do Ollama.", exc_info=True)
+
+
+def cache_stats() -> dict[str, Any]:
+    stats = fetch_llm_cache_stats()
+    stats["limits"] = {
+        "max_entries": CACHE_MAX_ENTRIES,
+        "max_bytes": CACHE_MAX_BYTES,
+        "max_age_seconds": CACHE_MAX_AGE_SECONDS,
+        "max_temperature": CACHE_MAX_TEMPERATURE,
+    }
+    return stats
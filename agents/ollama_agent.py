@@ -3,12 +3,48 @@
 from __future__ import annotations
 
 import json
+import math
+import os
 import re
-from dataclasses import dataclass
+import time
+from dataclasses import dataclass, replace
+from http.client import HTTPException
 from pathlib import Path
-from typing import Any
+from typing import Any, Callable, Generator, Iterator
 from urllib import error, request
 
+from agents.admission import ADMISSION
+from agents.context_builder import (
+    build_final_context,
+    build_planning_context,
+    build_section_context,
+    estimate_tokens,
+)
+from agents.job_digest import DIGEST_THRESHOLD_CHARS, RequirementExtractor, digest_job_description
+from agents.llm_cache import cache_key, get_cached_response, is_cacheable, store_response
+from agents.resilience import OllamaUnavailable, resilient_stream
+from agents.resume_index import PASSAGE_CHARS, retrieve_passages
+from agents.router import DEFAULT_BASE_URL, Endpoint, get_router
+from agents.single_flight import LOCAL_FLIGHTS, agent_fingerprint, run_coalesced
+from agents.structured_output import (
+    FINAL_SCHEMA,
+    PLANNING_SCHEMA,
+    PRIORITY_VALUES,
+    REQUIREMENTS_SCHEMA,
+    SECTION_KEYS,
+    IncrementalJSONParser,
+    MalformedJSONError,
+    schema_errors,
+    section_schema,
+)
+from agents.usage import (
+    adaptive_num_predict,
+    call_estimate,
+    record_agent_usage,
+    usage_from_chunk,
+    usage_from_early_stop,
+)
+from agents.warmup import keep_alive_for
 from tools.resume_tools import TOOL_REGISTRY, TOOL_SPECS
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -16,22 +52,174 @@ PROMPTS_DIR = BASE_DIR / "prompts"
 MAX_TEXT_CHARS = 8000
 MAX_SKILLS = 60
 MAX_TOOL_CALLS = 6
+SECTION_NUM_PREDICT_RATIO = 0.3
+SECTION_REWRITE_FALLBACKS = {
+    "estrutura": "Aprimorar resumo profissional com objetivo e palavras-chave.",
+    "experiencia": "Reescrever experiências com verbos de ação e resultados mensuráveis.",
+    "habilidades": "Priorizar habilidades aderentes à vaga e remover redundâncias.",
+}
+EARLY_STOP_GRACE_CHUNKS = 2
+DEADLINE_MARGIN_SECONDS = 0.25
+DEADLINE_MIN_NUM_PREDICT = 96
+OLLAMA_CONNECTION_ERROR = (
+    "Falha ao conectar no Ollama. Verifique se o servidor está rodando em {url}."
+)
+OLLAMA_TIMEOUT_ERROR = "O Ollama em {url} não respondeu dentro do tempo limite."
+MODEL_NOT_FOUND_ERROR = "O modelo {model} não está instalado no Ollama em {url}."
+DEADLINE_ERROR = "Prazo de {seconds:g}s da análise esgotado."
+PLANNING_FALLBACKS = {
+    "final_model": "Repetir com o modelo principal",
+    "tools": "Seguir com as tools padrão",
+    "none": "Interromper a análise",
+}
+
+
+class ModelNotFound(RuntimeError):
+    pass
+
+
+class DeadlineExceeded(RuntimeError):
+    pass
 
 
 @dataclass
 class OllamaConfig:
     model: str = "llama3.1:8b"
-    base_url: str = "http://localhost:11434"
+    base_url: str = DEFAULT_BASE_URL
     temperature: float = 0.3
     top_p: float = 0.9
     num_predict: int = 700
     timeout_seconds: int = 120
+    use_cache: bool = True
+    coalesce: bool = True
+    coalesce_across_processes: bool = False
+    priority: str = "interactive"
+    planning_model: str = os.getenv("OLLAMA_PLANNING_MODEL", "")
+    planning_temperature: float = 0.1
+    planning_num_predict: int = 256
+    planning_fallback: str = "final_model"
+    adaptive_num_predict: bool = True
+    digest_with_llm: bool = False
+    batched_synthesis: bool = False
+    deadline_seconds: float = 0.0
+    deadline_at: float = 0.0
+
+
+def stage_config(config: OllamaConfig, stage: str, sections: int = 1) -> OllamaConfig:
+    if stage in ("planning", "digest"):
+        config = replace(
+            config,
+            model=config.planning_model or config.model,
+            temperature=config.planning_temperature,
+            num_predict=config.planning_num_predict,
+        )
+    elif stage == "section":
+        ratio = min(1.0, SECTION_NUM_PREDICT_RATIO * sections)
+        config = replace(config, num_predict=max(1, int(config.num_predict * ratio)))
+    if config.adaptive_num_predict:
+        config = replace(config, num_predict=adaptive_num_predict(config.model, stage, config.num_predict))
+    return config
+
+
+def _require_model(config: OllamaConfig) -> None:
+    if get_router(config.base_url).lacks_model(config.model):
+        raise ModelNotFound(MODEL_NOT_FOUND_ERROR.format(model=config.model, url=config.base_url))
+
+
+def _planning_fallback(config: OllamaConfig, planner: OllamaConfig, exc: Exception) -> OllamaConfig | None:
+    if config.planning_fallback == "tools":
+        return None
+    if config.planning_fallback == "final_model" and planner.model != config.model:
+        return replace(planner, model=config.model)
+    raise exc
+
+
+def with_deadline(config: OllamaConfig) -> OllamaConfig:
+    if config.deadline_seconds > 0 and not config.deadline_at:
+        return replace(config, deadline_at=time.time() + config.deadline_seconds)
+    return config
+
+
+def _remaining(config: OllamaConfig) -> float:
+    if not config.deadline_at:
+        return math.inf
+    return config.deadline_at - time.time() - DEADLINE_MARGIN_SECONDS
+
+
+def _coalesce_timeout(config: OllamaConfig) -> float | None:
+    return max(0.0, _remaining(config)) if config.deadline_at else None
+
+
+def _deadline_error(config: OllamaConfig) -> str:
+    return DEADLINE_ERROR.format(seconds=config.deadline_seconds)
+
+
+def _check_deadline(config: OllamaConfig) -> None:
+    if _remaining(config) <= 0:
+        raise DeadlineExceeded(_deadline_error(config))
+
+
+def _call_timeouts(config: OllamaConfig) -> tuple[float, float | None]:
+    remaining = _remaining(config)
+    if math.isinf(remaining):
+        return config.timeout_seconds, None
+    return max(0.05, min(config.timeout_seconds, remaining)), max(0.0, remaining)
+
+
+def _expected_tokens(config: OllamaConfig, stage: str) -> int:
+    return adaptive_num_predict(config.model, stage, config.num_predict)
+
+
+def _stage_seconds(config: OllamaConfig, stage: str) -> float:
+    estimate = call_estimate(config.model, stage)
+    if estimate is None:
+        return 0.0
+    overhead, rate = estimate
+    return overhead + _expected_tokens(config, stage) / rate
+
+
+def _deadline_stage(
+    config: OllamaConfig,
+    stage: str,
+    degraded: list[str],
+    reserve: float = 0.0,
+    shorten: bool = True,
+) -> OllamaConfig | None:
+    remaining = _remaining(config) - reserve
+    if math.isinf(remaining):
+        return config
+    estimate = call_estimate(config.model, stage)
+    if estimate is None:
+        affordable = config.num_predict if remaining > 0 else 0
+    else:
+        overhead, rate = estimate
+        affordable = int((remaining - overhead) * rate)
+    if affordable >= config.num_predict:
+        return config
+    expected = _expected_tokens(config, stage)
+    if affordable < max(DEADLINE_MIN_NUM_PREDICT, 0 if shorten else expected):
+        degraded.append(f"{stage}_skipped")
+        return None
+    if affordable < expected:
+        degraded.append(f"{stage}_shortened")
+    return replace(config, num_predict=affordable)
+
+
+def _planning_allowed(config: OllamaConfig, degraded: list[str]) -> bool:
+    if math.isinf(_remaining(config)):
+        return True
+    reserve = _stage_seconds(stage_config(config, "final"), "final")
+    return _deadline_stage(stage_config(config, "planning"), "planning", degraded, reserve, shorten=False) is not None
 
 
 def _read_prompt(filename: str) -> str:
     return (PROMPTS_DIR / filename).read_text(encoding="utf-8")
 
 
+def _elapsed_ms(started: float) -> int:
+    return int((time.perf_counter() - started) * 1000)
+
+
 def _safe_json(raw: str) -> dict[str, Any]:
     raw = (raw or "").strip()
     if not raw:
@@ -72,33 +260,230 @@ def _sanitize_skills(skills: list[str]) -> list[str]:
     return dedup[:MAX_SKILLS]
 
 
-def _ollama_chat(config: OllamaConfig, messages: list[dict[str, str]]) -> str:
+def _chat_payload(
+    config: OllamaConfig,
+    messages: list[dict[str, str]],
+    *,
+    stream: bool,
+    schema: dict[str, Any] | None = None,
+) -> dict[str, Any]:
     payload = {
         "model": config.model,
         "messages": messages,
-        "stream": False,
+        "stream": stream,
         "options": {
             "temperature": config.temperature,
             "top_p": config.top_p,
             "num_predict": config.num_predict,
         },
     }
+    if schema is not None:
+        payload["format"] = schema
+    keep_alive = keep_alive_for(config.model)
+    if keep_alive:
+        payload["keep_alive"] = keep_alive
+    return payload
+
 
-    req = request.Request(
-        url=f"{config.base_url}/api/chat",
+def _chat_request(base_url: str, payload: dict[str, Any]) -> request.Request:
+    return request.Request(
+        url=f"{base_url}/api/chat",
         method="POST",
         data=json.dumps(payload).encode("utf-8"),
         headers={"Content-Type": "application/json"},
     )
 
+
+def _cache_key_for(config: OllamaConfig, payload: dict[str, Any]) -> str | None:
+    return cache_key(payload) if is_cacheable(config) else None
+
+
+def _parse_stream_line(line: str) -> tuple[str, dict[str, Any] | None]:
+    line = line.strip()
+    if not line:
+        return "", None
+    chunk = json.loads(line)
+    if chunk.get("error"):
+        raise RuntimeError(f"Erro retornado pelo Ollama: {chunk['error']}")
+    return chunk.get("message", {}).get("content", ""), chunk if chunk.get("done") else None
+
+
+class _StreamReader:
+    def __init__(
+        self,
+        config: OllamaConfig,
+        validator: IncrementalJSONParser | None,
+        parts: list[str],
+        usage: dict[str, Any] | None,
+        started: float,
+        stage: str,
+    ):
+        self.config = config
+        self.stage = stage
+        self.validator = validator
+        self.parts = parts
+        self.usage = usage
+        self.started = started
+        self.sent = time.monotonic()
+        self.first_token_at = 0.0
+        self.chunks = 0
+        self.overrun = 0
+        self.ttft_ms = 0
+
+    def feed(self, line: str) -> tuple[str, bool]:
+        _check_deadline(self.config)
+        token, final_chunk = _parse_stream_line(line)
+        if token:
+            self.chunks += 1
+            self.ttft_ms = self.ttft_ms or _elapsed_ms(self.started)
+            self.first_token_at = self.first_token_at or time.monotonic()
+            if self.validator is not None and self.validator.complete:
+                self.overrun += 1
+                token = ""
+            else:
+                if self.validator is not None and self.validator.feed(token):
+                    token = token[: len(token) - len(self.validator.trailing)]
+                self.parts.append(token)
+        if final_chunk is not None:
+            if self.usage is not None:
+                self.usage.update(usage_from_chunk(final_chunk), wall_ms=_elapsed_ms(self.started))
+            return token, True
+        if self.overrun >= EARLY_STOP_GRACE_CHUNKS:
+            if self.usage is not None:
+                self.usage.update(usage_from_early_stop(self.chunks, self.ttft_ms, _elapsed_ms(self.started)))
+            return token, True
+        return token, False
+
+    def observe(self, endpoint: Endpoint) -> None:
+        endpoint.observe(self.sent, (self.first_token_at or time.monotonic()) - self.sent, self.chunks, self.stage)
+
+
+def _http_status_error(config: OllamaConfig, endpoint: Endpoint, status: int, detail: str, sent: float) -> Exception:
+    if status == 404:
+        return ModelNotFound(MODEL_NOT_FOUND_ERROR.format(model=config.model, url=endpoint.url))
+    if status < 500:
+        return RuntimeError(f"Erro retornado pelo Ollama: HTTP {status}")
+    endpoint.mark_failure(detail, started=sent)
+    return OllamaUnavailable(OLLAMA_CONNECTION_ERROR.format(url=endpoint.url))
+
+
+def _connection_error(
+    config: OllamaConfig,
+    endpoint: Endpoint,
+    detail: str,
+    sent: float,
+    timed_out: bool,
+) -> OllamaUnavailable:
+    _check_deadline(config)
+    endpoint.mark_failure(detail, started=sent)
+    if timed_out:
+        return OllamaUnavailable(OLLAMA_TIMEOUT_ERROR.format(url=endpoint.url), retryable=False)
+    return OllamaUnavailable(OLLAMA_CONNECTION_ERROR.format(url=endpoint.url))
+
+
+def _ollama_chat_stream(
+    config: OllamaConfig,
+    messages: list[dict[str, str]],
+    *,
+    schema: dict[str, Any] | None = None,
+    usage: dict[str, Any] | None = None,
+    stage: str = "chat",
+) -> Iterator[str]:
+    payload = _chat_payload(config, messages, stream=True, schema=schema)
+    key = _cache_key_for(config, payload)
+    if usage is not None:
+        usage.update(model=config.model, cached=False, num_predict=config.num_predict)
+    if key:
+        cached = get_cached_response(key)
+        if cached is not None:
+            if usage is not None:
+                usage["cached"] = True
+            yield cached
+            return
+
+    validator = IncrementalJSONParser() if schema is not None else None
+    started = time.perf_counter()
+    parts: list[str] = []
+    router = get_router(config.base_url)
+
+    def attempt() -> Iterator[str]:
+        _check_deadline(config)
+        timeout, admission_timeout = _call_timeouts(config)
+        with ADMISSION.slot(config.priority, admission_timeout), router.lease(config.model) as endpoint:
+            reader = _StreamReader(config, validator, parts, usage, started, stage)
+            try:
+                with request.urlopen(_chat_request(endpoint.url, payload), timeout=timeout) as resp:
+                    for line in resp:
+                        token, stop = reader.feed(line.decode("utf-8"))
+                        if token:
+                            yield token
+                        if stop:
+                            break
+                    else:
+                        raise ConnectionResetError("stream encerrado antes do chunk final")
+                reader.observe(endpoint)
+            except error.HTTPError as exc:
+                raise _http_status_error(config, endpoint, exc.code, str(exc), reader.sent) from exc
+            except (error.URLError, HTTPException, ConnectionError, TimeoutError) as exc:
+                timed_out = isinstance(exc, TimeoutError) or isinstance(getattr(exc, "reason", None), TimeoutError)
+                raise _connection_error(config, endpoint, str(exc), reader.sent, timed_out) from exc
+
+    yield from resilient_stream(config.base_url, attempt, deadline_at=config.deadline_at)
+
+    if key and (validator is None or validator.complete):
+        store_response(key, config.model, "".join(parts), _elapsed_ms(started))
+
+
+def _ollama_chat(
+    config: OllamaConfig,
+    messages: list[dict[str, str]],
+    *,
+    schema: dict[str, Any] | None = None,
+    usage: dict[str, Any] | None = None,
+    stage: str = "chat",
+) -> str:
+    return "".join(_ollama_chat_stream(config, messages, schema=schema, usage=usage, stage=stage))
+
+
+def _parse_stage_output(raw: str, schema: dict[str, Any]) -> tuple[dict[str, Any], str | None]:
+    parsed = _safe_json(raw)
+    if not isinstance(parsed, dict) or not parsed:
+        return {}, "Saída do modelo vazia ou fora do formato JSON."
+    problems = schema_errors(parsed, schema)
+    return parsed, "; ".join(problems[:3]) if problems else None
+
+
+def _chat_json(
+    config: OllamaConfig,
+    messages: list[dict[str, str]],
+    schema: dict[str, Any],
+    usage: dict[str, Any] | None = None,
+    stage: str = "chat",
+) -> tuple[dict[str, Any], str | None]:
     try:
-        with request.urlopen(req, timeout=config.timeout_seconds) as resp:
-            body = json.loads(resp.read().decode("utf-8"))
-            return body.get("message", {}).get("content", "")
-    except error.URLError as exc:
-        raise RuntimeError(
-            "Falha ao conectar no Ollama. Verifique se o servidor está rodando em http://localhost:11434."
-        ) from exc
+        raw = _ollama_chat(config, messages, schema=schema, usage=usage, stage=stage)
+    except MalformedJSONError as exc:
+        return {}, str(exc)
+    return _parse_stage_output(raw, schema)
+
+
+def _llm_requirements(config: OllamaConfig) -> RequirementExtractor:
+    digest_config = stage_config(config, "digest")
+    instructions = _read_prompt("requirements_prompt.txt")
+
+    def extract(chunk: str) -> list[str]:
+        messages = _stage_messages(instructions, f"Trecho da vaga:\n{chunk}")
+        parsed, _ = _chat_json(digest_config, messages, REQUIREMENTS_SCHEMA, stage="digest")
+        return [str(item).strip() for item in parsed.get("requisitos", []) if str(item).strip()]
+
+    return extract
+
+
+def _agent_job_description(job_description: str, config: OllamaConfig) -> str:
+    if len((job_description or "").strip()) <= DIGEST_THRESHOLD_CHARS:
+        return job_description
+    extract = _llm_requirements(config) if config.digest_with_llm and not config.deadline_at else None
+    return digest_job_description(job_description, extract).to_text()
 
 
 def _tool_descriptions() -> str:
@@ -193,6 +578,26 @@ def _ensure_required_tool_results(
     return tool_results
 
 
+def _action_text(value: Any) -> str:
+    if isinstance(value, dict):
+        return str(value.get("acao") or value.get("action") or "").strip()
+    return str(value).strip()
+
+
+def _text_list(value: Any, fallback: list[str]) -> list[str]:
+    if isinstance(value, str) and value.strip():
+        return [value.strip()]
+    if isinstance(value, list):
+        out = [_action_text(v) for v in value if _action_text(v)]
+        return out[:6] if out else fallback
+    return fallback
+
+
+def _normalize_rewrites(value: Any, sections: tuple[str, ...] | list[str] = SECTION_KEYS) -> dict[str, list[str]]:
+    rewrites = value if isinstance(value, dict) else {}
+    return {key: _text_list(rewrites.get(key), [SECTION_REWRITE_FALLBACKS[key]]) for key in sections}
+
+
 def _normalize_final_output(final_json: dict[str, Any], tool_results: list[dict[str, Any]]) -> dict[str, Any]:
     if not isinstance(final_json, dict):
         final_json = {}
@@ -205,35 +610,42 @@ def _normalize_final_output(final_json: dict[str, Any], tool_results: list[dict[
     if ats_risk not in {"baixo", "medio", "alto"}:
         ats_risk = "medio"
 
-    def _to_list(value: Any, fallback: list[str]) -> list[str]:
-        if isinstance(value, list):
-            out = [str(v).strip() for v in value if str(v).strip()]
-            return out[:6] if out else fallback
-        return fallback
-
-    strengths = _to_list(final_json.get("strengths"), ["Currículo possui base aproveitável."])
-    weaknesses = _to_list(final_json.get("weaknesses"), ["Há oportunidades de melhoria em aderência à vaga."])
-    next_actions = _to_list(final_json.get("next_actions"), fallback_actions or ["Revisar currículo com foco em ATS."])
+    def _by_priority(value: Any) -> Any:
+        if not isinstance(value, list):
+            return value
+        rank = {p: i for i, p in enumerate(PRIORITY_VALUES)}
+        return sorted(
+            value,
+            key=lambda v: rank.get(str(v.get("prioridade", "media")).lower(), 1) if isinstance(v, dict) else 1,
+        )
 
-    rewrites = final_json.get("section_rewrites")
-    if not isinstance(rewrites, dict):
-        rewrites = {}
+    strengths = _text_list(final_json.get("strengths"), ["Currículo possui base aproveitável."])
+    weaknesses = _text_list(final_json.get("weaknesses"), ["Há oportunidades de melhoria em aderência à vaga."])
+    next_actions = _text_list(
+        _by_priority(final_json.get("next_actions")),
+        fallback_actions or ["Revisar currículo com foco em ATS."],
+    )
 
     return {
         "summary": summary,
         "ats_risk": ats_risk,
         "strengths": strengths,
         "weaknesses": weaknesses,
-        "section_rewrites": {
-            "estrutura": str(rewrites.get("estrutura") or "Aprimorar resumo profissional com objetivo e palavras-chave."),
-            "experiencia": str(rewrites.get("experiencia") or "Reescrever experiências com verbos de ação e resultados mensuráveis."),
-            "habilidades": str(rewrites.get("habilidades") or "Priorizar habilidades aderentes à vaga e remover redundâncias."),
-        },
+        "section_rewrites": _normalize_rewrites(final_json.get("section_rewrites")),
         "next_actions": next_actions,
     }
 
 
-def run_resume_agent(
+def _normalize_section_output(section_json: dict[str, Any], sections: list[str]) -> dict[str, Any]:
+    if not isinstance(section_json, dict):
+        section_json = {}
+    return {
+        "summary": str(section_json.get("summary") or "Não foi possível gerar resumo confiável com o modelo."),
+        "section_rewrites": _normalize_rewrites(section_json.get("section_rewrites"), sections),
+    }
+
+
+def _build_safe_context(
     *,
     candidate_name: str,
     area: str,
@@ -241,12 +653,9 @@ def run_resume_agent(
     section_metrics: dict[str, list[tuple]],
     job_title: str,
     job_description: str,
-    config: OllamaConfig,
+    sections: list[str] | None = None,
+    resume_passages: list[str] | None = None,
 ) -> dict[str, Any]:
-    system_prompt = _read_prompt("system_prompt.txt")
-    tool_selection_prompt = _read_prompt("tool_selection_prompt.txt")
-    final_response_prompt = _read_prompt("final_response_prompt.txt")
-
     safe_context = {
         "candidate_name": _sanitize_text(candidate_name, 120),
         "area": _sanitize_text(area, 120),
@@ -255,58 +664,473 @@ def run_resume_agent(
         "job_title": _sanitize_text(job_title, 180),
         "job_description": _sanitize_text(job_description, MAX_TEXT_CHARS),
     }
+    if sections:
+        unknown = [key for key in sections if key not in SECTION_KEYS]
+        if unknown:
+            raise ValueError(f"Seção desconhecida: {', '.join(unknown)}.")
+        safe_context["sections"] = [key for key in SECTION_KEYS if key in sections]
+    if resume_passages:
+        safe_context["resume_passages"] = [_sanitize_text(passage, PASSAGE_CHARS) for passage in resume_passages]
+    return safe_context
 
-    planning_messages = [
-        {"role": "system", "content": system_prompt},
+
+def _static_prefix() -> str:
+    schemas = json.dumps(
         {
-            "role": "user",
-            "content": (
-                f"Tools disponíveis:\n{_tool_descriptions()}\n\n"
-                f"Contexto:\n{json.dumps(safe_context, ensure_ascii=False)}\n\n"
-                f"{tool_selection_prompt}"
-            ),
+            "planejamento": PLANNING_SCHEMA,
+            "resposta_final": FINAL_SCHEMA,
+            "reescrita_por_secao": section_schema(SECTION_KEYS),
         },
+        ensure_ascii=False,
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return (
+        f"{_read_prompt('system_prompt.txt')}\n\n"
+        f"Tools disponíveis:\n{_tool_descriptions()}\n\n"
+        f"Schemas de saída:\n{schemas}"
+    )
+
+
+def _stage_messages(instructions: str, data: str) -> list[dict[str, str]]:
+    return [
+        {"role": "system", "content": _static_prefix()},
+        {"role": "user", "content": f"{instructions}\n\n{data}"},
     ]
 
-    planning_raw = _ollama_chat(config, planning_messages)
-    planning_json = _safe_json(planning_raw)
+
+def _planning_messages(
+    safe_context: dict[str, Any],
+    prompt_stats: dict[str, Any] | None = None,
+) -> list[dict[str, str]]:
+    built = build_planning_context(safe_context)
+    if prompt_stats is not None:
+        prompt_stats["planning"] = {**built.stats, "prefix_tokens": estimate_tokens(_static_prefix())}
+    return _stage_messages(
+        _read_prompt("tool_selection_prompt.txt"),
+        f"Contexto:\n{built.context_json()}",
+    )
+
+
+def _final_messages(
+    safe_context: dict[str, Any],
+    tool_results: list[dict[str, Any]],
+    prompt_stats: dict[str, Any] | None = None,
+) -> list[dict[str, str]]:
+    built = build_final_context(safe_context, tool_results)
+    if prompt_stats is not None:
+        prompt_stats["final"] = {**built.stats, "prefix_tokens": estimate_tokens(_static_prefix())}
+    return _stage_messages(
+        _read_prompt("final_response_prompt.txt"),
+        f"Contexto base:\n{built.context_json()}\n\nResultados de tools:\n{built.tool_summary_json()}",
+    )
+
+
+def _section_messages(
+    safe_context: dict[str, Any],
+    tool_results: list[dict[str, Any]],
+    prompt_stats: dict[str, Any] | None = None,
+) -> list[dict[str, str]]:
+    sections = safe_context["sections"]
+    built = build_section_context(safe_context, tool_results, sections)
+    if prompt_stats is not None:
+        prompt_stats["section"] = {**built.stats, "prefix_tokens": estimate_tokens(_static_prefix())}
+    return _stage_messages(
+        _read_prompt("section_rewrite_prompt.txt").replace("{secoes}", ", ".join(sections)),
+        f"Contexto base:\n{built.context_json()}\n\nResultados de tools:\n{built.tool_summary_json()}",
+    )
+
+
+def _run_tools(planning_json: dict[str, Any], safe_context: dict[str, Any]) -> list[dict[str, Any]]:
     tool_calls = planning_json.get("tool_calls", []) if isinstance(planning_json, dict) else []
 
     if not isinstance(tool_calls, list):
         tool_calls = []
 
     tool_results = _execute_tool_calls(tool_calls)
-    tool_results = _ensure_required_tool_results(
+    return _ensure_required_tool_results(
         tool_results,
         job_description=safe_context["job_description"],
         resume_skills=safe_context["resume_skills"],
         section_metrics=safe_context["section_metrics"],
     )
 
-    final_messages = [
-        {"role": "system", "content": system_prompt},
-        {
-            "role": "user",
-            "content": (
-                f"Contexto base:\n{json.dumps(safe_context, ensure_ascii=False)}\n\n"
-                f"Resultados de tools:\n{json.dumps(tool_results, ensure_ascii=False)}\n\n"
-                f"{final_response_prompt}"
-            ),
-        },
-    ]
-
-    final_raw = _ollama_chat(config, final_messages)
-    final_json = _safe_json(final_raw)
-    final_json = _normalize_final_output(final_json, tool_results)
 
+def _build_result(
+    config: OllamaConfig,
+    planning_json: dict[str, Any],
+    tool_results: list[dict[str, Any]],
+    final_json: dict[str, Any],
+    timings: dict[str, dict[str, int]],
+    output_errors: dict[str, str | None],
+    prompt_stats: dict[str, Any],
+    usage: dict[str, dict[str, Any]],
+    degraded: list[str] | None = None,
+) -> dict[str, Any]:
     return {
         "model": config.model,
         "parameters": {
             "temperature": config.temperature,
             "top_p": config.top_p,
             "num_predict": config.num_predict,
+            "planning": {
+                "model": usage.get("planning", {}).get("model"),
+                "temperature": config.planning_temperature,
+                "num_predict": usage.get("planning", {}).get("num_predict", config.planning_num_predict),
+                "fallback": config.planning_fallback,
+            },
+            "adaptive_num_predict": config.adaptive_num_predict,
+            "deadline_seconds": config.deadline_seconds,
         },
         "planning": planning_json,
         "tool_results": tool_results,
         "final": final_json,
+        "timings": timings,
+        "prompt_stats": prompt_stats,
+        "usage": usage,
+        "output_errors": {stage: err for stage, err in output_errors.items() if err},
+        "degraded": bool(degraded),
+        "degradations": list(degraded or []),
+    }
+
+
+def _section_result(
+    config: OllamaConfig,
+    tool_results: list[dict[str, Any]],
+    section_json: dict[str, Any],
+    timings: dict[str, dict[str, int]],
+    output_errors: dict[str, str | None],
+    prompt_stats: dict[str, Any],
+    usage: dict[str, dict[str, Any]],
+    sections: list[str],
+    degraded: list[str] | None = None,
+) -> dict[str, Any]:
+    final_json = _normalize_section_output(section_json, sections)
+    result = _build_result(
+        config, {}, tool_results, final_json, timings, output_errors, prompt_stats, usage, degraded
+    )
+    result["parameters"].pop("planning")
+    result["parameters"]["num_predict"] = usage.get("section", {}).get("num_predict", config.num_predict)
+    result["sections"] = sections
+    return result
+
+
+@dataclass
+class _StageCall:
+    config: OllamaConfig
+    messages: list[dict[str, str]]
+    stage: str
+    schema: dict[str, Any]
+    timings: dict[str, dict[str, int]]
+    usage: dict[str, dict[str, Any]]
+
+
+@dataclass
+class _BlockingCall:
+    fn: Callable[..., Any]
+    args: tuple[Any, ...] = ()
+
+
+AgentFlow = Generator[Any, Any, Any]
+
+
+def _stage_budget(config: OllamaConfig, stage: str, degraded: list[str], sections: int = 1) -> OllamaConfig | None:
+    return _deadline_stage(stage_config(config, stage, sections), stage, degraded)
+
+
+def _first_token_event(call: _StageCall, started: float) -> dict[str, Any]:
+    call.timings[call.stage] = {"ttft_ms": _elapsed_ms(started)}
+    return {"event": "first_token", "stage": call.stage, "ttft_ms": call.timings[call.stage]["ttft_ms"]}
+
+
+def _stage_failure(call: _StageCall, exc: Exception) -> tuple[str, bool]:
+    if isinstance(exc, MalformedJSONError):
+        return str(exc), False
+    if _remaining(call.config) > 0:
+        raise exc
+    call.usage.pop(call.stage, None)
+    return _deadline_error(call.config), True
+
+
+def _stage_end_events(
+    call: _StageCall,
+    started: float,
+    parts: list[str],
+    failure: str | None,
+    interrupted: bool,
+) -> list[dict[str, Any]]:
+    events = [{"event": "stage_error", "stage": call.stage, "detail": failure}] if failure else []
+    call.timings.setdefault(call.stage, {"ttft_ms": _elapsed_ms(started)})
+    call.timings[call.stage]["total_ms"] = _elapsed_ms(started)
+    content = "".join(parts)
+    parsed, problem = ({}, failure) if failure else _parse_stage_output(content, call.schema)
+    events.append(
+        {
+            "event": "stage_done",
+            "stage": call.stage,
+            "content": content,
+            "parsed": parsed,
+            "error": problem,
+            "interrupted": interrupted,
+        }
+    )
+    return events
+
+
+def _planning_flow(
+    config: OllamaConfig,
+    messages: list[dict[str, str]],
+    timings: dict[str, dict[str, int]],
+    usage: dict[str, dict[str, Any]],
+) -> AgentFlow:
+    planner = yield _BlockingCall(stage_config, (config, "planning"))
+    try:
+        _require_model(planner)
+        return (yield _StageCall(planner, messages, "planning", PLANNING_SCHEMA, timings, usage))
+    except (ModelNotFound, OllamaUnavailable) as exc:
+        planner = _planning_fallback(config, planner, exc)
+        detail = str(exc)
+
+    yield {"event": "stage_fallback", "stage": "planning", "model": planner and planner.model, "detail": detail}
+    if planner is None:
+        usage.pop("planning", None)
+        done = {"event": "stage_done", "stage": "planning", "content": "", "parsed": {}, "error": detail}
+        yield done
+        return done
+    done = yield _StageCall(planner, messages, "planning", PLANNING_SCHEMA, timings, usage)
+    if "planning" in usage:
+        usage["planning"]["fallback"] = detail
+    return done
+
+
+def _section_flow(safe_context: dict[str, Any], config: OllamaConfig, analise_id: int | None = None) -> AgentFlow:
+    timings: dict[str, dict[str, int]] = {}
+    output_errors: dict[str, str | None] = {}
+    prompt_stats: dict[str, Any] = {}
+    usage: dict[str, dict[str, Any]] = {}
+    degraded: list[str] = []
+    sections = safe_context["sections"]
+
+    yield {"event": "status", "stage": "tools"}
+    tool_results = yield _BlockingCall(_run_tools, ({}, safe_context))
+
+    section_json: dict[str, Any] = {}
+    section_config = yield _BlockingCall(_stage_budget, (config, "section", degraded, len(sections)))
+    if section_config is not None:
+        yield {"event": "status", "stage": "section"}
+        messages = _section_messages(safe_context, tool_results, prompt_stats)
+        done = yield _StageCall(section_config, messages, "section", section_schema(sections), timings, usage)
+        section_json, output_errors["section"] = done["parsed"], done["error"]
+        degraded += ["section_interrupted"] if done["interrupted"] else []
+
+    yield _BlockingCall(record_agent_usage, (usage, analise_id))
+    yield {
+        "event": "done",
+        "result": _section_result(
+            config, tool_results, section_json, timings, output_errors, prompt_stats, usage, sections, degraded
+        ),
     }
+
+
+def _agent_flow(safe_context: dict[str, Any], config: OllamaConfig, analise_id: int | None = None) -> AgentFlow:
+    if safe_context.get("sections"):
+        yield from _section_flow(safe_context, config, analise_id)
+        return
+    timings: dict[str, dict[str, int]] = {}
+    output_errors: dict[str, str | None] = {}
+    prompt_stats: dict[str, Any] = {}
+    usage: dict[str, dict[str, Any]] = {}
+    degraded: list[str] = []
+
+    planning_json: dict[str, Any] = {}
+    if (yield _BlockingCall(_planning_allowed, (config, degraded))):
+        yield {"event": "status", "stage": "planning"}
+        messages = _planning_messages(safe_context, prompt_stats)
+        done = yield from _planning_flow(config, messages, timings, usage)
+        planning_json, output_errors["planning"] = done["parsed"], done["error"]
+        degraded += ["planning_interrupted"] if done.get("interrupted") else []
+
+    yield {"event": "status", "stage": "tools"}
+    tool_results = yield _BlockingCall(_run_tools, (planning_json, safe_context))
+
+    final_json: dict[str, Any] = {}
+    final_config = yield _BlockingCall(_stage_budget, (config, "final", degraded))
+    if final_config is not None:
+        yield {"event": "status", "stage": "final"}
+        messages = _final_messages(safe_context, tool_results, prompt_stats)
+        done = yield _StageCall(final_config, messages, "final", FINAL_SCHEMA, timings, usage)
+        final_json, output_errors["final"] = done["parsed"], done["error"]
+        degraded += ["final_interrupted"] if done["interrupted"] else []
+    final_json = _normalize_final_output(final_json, tool_results)
+
+    yield _BlockingCall(record_agent_usage, (usage, analise_id))
+    yield {
+        "event": "done",
+        "result": _build_result(
+            config, planning_json, tool_results, final_json, timings, output_errors, prompt_stats, usage, degraded
+        ),
+    }
+
+
+def _stream_stage(call: _StageCall) -> Iterator[dict[str, Any]]:
+    started = time.perf_counter()
+    parts: list[str] = []
+    failure, interrupted = None, False
+    call.usage[call.stage] = {}
+    try:
+        stream = _ollama_chat_stream(
+            call.config, call.messages, schema=call.schema, usage=call.usage[call.stage], stage=call.stage
+        )
+        for token in stream:
+            if not parts:
+                yield _first_token_event(call, started)
+            parts.append(token)
+            yield {"event": "token", "stage": call.stage, "content": token}
+    except Exception as exc:
+        failure, interrupted = _stage_failure(call, exc)
+    yield from _stage_end_events(call, started, parts, failure, interrupted)
+
+
+def _drive(flow: AgentFlow) -> Iterator[dict[str, Any]]:
+    reply: Any = None
+    failure: Exception | None = None
+    while True:
+        try:
+            step = flow.throw(failure) if failure is not None else flow.send(reply)
+        except StopIteration:
+            return
+        reply, failure = None, None
+        try:
+            if isinstance(step, _StageCall):
+                for reply in _stream_stage(step):
+                    yield reply
+            elif isinstance(step, _BlockingCall):
+                reply = step.fn(*step.args)
+            else:
+                yield step
+        except Exception as exc:
+            failure = exc
+
+
+def _flow_result(events: Iterator[dict[str, Any]]) -> dict[str, Any]:
+    result: dict[str, Any] = {}
+    for event in events:
+        if event["event"] == "done":
+            result = event["result"]
+    return result
+
+
+def _prepare_context(
+    *,
+    candidate_name: str,
+    area: str,
+    resume_skills: list[str],
+    section_metrics: dict[str, list[tuple]],
+    job_title: str,
+    job_description: str,
+    config: OllamaConfig,
+    analise_id: int | None = None,
+    sections: list[str] | None = None,
+) -> dict[str, Any]:
+    job_description = _agent_job_description(job_description, config)
+    return _build_safe_context(
+        candidate_name=candidate_name,
+        area=area,
+        resume_skills=resume_skills,
+        section_metrics=section_metrics,
+        job_title=job_title,
+        job_description=job_description,
+        sections=sections,
+        resume_passages=retrieve_passages(analise_id, job_description),
+    )
+
+
+def run_resume_agent(
+    *,
+    candidate_name: str,
+    area: str,
+    resume_skills: list[str],
+    section_metrics: dict[str, list[tuple]],
+    job_title: str,
+    job_description: str,
+    config: OllamaConfig,
+    analise_id: int | None = None,
+    sections: list[str] | None = None,
+) -> dict[str, Any]:
+    config = with_deadline(config)
+    safe_context = _prepare_context(
+        candidate_name=candidate_name,
+        area=area,
+        resume_skills=resume_skills,
+        section_metrics=section_metrics,
+        job_title=job_title,
+        job_description=job_description,
+        config=config,
+        analise_id=analise_id,
+        sections=sections,
+    )
+
+    def run() -> dict[str, Any]:
+        return _flow_result(_drive(_agent_flow(safe_context, config, analise_id)))
+
+    if not config.coalesce:
+        return run()
+    return run_coalesced(
+        agent_fingerprint(safe_context, config),
+        run,
+        across_processes=config.coalesce_across_processes,
+        timeout=_coalesce_timeout(config),
+    )
+
+
+def run_resume_agent_stream(
+    *,
+    candidate_name: str,
+    area: str,
+    resume_skills: list[str],
+    section_metrics: dict[str, list[tuple]],
+    job_title: str,
+    job_description: str,
+    config: OllamaConfig,
+    analise_id: int | None = None,
+    sections: list[str] | None = None,
+) -> Iterator[dict[str, Any]]:
+    config = with_deadline(config)
+    safe_context = _prepare_context(
+        candidate_name=candidate_name,
+        area=area,
+        resume_skills=resume_skills,
+        section_metrics=section_metrics,
+        job_title=job_title,
+        job_description=job_description,
+        config=config,
+        analise_id=analise_id,
+        sections=sections,
+    )
+    events = _drive(_agent_flow(safe_context, config, analise_id))
+    if not config.coalesce:
+        yield from events
+        return
+
+    key = agent_fingerprint(safe_context, config)
+    flight, leader = LOCAL_FLIGHTS.begin(key)
+    if not leader:
+        yield {"event": "status", "stage": "coalesced"}
+        try:
+            result = flight.wait(_coalesce_timeout(config))
+        except TimeoutError:
+            yield from events
+            return
+        yield {"event": "done", "result": result}
+        return
+
+    try:
+        for event in events:
+            if event["event"] == "done":
+                LOCAL_FLIGHTS.finish(key, flight, result=event["result"])
+            yield event
+    except BaseException as exc:
+        LOCAL_FLIGHTS.finish(key, flight, error=exc)
+        raise
+    finally:
+        LOCAL_FLIGHTS.finish(key, flight, error=RuntimeError("A execução terminou sem resultado."))
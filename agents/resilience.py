@@ -0,0 +1,251 @@
+"""Bounded retries with jittered backoff and a circuit breaker for Ollama calls."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import os
+import random
+import sqlite3
+import threading
+import time
+from typing import Any, AsyncIterator, Callable, Iterator
+
+from agents.router import parse_endpoints
+from core.db import fetch_breaker_states, upsert_breaker_state
+
+RETRY_ATTEMPTS = 3
+RETRY_BASE_SECONDS = 0.5
+RETRY_MAX_SECONDS = 4.0
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("OLLAMA_BREAKER_FAILURES", "3"))
+BREAKER_COOLDOWN_SECONDS = float(os.getenv("OLLAMA_BREAKER_COOLDOWN_SECONDS", "30"))
+STATE_SEVERITY = {"closed": 0, "half_open": 1, "open": 2}
+
+logger = logging.getLogger(__name__)
+
+
+class OllamaUnavailable(RuntimeError):
+    def __init__(self, message: str, *, retryable: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class CircuitOpen(RuntimeError):
+    def __init__(self, retry_after: int):
+        super().__init__(
+            f"Ollama indisponível após falhas seguidas. Nova tentativa liberada em {retry_after}s."
+        )
+        self.retry_after = retry_after
+
+
+def backoff_delay(attempt: int) -> float:
+    return random.uniform(0, min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2**attempt))
+
+
+def _retry_delay(attempt: int, deadline_at: float) -> float:
+    delay = backoff_delay(attempt)
+    return min(delay, max(0.0, deadline_at - time.time())) if deadline_at else delay
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int, cooldown_seconds: float, name: str | None = None):
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.cooldown_seconds = float(cooldown_seconds)
+        self.name = name
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: float | None = None
+        self._trial_in_flight = False
+
+    def _retry_after(self, now: float) -> int:
+        if self._opened_at is None:
+            return 0
+        return max(1, int(self._opened_at + self.cooldown_seconds - now + 0.999))
+
+    def before_call(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if now < self._opened_at + self.cooldown_seconds:
+                raise CircuitOpen(self._retry_after(now))
+            if self._trial_in_flight:
+                raise CircuitOpen(1)
+            self._trial_in_flight = True
+
+    def _publish(self, failures: int, open_until: float) -> None:
+        if self.name is None:
+            return
+        try:
+            upsert_breaker_state(self.name, failures, open_until)
+        except sqlite3.Error:
+            logger.warning("Falha ao publicar o estado do circuit breaker de %s.", self.name, exc_info=True)
+
+    def record_success(self) -> None:
+        with self._lock:
+            changed = self._failures > 0 or self._opened_at is not None
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+        if changed:
+            self._publish(0, 0.0)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._trial_in_flight = False
+            failures = self._failures
+            open_until = time.time() + self.cooldown_seconds if self._opened_at is not None else 0.0
+        self._publish(failures, open_until)
+
+    def release_trial(self) -> None:
+        with self._lock:
+            self._trial_in_flight = False
+
+    def state(self) -> dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            if self._opened_at is None:
+                name = "closed"
+            elif now < self._opened_at + self.cooldown_seconds:
+                name = "open"
+            else:
+                name = "half_open"
+            return {
+                "state": name,
+                "consecutive_failures": self._failures,
+                "retry_after": self._retry_after(now) if name == "open" else 0,
+            }
+
+
+_breakers: dict[tuple[str, ...], CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(base_url: str) -> CircuitBreaker:
+    urls = parse_endpoints(base_url)
+    with _breakers_lock:
+        breaker = _breakers.get(urls)
+        if breaker is None:
+            breaker = _breakers[urls] = CircuitBreaker(
+                BREAKER_FAILURE_THRESHOLD, BREAKER_COOLDOWN_SECONDS, name=",".join(urls)
+            )
+        return breaker
+
+
+def _published_state(row: dict[str, Any], now: float) -> dict[str, Any]:
+    if row["open_until"] > now:
+        name = "open"
+    elif row["open_until"] and row["failures"]:
+        name = "half_open"
+    else:
+        name = "closed"
+    return {
+        "state": name,
+        "consecutive_failures": row["failures"],
+        "retry_after": max(1, math.ceil(row["open_until"] - now)) if name == "open" else 0,
+    }
+
+
+def _published_states(base_url: str | None = None) -> dict[str, dict[str, Any]]:
+    try:
+        rows = fetch_breaker_states(base_url)
+    except sqlite3.Error:
+        logger.warning("Falha ao ler o estado compartilhado dos circuit breakers.", exc_info=True)
+        return {}
+    now = time.time()
+    return {key: _published_state(row, now) for key, row in rows.items()}
+
+
+def _worst(*states: dict[str, Any] | None) -> dict[str, Any]:
+    present = [state for state in states if state is not None]
+    if not present:
+        return {"state": "closed", "consecutive_failures": 0, "retry_after": 0}
+    return max(present, key=lambda state: (STATE_SEVERITY[state["state"]], state["retry_after"]))
+
+
+def breaker_state(base_url: str) -> dict[str, Any]:
+    try:
+        urls = parse_endpoints(base_url)
+    except ValueError:
+        return _worst()
+    key = ",".join(urls)
+    with _breakers_lock:
+        breaker = _breakers.get(urls)
+    return _worst(breaker.state() if breaker else None, _published_states(key).get(key))
+
+
+def ensure_closed(base_url: str) -> None:
+    state = breaker_state(base_url)
+    if state["state"] == "open":
+        raise CircuitOpen(state["retry_after"])
+
+
+def breakers_snapshot() -> dict[str, dict[str, Any]]:
+    with _breakers_lock:
+        local = {",".join(urls): breaker.state() for urls, breaker in _breakers.items()}
+    published = _published_states()
+    return {key: _worst(local.get(key), published.get(key)) for key in sorted({*local, *published})}
+
+
+def resilient_stream(
+    base_url: str,
+    attempt: Callable[[], Iterator[str]],
+    *,
+    deadline_at: float = 0.0,
+) -> Iterator[str]:
+    breaker = get_breaker(base_url)
+    for number in range(RETRY_ATTEMPTS):
+        breaker.before_call()
+        produced = False
+        try:
+            for token in attempt():
+                produced = True
+                yield token
+        except OllamaUnavailable as exc:
+            breaker.record_failure()
+            if produced or not exc.retryable or number == RETRY_ATTEMPTS - 1:
+                raise
+            time.sleep(_retry_delay(number, deadline_at))
+            continue
+        except BaseException:
+            if produced:
+                breaker.record_success()
+            else:
+                breaker.release_trial()
+            raise
+        breaker.record_success()
+        return
+
+
+async def resilient_stream_async(
+    base_url: str,
+    attempt: Callable[[], AsyncIterator[str]],
+    *,
+    deadline_at: float = 0.0,
+) -> AsyncIterator[str]:
+    breaker = get_breaker(base_url)
+    for number in range(RETRY_ATTEMPTS):
+        breaker.before_call()
+        produced = False
+        try:
+            async for token in attempt():
+                produced = True
+                yield token
+        except OllamaUnavailable as exc:
+            breaker.record_failure()
+            if produced or not exc.retryable or number == RETRY_ATTEMPTS - 1:
+                raise
+            await asyncio.sleep(_retry_delay(number, deadline_at))
+            continue
+        except BaseException:
+            if produced:
+                breaker.record_success()
+            else:
+                breaker.release_trial()
+            raise
+        breaker.record_success()
+        return
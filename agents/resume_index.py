@@ -0,0 +1,121 @@
+"""Lexical (BM25) index of resume passages for the agent context."""
+
+from __future__ import annotations
+
+import logging
+import math
+import re
+import sqlite3
+import unicodedata
+from collections import Counter
+
+from agents.context_builder import estimate_tokens
+from core.db import fetch_analise_artifacts, fetch_resume_passages, replace_resume_passages
+
+PASSAGE_CHARS = 400
+RETRIEVAL_TOP_K = 4
+RETRIEVAL_TOKEN_BUDGET = 300
+BM25_K1 = 1.2
+BM25_B = 0.75
+STOPWORDS = frozenset(
+    """
+    a ao aos as com como da das de do dos e em entre na nas no nos o os ou para pela pelas pelo pelos por que se
+    sem sob sobre um uma uns umas ser ter foi sao mais muito and the of to in for with on at by an or as is are be
+    """.split()
+)
+
+logger = logging.getLogger(__name__)
+
+
+def tokenize(text: str) -> list[str]:
+    plain = unicodedata.normalize("NFKD", text or "").encode("ascii", "ignore").decode("ascii").casefold()
+    return [word for word in re.findall(r"[a-z0-9+#]+", plain) if len(word) > 1 and word not in STOPWORDS]
+
+
+def split_passages(text: str, max_chars: int = PASSAGE_CHARS) -> list[str]:
+    passages: list[str] = []
+    current = ""
+    for line in (text or "").splitlines():
+        line = line.strip()
+        if len(line) > max_chars and current:
+            passages.append(current)
+            current = ""
+        while len(line) > max_chars:
+            cut = line.rfind(" ", 0, max_chars)
+            cut = cut if cut > max_chars // 2 else max_chars
+            passages.append(line[:cut].strip())
+            line = line[cut:].strip()
+        if not line:
+            continue
+        if current and len(current) + len(line) + 1 > max_chars:
+            passages.append(current)
+            current = line
+        else:
+            current = f"{current}\n{line}" if current else line
+    if current:
+        passages.append(current)
+    return passages
+
+
+def index_resume(analise_id: int, text: str) -> int:
+    passages = [(passage, dict(Counter(tokenize(passage)))) for passage in split_passages(text)]
+    replace_resume_passages(analise_id, passages)
+    return len(passages)
+
+
+def _indexed_passages(analise_id: int) -> list[dict]:
+    passages = fetch_resume_passages(analise_id)
+    if passages:
+        return passages
+    parsed, _ = fetch_analise_artifacts(analise_id)
+    if not parsed.get("texto"):
+        return []
+    index_resume(analise_id, parsed["texto"])
+    return fetch_resume_passages(analise_id)
+
+
+def bm25_scores(passages: list[dict], query_terms: list[str]) -> list[float]:
+    if not passages:
+        return []
+    lengths = [sum(p["terms"].values()) for p in passages]
+    avg_length = sum(lengths) / len(lengths) or 1.0
+    total = len(passages)
+    scores = [0.0] * total
+    for term in set(query_terms):
+        containing = sum(1 for p in passages if term in p["terms"])
+        if not containing:
+            continue
+        idf = math.log(1 + (total - containing + 0.5) / (containing + 0.5))
+        for i, passage in enumerate(passages):
+            tf = passage["terms"].get(term, 0)
+            if tf:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[i] / avg_length)
+                scores[i] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+    return scores
+
+
+def retrieve_passages(
+    analise_id: int | None,
+    query: str,
+    top_k: int = RETRIEVAL_TOP_K,
+    budget_tokens: int = RETRIEVAL_TOKEN_BUDGET,
+) -> list[str]:
+    if analise_id is None or not query.strip():
+        return []
+    try:
+        passages = _indexed_passages(analise_id)
+    except sqlite3.Error:
+        logger.warning("Falha ao ler o índice de trechos da análise %s.", analise_id, exc_info=True)
+        return []
+    scores = bm25_scores(passages, tokenize(query))
+    ranked = sorted((i for i, score in enumerate(scores) if score > 0), key=lambda i: -scores[i])[:top_k]
+
+    chosen: list[int] = []
+    used = 0
+    for i in ranked:
+        cost = estimate_tokens(passages[i]["text"])
+        if used + cost > budget_tokens:
+            continue
+        chosen.append(i)
+        used += cost
+    return [passages[i]["text"] for i in sorted(chosen)]
@@ -0,0 +1,339 @@
+"""Least-outstanding routing across several Ollama endpoints with health probes and adaptive limits."""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator
+from urllib import error, parse, request
+
+from agents.concurrency import ADAPTIVE_CONCURRENCY, AdaptiveLimit
+from core.db import fetch_endpoint_stats, upsert_endpoint_stats
+
+DEFAULT_BASE_URL = os.getenv("OLLAMA_ENDPOINTS", "http://localhost:11434")
+PROBE_INTERVAL_SECONDS = float(os.getenv("OLLAMA_PROBE_INTERVAL_SECONDS", "15"))
+PROBE_TIMEOUT_SECONDS = 2.0
+EJECT_AFTER_FAILURES = 2
+EJECT_SECONDS = 30.0
+AFFINITY_SLACK = 1
+STATS_PUBLISH_SECONDS = 5.0
+STATS_STALE_SECONDS = 30.0
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_endpoint(url: str) -> str:
+    url = (url or "").strip().rstrip("/")
+    if url and "://" not in url:
+        url = f"http://{url}"
+    parts = parse.urlsplit(url)
+    if parts.scheme not in {"http", "https"} or not parts.hostname:
+        raise ValueError(f"Endereço do Ollama inválido: {url!r}.")
+    return f"{parts.scheme}://{parts.netloc}{parts.path}"
+
+
+def parse_endpoints(base_url: str) -> tuple[str, ...]:
+    urls = [normalize_endpoint(part) for part in (base_url or "").split(",") if part.strip()]
+    if not urls:
+        raise ValueError("Informe ao menos um endereço do Ollama.")
+    return tuple(dict.fromkeys(urls))
+
+
+def _model_tag(name: str) -> str:
+    return name if ":" in name else f"{name}:latest"
+
+
+class Endpoint:
+    def __init__(self, url: str):
+        self.url = url
+        self.outstanding = 0
+        self.failures = 0
+        self.ejected_until = 0.0
+        self.models: set[str] | None = None
+        self.last_probe = 0.0
+        self.last_error: str | None = None
+        self.limiter = AdaptiveLimit()
+        self._router: OllamaRouter | None = None
+
+    def available(self, now: float) -> bool:
+        return now >= self.ejected_until
+
+    def mark_success(self) -> None:
+        if self._router is not None:
+            self._router._record(self, ok=True)
+
+    def has_spare(self) -> bool:
+        return not ADAPTIVE_CONCURRENCY or self.outstanding < self.limiter.value
+
+    def load(self) -> float:
+        return self.outstanding / self.limiter.limit if ADAPTIVE_CONCURRENCY else float(self.outstanding)
+
+    def observe(self, started: float, latency: float, tokens: int, stage: str = "chat") -> None:
+        self.limiter.on_success(started, latency, tokens, self.outstanding, stage)
+
+    def mark_failure(self, detail: str | None = None, *, eject: bool = False, started: float | None = None) -> None:
+        self.limiter.on_error(started)
+        if self._router is not None:
+            self._router._record(self, ok=False, detail=detail, eject=eject)
+
+
+class OllamaRouter:
+    def __init__(
+        self,
+        urls: tuple[str, ...],
+        *,
+        probe_interval: float = PROBE_INTERVAL_SECONDS,
+        eject_after: int = EJECT_AFTER_FAILURES,
+        eject_seconds: float = EJECT_SECONDS,
+    ):
+        self.endpoints = [Endpoint(url) for url in urls]
+        for endpoint in self.endpoints:
+            endpoint._router = self
+        self.probe_interval = probe_interval
+        self.eject_after = max(1, int(eject_after))
+        self.eject_seconds = float(eject_seconds)
+        self._lock = threading.Lock()
+        self._prober: threading.Thread | None = None
+        self._stopped = threading.Event()
+        self.last_used = 0.0
+
+    def _record(self, endpoint: Endpoint, *, ok: bool, detail: str | None = None, eject: bool = False) -> None:
+        with self._lock:
+            if ok:
+                endpoint.failures = 0
+                endpoint.ejected_until = 0.0
+                endpoint.last_error = None
+                return
+            endpoint.failures += 1
+            endpoint.last_error = detail
+            if eject or endpoint.failures >= self.eject_after:
+                endpoint.ejected_until = time.monotonic() + self.eject_seconds
+
+    def _rank(self, endpoint: Endpoint, model: str) -> str:
+        return hashlib.sha256(f"{model}|{endpoint.url}".encode("utf-8")).hexdigest()
+
+    def pick(self, model: str) -> Endpoint:
+        now = time.monotonic()
+        tag = _model_tag(model)
+        candidates = [e for e in self.endpoints if e.available(now)]
+        if not candidates:
+            return min(self.endpoints, key=lambda e: e.ejected_until)
+        with_model = [e for e in candidates if e.models is None or tag in e.models]
+        candidates = with_model or candidates
+        candidates = [e for e in candidates if e.has_spare()] or candidates
+
+        least = min(candidates, key=lambda e: e.load())
+        home = max(candidates, key=lambda e: self._rank(e, tag))
+        if home.outstanding <= least.outstanding + AFFINITY_SLACK:
+            return home
+        return least
+
+    def capacity(self) -> int:
+        now = time.monotonic()
+        healthy = [e for e in self.endpoints if e.available(now)] or self.endpoints
+        return sum(e.limiter.value for e in healthy)
+
+    def lacks_model(self, model: str) -> bool:
+        tag = _model_tag(model)
+        return all(e.models is not None and tag not in e.models for e in self.endpoints)
+
+    @contextmanager
+    def lease(self, model: str) -> Iterator[Endpoint]:
+        self.ensure_prober()
+        with self._lock:
+            endpoint = self.pick(model)
+            endpoint.outstanding += 1
+        failed = False
+        try:
+            yield endpoint
+        except Exception:
+            failed = True
+            raise
+        finally:
+            with self._lock:
+                endpoint.outstanding -= 1
+            if not failed:
+                endpoint.mark_success()
+
+    def probe(self, endpoint: Endpoint) -> bool:
+        try:
+            with request.urlopen(f"{endpoint.url}/api/tags", timeout=PROBE_TIMEOUT_SECONDS) as resp:
+                payload = json.loads(resp.read().decode("utf-8"))
+        except (error.URLError, OSError, ValueError) as exc:
+            endpoint.last_probe = time.time()
+            endpoint.mark_failure(str(exc), eject=True)
+            return False
+        endpoint.models = {_model_tag(str(m.get("name", ""))) for m in payload.get("models", [])}
+        endpoint.last_probe = time.time()
+        endpoint.mark_success()
+        return True
+
+    def probe_all(self) -> None:
+        for endpoint in self.endpoints:
+            self.probe(endpoint)
+
+    def ensure_prober(self) -> None:
+        if self._prober is not None or self.probe_interval <= 0 or len(self.endpoints) < 2:
+            return
+        with self._lock:
+            if self._prober is not None:
+                return
+            self._prober = threading.Thread(target=self._probe_loop, name="ollama-router-probe", daemon=True)
+            self._prober.start()
+
+    def _probe_loop(self) -> None:
+        while not self._stopped.is_set():
+            self.probe_all()
+            self._stopped.wait(self.probe_interval)
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    def snapshot(self) -> list[dict[str, Any]]:
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {
+                    "url": e.url,
+                    "healthy": e.available(now),
+                    "outstanding": e.outstanding,
+                    **e.limiter.snapshot(),
+                    "failures": e.failures,
+                    "ejected_for_seconds": round(max(0.0, e.ejected_until - now), 1),
+                    "models": sorted(e.models) if e.models is not None else None,
+                    "last_error": e.last_error,
+                }
+                for e in self.endpoints
+            ]
+
+
+_routers: dict[tuple[str, ...], OllamaRouter] = {}
+_routers_lock = threading.Lock()
+
+
+def get_router(base_url: str) -> OllamaRouter:
+    urls = parse_endpoints(base_url)
+    with _routers_lock:
+        router = _routers.get(urls)
+        if router is None:
+            router = _routers[urls] = OllamaRouter(urls)
+        router.last_used = time.time()
+    _ensure_publisher()
+    return router
+
+
+def routers_snapshot() -> dict[str, list[dict[str, Any]]]:
+    with _routers_lock:
+        routers = dict(_routers)
+    return {",".join(urls): router.snapshot() for urls, router in routers.items()}
+
+
+def _owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _local_samples() -> list[tuple[str, str, dict[str, Any], float]]:
+    with _routers_lock:
+        routers = dict(_routers)
+    return [
+        (",".join(urls), endpoint["url"], endpoint, router.last_used)
+        for urls, router in routers.items()
+        for endpoint in router.snapshot()
+    ]
+
+
+def publish_endpoint_stats() -> None:
+    rows = [(key, url, json.dumps(snapshot), last_used) for key, url, snapshot, last_used in _local_samples()]
+    if not rows:
+        return
+    try:
+        upsert_endpoint_stats(_owner(), rows, STATS_STALE_SECONDS)
+    except sqlite3.Error:
+        logger.warning("Falha ao publicar as métricas dos servidores Ollama.", exc_info=True)
+
+
+_publisher: threading.Thread | None = None
+_publisher_lock = threading.Lock()
+
+
+def _publish_loop() -> None:
+    while True:
+        time.sleep(STATS_PUBLISH_SECONDS)
+        publish_endpoint_stats()
+
+
+def _ensure_publisher() -> None:
+    global _publisher
+    with _publisher_lock:
+        if _publisher is None or not _publisher.is_alive():
+            _publisher = threading.Thread(target=_publish_loop, name="ollama-endpoint-stats", daemon=True)
+            _publisher.start()
+
+
+def _shared_samples() -> list[tuple[str, str, dict[str, Any], float]]:
+    owner = _owner()
+    try:
+        rows = fetch_endpoint_stats(STATS_STALE_SECONDS)
+    except sqlite3.Error:
+        logger.warning("Falha ao ler as métricas publicadas dos servidores Ollama.", exc_info=True)
+        rows = []
+    published = [
+        (row["router"], row["url"], json.loads(row["snapshot_json"]), row["last_used"])
+        for row in rows
+        if row["owner"] != owner
+    ]
+    return published + _local_samples()
+
+
+def _merge_endpoint(samples: list[dict[str, Any]]) -> dict[str, Any]:
+    latest = max(samples, key=lambda sample: sample["updated_at"])
+    baselines: dict[str, int] = {}
+    for sample in samples:
+        for stage, ms in sample["baseline_latency_ms"].items():
+            baselines[stage] = min(ms, baselines.get(stage, ms))
+    models = [set(sample["models"]) for sample in samples if sample["models"] is not None]
+    errors = [sample for sample in samples if sample["last_error"]]
+    return {
+        **latest,
+        "healthy": all(sample["healthy"] for sample in samples),
+        "outstanding": sum(sample["outstanding"] for sample in samples),
+        "baseline_latency_ms": dict(sorted(baselines.items())),
+        "calls_per_minute": round(sum(sample["calls_per_minute"] for sample in samples), 1),
+        "tokens_per_second": round(sum(sample["tokens_per_second"] for sample in samples), 1),
+        "increases": sum(sample["increases"] for sample in samples),
+        "decreases": sum(sample["decreases"] for sample in samples),
+        "errors": sum(sample["errors"] for sample in samples),
+        "failures": max(sample["failures"] for sample in samples),
+        "ejected_for_seconds": max(sample["ejected_for_seconds"] for sample in samples),
+        "models": sorted(set().union(*models)) if models else None,
+        "last_error": max(errors, key=lambda sample: sample["updated_at"])["last_error"] if errors else None,
+        "processes": len(samples),
+    }
+
+
+def shared_routers_snapshot() -> dict[str, list[dict[str, Any]]]:
+    grouped: dict[str, dict[str, list[dict[str, Any]]]] = {}
+    for key, url, snapshot, _ in _shared_samples():
+        grouped.setdefault(key, {}).setdefault(url, []).append(snapshot)
+    return {key: [_merge_endpoint(samples) for samples in by_url.values()] for key, by_url in grouped.items()}
+
+
+def routers_capacity() -> int | None:
+    samples = _shared_samples()
+    if not samples:
+        return None
+    current = max(samples, key=lambda sample: sample[3])[0]
+    by_url: dict[str, list[dict[str, Any]]] = {}
+    for key, url, snapshot, _ in samples:
+        if key == current:
+            by_url.setdefault(url, []).append(snapshot)
+    endpoints = [_merge_endpoint(snapshots) for snapshots in by_url.values()]
+    healthy = [endpoint for endpoint in endpoints if endpoint["healthy"]] or endpoints
+    return sum(endpoint["limit"] for endpoint in healthy)
@@ -0,0 +1,216 @@
+"""Single-flight coalescing of identical concurrent agent runs."""
+
+from __future__ import annotations
+
+import asyncio
+import copy
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from typing import Any, Awaitable, Callable
+
+from core.db import claim_agent_flight, complete_agent_flight, release_agent_flight
+
+FLIGHT_POLL_SECONDS = 0.5
+FLIGHT_STALE_SECONDS = 300
+FLIGHT_RESULT_TTL_SECONDS = 30
+
+
+class Flight:
+    def __init__(self) -> None:
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._async_waiters: list[tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+        self.result: Any = None
+        self.error: BaseException | None = None
+
+    def resolve(self, result: Any = None, error: BaseException | None = None) -> None:
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.result = result
+            self.error = error
+            self._event.set()
+            waiters, self._async_waiters = self._async_waiters, []
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_set_future_done, future)
+
+    def wait(self, timeout: float | None = None) -> Any:
+        if not self._event.wait(timeout):
+            raise TimeoutError("Tempo esgotado aguardando execução idêntica em andamento.")
+        return self._outcome()
+
+    async def wait_async(self, timeout: float | None = None) -> Any:
+        with self._lock:
+            if not self._event.is_set():
+                loop = asyncio.get_running_loop()
+                future = loop.create_future()
+                self._async_waiters.append((loop, future))
+            else:
+                future = None
+        if future is not None:
+            try:
+                await asyncio.wait_for(future, timeout)
+            except TimeoutError:
+                raise TimeoutError("Tempo esgotado aguardando execução idêntica em andamento.") from None
+        return self._outcome()
+
+    def _outcome(self) -> Any:
+        if self.error is not None:
+            raise RuntimeError(f"Execução idêntica em andamento falhou: {self.error}") from self.error
+        return copy.deepcopy(self.result)
+
+
+def _set_future_done(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class SingleFlight:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._flights: dict[str, Flight] = {}
+
+    def begin(self, key: str) -> tuple[Flight, bool]:
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                return flight, False
+            flight = Flight()
+            self._flights[key] = flight
+            return flight, True
+
+    def finish(self, key: str, flight: Flight, result: Any = None, error: BaseException | None = None) -> None:
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        flight.resolve(result, error)
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._flights)
+
+
+LOCAL_FLIGHTS = SingleFlight()
+
+
+def agent_fingerprint(safe_context: dict[str, Any], config: Any) -> str:
+    material = {
+        "context": safe_context,
+        "model": config.model,
+        "base_url": config.base_url,
+        "temperature": config.temperature,
+        "top_p": config.top_p,
+        "num_predict": config.num_predict,
+        "deadline_seconds": config.deadline_seconds,
+        "planning_model": config.planning_model,
+        "planning_temperature": config.planning_temperature,
+        "planning_num_predict": config.planning_num_predict,
+        "planning_fallback": config.planning_fallback,
+    }
+    return hashlib.sha256(
+        json.dumps(material, ensure_ascii=False, sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()
+
+
+def _flight_owner() -> str:
+    return f"{os.getpid()}:{threading.get_ident()}"
+
+
+def _wait_until(timeout: float | None) -> float:
+    return math.inf if timeout is None else time.monotonic() + timeout
+
+
+def _run_across_processes(key: str, fn: Callable[[], dict[str, Any]], timeout: float | None) -> dict[str, Any]:
+    owner = _flight_owner()
+    until = _wait_until(timeout)
+    while True:
+        state, result_json = claim_agent_flight(key, owner, FLIGHT_STALE_SECONDS, FLIGHT_RESULT_TTL_SECONDS)
+        if state == "done" and result_json:
+            return json.loads(result_json)
+        if state == "leader":
+            try:
+                result = fn()
+            except BaseException:
+                release_agent_flight(key, owner)
+                raise
+            complete_agent_flight(key, owner, json.dumps(result, ensure_ascii=False, default=str))
+            return result
+        if time.monotonic() >= until:
+            return fn()
+        time.sleep(min(FLIGHT_POLL_SECONDS, until - time.monotonic()))
+
+
+async def _run_across_processes_async(
+    key: str,
+    fn: Callable[[], Awaitable[dict[str, Any]]],
+    timeout: float | None,
+) -> dict[str, Any]:
+    owner = f"{_flight_owner()}:{id(asyncio.current_task())}"
+    until = _wait_until(timeout)
+    while True:
+        state, result_json = await asyncio.to_thread(
+            claim_agent_flight, key, owner, FLIGHT_STALE_SECONDS, FLIGHT_RESULT_TTL_SECONDS
+        )
+        if state == "done" and result_json:
+            return json.loads(result_json)
+        if state == "leader":
+            try:
+                result = await fn()
+            except BaseException:
+                await asyncio.to_thread(release_agent_flight, key, owner)
+                raise
+            await asyncio.to_thread(
+                complete_agent_flight, key, owner, json.dumps(result, ensure_ascii=False, default=str)
+            )
+            return result
+        if time.monotonic() >= until:
+            return await fn()
+        await asyncio.sleep(min(FLIGHT_POLL_SECONDS, until - time.monotonic()))
+
+
+def run_coalesced(
+    key: str,
+    fn: Callable[[], dict[str, Any]],
+    *,
+    across_processes: bool = False,
+    timeout: float | None = None,
+) -> dict[str, Any]:
+    flight, leader = LOCAL_FLIGHTS.begin(key)
+    if not leader:
+        try:
+            return flight.wait(timeout)
+        except TimeoutError:
+            return fn()
+    try:
+        result = _run_across_processes(key, fn, timeout) if across_processes else fn()
+    except BaseException as exc:
+        LOCAL_FLIGHTS.finish(key, flight, error=exc)
+        raise
+    LOCAL_FLIGHTS.finish(key, flight, result=result)
+    return result
+
+
+async def run_coalesced_async(
+    key: str,
+    fn: Callable[[], Awaitable[dict[str, Any]]],
+    *,
+    across_processes: bool = False,
+    timeout: float | None = None,
+) -> dict[str, Any]:
+    flight, leader = LOCAL_FLIGHTS.begin(key)
+    if not leader:
+        try:
+            return await flight.wait_async(timeout)
+        except TimeoutError:
+            return await fn()
+    try:
+        result = await (_run_across_processes_async(key, fn, timeout) if across_processes else fn())
+    except BaseException as exc:
+        LOCAL_FLIGHTS.finish(key, flight, error=exc)
+        raise
+    LOCAL_FLIGHTS.finish(key, flight, result=result)
+    return result
@@ -0,0 +1,288 @@
+"""JSON schemas for the agent stages and an incremental validator for streamed JSON."""
+
+from __future__ import annotations
+
+import re
+from typing import Any
+
+from tools.resume_tools import TOOL_SPECS
+
+SECTION_KEYS = ("estrutura", "experiencia", "habilidades")
+PRIORITY_VALUES = ("alta", "media", "baixa")
+
+PLANNING_SCHEMA: dict[str, Any] = {
+    "type": "object",
+    "properties": {
+        "tool_calls": {
+            "type": "array",
+            "maxItems": 4,
+            "items": {
+                "type": "object",
+                "properties": {
+                    "name": {"type": "string", "enum": [t.name for t in TOOL_SPECS]},
+                    "arguments": {"type": "object"},
+                },
+                "required": ["name", "arguments"],
+            },
+        }
+    },
+    "required": ["tool_calls"],
+}
+
+_STRING_LIST = {"type": "array", "items": {"type": "string"}}
+
+FINAL_SCHEMA: dict[str, Any] = {
+    "type": "object",
+    "properties": {
+        "summary": {"type": "string"},
+        "ats_risk": {"type": "string", "enum": ["baixo", "medio", "alto"]},
+        "strengths": _STRING_LIST,
+        "weaknesses": _STRING_LIST,
+        "section_rewrites": {
+            "type": "object",
+            "properties": {key: _STRING_LIST for key in SECTION_KEYS},
+            "required": list(SECTION_KEYS),
+        },
+        "next_actions": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "acao": {"type": "string"},
+                    "prioridade": {"type": "string", "enum": list(PRIORITY_VALUES)},
+                },
+                "required": ["acao", "prioridade"],
+            },
+        },
+    },
+    "required": ["summary", "ats_risk", "strengths", "weaknesses", "section_rewrites", "next_actions"],
+}
+
+
+def section_schema(sections: list[str] | tuple[str, ...]) -> dict[str, Any]:
+    return {
+        "type": "object",
+        "properties": {
+            "summary": {"type": "string"},
+            "section_rewrites": {
+                "type": "object",
+                "properties": {key: _STRING_LIST for key in sections},
+                "required": list(sections),
+            },
+        },
+        "required": ["summary", "section_rewrites"],
+    }
+
+
+class MalformedJSONError(ValueError):
+    pass
+
+
+_NUMBER_RE = re.compile(r"-?(0|[1-9]\d*)(\.\d+)?([eE][+-]?\d+)?")
+_LITERALS = ("true", "false", "null")
+_WHITESPACE = " \t\r\n"
+
+
+class IncrementalJSONParser:
+    """Character-level JSON syntax checker fed with streamed chunks.
+
+    Raises MalformedJSONError at the first character that cannot belong to a
+    single top-level JSON object, so the caller can abort the generation.
+    """
+
+    def __init__(self) -> None:
+        self._stack: list[list[str]] = []
+        self._scalar: str | None = None
+        self._buffer = ""
+        self._string_is_key = False
+        self._escape = False
+        self._unicode_left = 0
+        self._started = False
+        self.complete = False
+        self.consumed = 0
+        self.end_offset: int | None = None
+        self.trailing = ""
+
+    @property
+    def depth(self) -> int:
+        return len(self._stack)
+
+    def feed(self, chunk: str) -> bool:
+        for ch in chunk:
+            if self.complete:
+                self.trailing += ch
+                continue
+            self._feed_char(ch)
+            self.consumed += 1
+            if self.complete:
+                self.end_offset = self.consumed
+        return self.complete
+
+    def _fail(self, ch: str) -> None:
+        raise MalformedJSONError(f"Caractere inesperado {ch!r} na posição {self.consumed} da saída do modelo.")
+
+    def _feed_char(self, ch: str) -> None:
+        if self._scalar == "string":
+            self._feed_string(ch)
+            return
+        if self._scalar in {"number", "literal"}:
+            if ch in _WHITESPACE or ch in ",}]":
+                self._finish_bare_scalar(ch)
+            else:
+                self._buffer += ch
+                if self._scalar == "literal" and not any(lit.startswith(self._buffer) for lit in _LITERALS):
+                    self._fail(ch)
+                return
+
+        if ch in _WHITESPACE:
+            return
+
+        if not self._started:
+            if ch != "{":
+                self._fail(ch)
+            self._started = True
+            self._stack.append(["object", "key_or_end"])
+            return
+
+        frame = self._stack[-1]
+        expect = frame[1]
+
+        if expect in {"key_or_end", "key"}:
+            if ch == '"':
+                self._begin_string(is_key=True)
+            elif ch == "}" and expect == "key_or_end":
+                self._close()
+            else:
+                self._fail(ch)
+        elif expect == "colon":
+            if ch != ":":
+                self._fail(ch)
+            frame[1] = "value"
+        elif expect in {"value", "value_or_end"}:
+            if ch == "]" and expect == "value_or_end":
+                self._close()
+            else:
+                self._begin_value(ch)
+        elif expect == "comma_or_end":
+            if ch == ",":
+                frame[1] = "key" if frame[0] == "object" else "value"
+            elif ch == "}" and frame[0] == "object":
+                self._close()
+            elif ch == "]" and frame[0] == "array":
+                self._close()
+            else:
+                self._fail(ch)
+
+    def _begin_value(self, ch: str) -> None:
+        if ch == "{":
+            self._stack.append(["object", "key_or_end"])
+        elif ch == "[":
+            self._stack.append(["array", "value_or_end"])
+        elif ch == '"':
+            self._begin_string(is_key=False)
+        elif ch == "-" or ch.isdigit():
+            self._scalar = "number"
+            self._buffer = ch
+        elif ch in "tfn":
+            self._scalar = "literal"
+            self._buffer = ch
+        else:
+            self._fail(ch)
+
+    def _begin_string(self, *, is_key: bool) -> None:
+        self._scalar = "string"
+        self._string_is_key = is_key
+
+    def _feed_string(self, ch: str) -> None:
+        if self._unicode_left:
+            if ch not in "0123456789abcdefABCDEF":
+                self._fail(ch)
+            self._unicode_left -= 1
+            return
+        if self._escape:
+            if ch == "u":
+                self._unicode_left = 4
+            elif ch not in '"\\/bfnrt':
+                self._fail(ch)
+            self._escape = False
+            return
+        if ch == "\\":
+            self._escape = True
+        elif ch == '"':
+            self._scalar = None
+            if self._string_is_key:
+                self._stack[-1][1] = "colon"
+            else:
+                self._value_done()
+        elif ord(ch) < 0x20:
+            self._fail(ch)
+
+    def _finish_bare_scalar(self, delimiter: str) -> None:
+        token = self._buffer
+        valid = _NUMBER_RE.fullmatch(token) if self._scalar == "number" else token in _LITERALS
+        if not valid:
+            self._fail(delimiter)
+        self._scalar = None
+        self._buffer = ""
+        self._value_done()
+
+    def _value_done(self) -> None:
+        self._stack[-1][1] = "comma_or_end"
+
+    def _close(self) -> None:
+        self._stack.pop()
+        if not self._stack:
+            self.complete = True
+        else:
+            self._value_done()
+
+
+def schema_errors(value: Any, schema: dict[str, Any], path: str = "$") -> list[str]:
+    expected = schema.get("type")
+    checks = {
+        "object": lambda v: isinstance(v, dict),
+        "array": lambda v: isinstance(v, list),
+        "string": lambda v: isinstance(v, str),
+        "integer": lambda v: isinstance(v, int) and not isinstance(v, bool),
+        "number": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+        "boolean": lambda v: isinstance(v, bool),
+    }
+    if expected in checks and not checks[expected](value):
+        return [f"{path}: esperado {expected}"]
+
+    errors: list[str] = []
+    if "enum" in schema and value not in schema["enum"]:
+        errors.append(f"{path}: valor fora de {schema['enum']}")
+    if expected == "object":
+        for key in schema.get("required", []):
+            if key not in value:
+                errors.append(f"{path}.{key}: campo obrigatório ausente")
+        for key, sub_schema in schema.get("properties", {}).items():
+            if key in value:
+                errors.extend(schema_errors(value[key], sub_schema, f"{path}.{key}"))
+    elif expected == "array":
+        if "maxItems" in schema and len(value) > schema["maxItems"]:
+            errors.append(f"{path}: mais de {schema['maxItems']} itens")
+        item_schema = schema.get("items")
+        if item_schema:
+            for idx, item in enumerate(value):
+                errors.extend(schema_errors(item, item_schema, f"{path}[{idx}]"))
+    return errors
+
+
+REQUIREMENTS_SCHEMA: dict[str, Any] = {
+    "type": "object",
+    "properties": {"requisitos": {"type": "array", "maxItems": 12, "items": {"type": "string"}}},
+    "required": ["requisitos"],
+}
+
+
+def batch_final_schema(size: int) -> dict[str, Any]:
+    item = dict(FINAL_SCHEMA)
+    item["properties"] = {"candidate_id": {"type": "integer"}, **FINAL_SCHEMA["properties"]}
+    item["required"] = ["candidate_id", *FINAL_SCHEMA["required"]]
+    return {
+        "type": "object",
+        "properties": {"candidatos": {"type": "array", "maxItems": size, "items": item}},
+        "required": ["candidatos"],
+    }
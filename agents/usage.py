@@ -0,0 +1,156 @@
+"""Per-call Ollama token/latency accounting and its aggregates."""
+
+from __future__ import annotations
+
+import logging
+import math
+import sqlite3
+import threading
+import time
+from typing import Any, Callable
+
+from core.db import fetch_llm_call_stats, fetch_llm_call_timings, fetch_llm_completion_tokens, insert_llm_call_stats
+
+COLD_LOAD_THRESHOLD_MS = 500
+SUMMARY_WINDOW = 2000
+BUDGET_WINDOW = 200
+BUDGET_MIN_SAMPLES = 20
+BUDGET_PERCENTILE = 95
+BUDGET_HEADROOM = 1.3
+BUDGET_STEP_TOKENS = 64
+BUDGET_FLOOR_TOKENS = 128
+BUDGET_TTL_SECONDS = 60.0
+ESTIMATE_MIN_SAMPLES = 5
+ESTIMATE_OVERHEAD_PERCENTILE = 90
+
+_budgets: dict[tuple[str, str], tuple[float, int | None]] = {}
+_estimates: dict[tuple[str, str], tuple[float, tuple[float, float] | None]] = {}
+_budgets_lock = threading.Lock()
+
+logger = logging.getLogger(__name__)
+
+
+def usage_from_chunk(chunk: dict[str, Any]) -> dict[str, Any]:
+    def _ms(field: str) -> int:
+        return int(chunk.get(field) or 0) // 1_000_000
+
+    return {
+        "prompt_tokens": int(chunk.get("prompt_eval_count") or 0),
+        "completion_tokens": int(chunk.get("eval_count") or 0),
+        "prompt_eval_ms": _ms("prompt_eval_duration"),
+        "eval_ms": _ms("eval_duration"),
+        "load_ms": _ms("load_duration"),
+    }
+
+
+def usage_from_early_stop(completion_tokens: int, ttft_ms: int, wall_ms: int) -> dict[str, Any]:
+    return {
+        "prompt_tokens": 0,
+        "completion_tokens": completion_tokens,
+        "prompt_eval_ms": 0,
+        "eval_ms": max(0, wall_ms - ttft_ms),
+        "load_ms": 0,
+        "wall_ms": wall_ms,
+        "early_stop": True,
+    }
+
+
+def record_agent_usage(usage: dict[str, dict[str, Any]], analise_id: int | None = None) -> None:
+    calls = [dict(stats, stage=stage, cached=int(bool(stats.get("cached")))) for stage, stats in usage.items()]
+    try:
+        insert_llm_call_stats(analise_id, calls)
+    except sqlite3.Error:
+        logger.warning("Falha ao registrar o uso das chamadas ao Ollama.", exc_info=True)
+
+
+def _percentile(values: list[int], pct: float) -> int:
+    if not values:
+        return 0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def _historical_budget(model: str, stage: str) -> int | None:
+    try:
+        lengths = fetch_llm_completion_tokens(model, stage, BUDGET_WINDOW)
+    except sqlite3.Error:
+        logger.warning("Falha ao ler o histórico de tokens de %s/%s.", model, stage, exc_info=True)
+        return None
+    if len(lengths) < BUDGET_MIN_SAMPLES:
+        return None
+    return int(_percentile(lengths, BUDGET_PERCENTILE) * BUDGET_HEADROOM)
+
+
+def _ttl_cached(cache: dict, key: tuple[str, str], compute: Callable[[], Any]) -> Any:
+    now = time.monotonic()
+    with _budgets_lock:
+        cached_at, value = cache.get(key, (0.0, None))
+    if now - cached_at > BUDGET_TTL_SECONDS:
+        value = compute()
+        with _budgets_lock:
+            cache[key] = (now, value)
+    return value
+
+
+def adaptive_num_predict(model: str, stage: str, ceiling: int) -> int:
+    budget = _ttl_cached(_budgets, (model, stage), lambda: _historical_budget(model, stage))
+    if budget is None:
+        return ceiling
+    budget = -(-max(budget, BUDGET_FLOOR_TOKENS) // BUDGET_STEP_TOKENS) * BUDGET_STEP_TOKENS
+    return min(ceiling, budget)
+
+
+def _historical_estimate(model: str, stage: str) -> tuple[float, float] | None:
+    try:
+        rows = fetch_llm_call_timings(model, stage, BUDGET_WINDOW)
+    except sqlite3.Error:
+        logger.warning("Falha ao ler o histórico de tempos de %s/%s.", model, stage, exc_info=True)
+        return None
+    tokens = sum(row[0] for row in rows)
+    eval_ms = sum(row[1] for row in rows)
+    if len(rows) < ESTIMATE_MIN_SAMPLES or not tokens:
+        return None
+    overhead_ms = _percentile([max(0, wall - ev) for _, ev, wall in rows], ESTIMATE_OVERHEAD_PERCENTILE)
+    return overhead_ms / 1000, tokens * 1000 / eval_ms
+
+
+def call_estimate(model: str, stage: str) -> tuple[float, float] | None:
+    return _ttl_cached(_estimates, (model, stage), lambda: _historical_estimate(model, stage))
+
+
+def _rate(tokens: int, ms: int) -> float:
+    return round(tokens * 1000 / ms, 1) if ms else 0.0
+
+
+def _aggregate(rows: list[dict[str, Any]]) -> dict[str, Any]:
+    live = [row for row in rows if not row["cached"]]
+    wall = [row["wall_ms"] for row in live]
+    prompt_tokens = sum(row["prompt_tokens"] for row in live)
+    completion_tokens = sum(row["completion_tokens"] for row in live)
+    cold_loads = sum(1 for row in live if row["load_ms"] >= COLD_LOAD_THRESHOLD_MS)
+    return {
+        "calls": len(rows),
+        "cached_calls": len(rows) - len(live),
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "prompt_tokens_per_s": _rate(prompt_tokens, sum(row["prompt_eval_ms"] for row in live)),
+        "completion_tokens_per_s": _rate(completion_tokens, sum(row["eval_ms"] for row in live)),
+        "cold_loads": cold_loads,
+        "cold_load_rate": round(cold_loads / len(live), 4) if live else 0.0,
+        "p50_ms": _percentile(wall, 50),
+        "p95_ms": _percentile(wall, 95),
+    }
+
+
+def usage_summary(limit: int = SUMMARY_WINDOW, analise_id: int | None = None) -> dict[str, Any]:
+    rows = fetch_llm_call_stats(limit=limit, analise_id=analise_id)
+    groups: dict[tuple[str, str], list[dict[str, Any]]] = {}
+    for row in rows:
+        groups.setdefault((row["model"], row["stage"]), []).append(row)
+    return {
+        "window": len(rows),
+        "overall": _aggregate(rows),
+        "by_stage": [
+            {"model": model, "stage": stage, **_aggregate(group)} for (model, stage), group in sorted(groups.items())
+        ],
+    }
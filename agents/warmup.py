@@ -0,0 +1,238 @@
+"""Model preloading and business-hours keep_alive pings for Ollama."""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any
+from urllib import error, request
+
+from agents.admission import ADMISSION, AdmissionRejected
+from agents.router import DEFAULT_BASE_URL, parse_endpoints
+from agents.usage import COLD_LOAD_THRESHOLD_MS, usage_from_chunk
+from core.db import fetch_app_meta, upsert_app_meta
+
+WARMUP_ENABLED = os.getenv("OLLAMA_WARMUP", "0") == "1"
+WARMUP_MODELS = os.getenv("OLLAMA_WARMUP_MODELS", "llama3.1:8b=30m")
+KEEPALIVE_HOURS = os.getenv("OLLAMA_KEEPALIVE_HOURS", "8-19")
+KEEPALIVE_DAYS = os.getenv("OLLAMA_KEEPALIVE_DAYS", "0-4")
+PING_FRACTION = 0.8
+SCHEDULER_TICK_SECONDS = 30.0
+WARMUP_TIMEOUT_SECONDS = 300
+SNAPSHOT_META_KEY = "warmup_snapshot"
+SNAPSHOT_STALE_SECONDS = SCHEDULER_TICK_SECONDS * 3
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class WarmupTarget:
+    model: str
+    keep_alive: str = "30m"
+
+    @property
+    def keep_alive_seconds(self) -> int:
+        return parse_duration(self.keep_alive)
+
+
+def parse_duration(value: str) -> int:
+    match = re.fullmatch(r"\s*(\d+)\s*([smh]?)\s*", str(value))
+    if not match:
+        raise ValueError(f"Duração de keep_alive inválida: {value!r}.")
+    amount, unit = int(match.group(1)), match.group(2) or "s"
+    return amount * {"s": 1, "m": 60, "h": 3600}[unit]
+
+
+def parse_targets(raw: str) -> list[WarmupTarget]:
+    targets = []
+    for item in raw.split(","):
+        if not item.strip():
+            continue
+        model, _, keep_alive = item.partition("=")
+        targets.append(WarmupTarget(model=model.strip(), keep_alive=keep_alive.strip() or "30m"))
+    return targets
+
+
+def _parse_range(raw: str) -> tuple[int, int]:
+    start, _, end = raw.partition("-")
+    return int(start), int(end or start)
+
+
+def within_business_hours(
+    now: datetime | None = None,
+    hours: str = KEEPALIVE_HOURS,
+    days: str = KEEPALIVE_DAYS,
+) -> bool:
+    now = now or datetime.now()
+    first_day, last_day = _parse_range(days)
+    start_hour, end_hour = _parse_range(hours)
+    return first_day <= now.weekday() <= last_day and start_hour <= now.hour < end_hour
+
+
+def keep_alive_for(model: str) -> str | None:
+    if not WARMUP_ENABLED:
+        return None
+    for target in _TARGETS:
+        if target.model == model:
+            return target.keep_alive
+    return None
+
+
+def warm_model(base_url: str, target: WarmupTarget) -> dict[str, Any]:
+    payload = {"model": target.model, "messages": [], "keep_alive": target.keep_alive, "stream": False}
+    req = request.Request(
+        url=f"{base_url}/api/chat",
+        method="POST",
+        data=json.dumps(payload).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+    )
+    started = time.perf_counter()
+    try:
+        with ADMISSION.slot("batch"):
+            with request.urlopen(req, timeout=WARMUP_TIMEOUT_SECONDS) as resp:
+                chunk = json.loads(resp.read().decode("utf-8"))
+    except (error.URLError, OSError, ValueError, AdmissionRejected) as exc:
+        return {"ok": False, "error": str(exc), "at": time.time()}
+    return {
+        "ok": True,
+        "load_ms": usage_from_chunk(chunk)["load_ms"],
+        "wall_ms": int((time.perf_counter() - started) * 1000),
+        "at": time.time(),
+    }
+
+
+class WarmupScheduler:
+    def __init__(self, base_url: str, targets: list[WarmupTarget]):
+        self.endpoints = parse_endpoints(base_url)
+        self.targets = targets
+        self._last: dict[tuple[str, str], dict[str, Any]] = {}
+        self._pings = 0
+        self._cold_pings = 0
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def _ping(self, endpoint: str, target: WarmupTarget) -> None:
+        outcome = warm_model(endpoint, target)
+        with self._lock:
+            self._last[(endpoint, target.model)] = outcome
+            if outcome["ok"]:
+                self._pings += 1
+                if outcome["load_ms"] >= COLD_LOAD_THRESHOLD_MS:
+                    self._cold_pings += 1
+
+    def preload(self) -> None:
+        for target in self.targets:
+            for endpoint in self.endpoints:
+                self._ping(endpoint, target)
+
+    def _due(self, endpoint: str, target: WarmupTarget, now: float) -> bool:
+        last = self._last.get((endpoint, target.model))
+        if last is None or not last["ok"]:
+            return True
+        return now - last["at"] >= target.keep_alive_seconds * PING_FRACTION
+
+    def tick(self) -> None:
+        if not within_business_hours():
+            return
+        now = time.time()
+        for target in self.targets:
+            for endpoint in self.endpoints:
+                if self._due(endpoint, target, now):
+                    self._ping(endpoint, target)
+
+    def publish(self) -> None:
+        snapshot = {**self.snapshot(), "updated_at": time.time()}
+        try:
+            upsert_app_meta(SNAPSHOT_META_KEY, json.dumps(snapshot, ensure_ascii=False))
+        except sqlite3.Error:
+            logger.warning("Falha ao publicar o estado do pré-carregamento.", exc_info=True)
+
+    def _run(self, preload: bool) -> None:
+        if preload:
+            self.preload()
+        self.publish()
+        while not self._stopped.wait(SCHEDULER_TICK_SECONDS):
+            self.tick()
+            self.publish()
+
+    def start(self, preload: bool = True) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, args=(preload,), name="ollama-warmup", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "business_hours": within_business_hours(),
+                "pings": self._pings,
+                "cold_pings": self._cold_pings,
+                "cold_ping_rate": round(self._cold_pings / self._pings, 4) if self._pings else 0.0,
+                "targets": [
+                    {
+                        "endpoint": endpoint,
+                        "model": target.model,
+                        "keep_alive": target.keep_alive,
+                        "last": self._last.get((endpoint, target.model)),
+                    }
+                    for target in self.targets
+                    for endpoint in self.endpoints
+                ],
+            }
+
+
+_TARGETS = parse_targets(WARMUP_MODELS)
+_scheduler: WarmupScheduler | None = None
+_scheduler_lock = threading.Lock()
+
+
+def start_warmup_scheduler(base_url: str = DEFAULT_BASE_URL, force: bool = False) -> WarmupScheduler | None:
+    global _scheduler
+    if not (WARMUP_ENABLED or force):
+        return None
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = WarmupScheduler(base_url, _TARGETS)
+            _scheduler.start()
+        return _scheduler
+
+
+def stop_warmup_scheduler() -> None:
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is not None:
+            _scheduler.stop()
+            _scheduler = None
+
+
+def _published_snapshot() -> dict[str, Any] | None:
+    try:
+        raw = fetch_app_meta(SNAPSHOT_META_KEY)
+    except sqlite3.Error:
+        logger.warning("Falha ao ler o estado publicado do pré-carregamento.", exc_info=True)
+        return None
+    snapshot = json.loads(raw) if raw else None
+    if snapshot is None or time.time() - snapshot.get("updated_at", 0) > SNAPSHOT_STALE_SECONDS:
+        return None
+    return snapshot
+
+
+def warmup_snapshot() -> dict[str, Any]:
+    scheduler = _scheduler
+    if scheduler is not None:
+        return {"enabled": True, **scheduler.snapshot()}
+    published = _published_snapshot()
+    if published is None:
+        return {"enabled": False}
+    return {"enabled": True, **published}
@@ -3,8 +3,10 @@ import streamlit as st
 from components.styles import inject_global_css
 from components.widgets import render_app_header, render_sidebar
 from core.constants import APP_TITLE, PAGE_OPTIONS
+from agents.warmup import start_warmup_scheduler
 from core.db import init_db, seed_if_empty
-from pages import analysis, comparison, history, home, report, upload
+from workers.pool import EMBEDDED_WORKERS, start_worker_pool
+from pages import analysis, comparison, history, home, llm_metrics, report, upload
 
 
 def main():
@@ -14,6 +16,9 @@ def main():
 
     init_db()
     seed_if_empty()
+    if EMBEDDED_WORKERS:
+        start_warmup_scheduler()
+        start_worker_pool()
 
     if "page" not in st.session_state:
         st.session_state["page"] = "home"
@@ -55,6 +60,8 @@ def main():
         report.render()
     elif page == "historico":
         history.render()
+    elif page == "metricas_llm":
+        llm_metrics.render()
 
 
 if __name__ == "__main__":
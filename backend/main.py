@@ -1,17 +1,32 @@
 from __future__ import annotations
 
-from typing import Any
-
-from fastapi import FastAPI, HTTPException
+import asyncio
+import json
+import logging
+import threading
+import time
+from typing import Any, AsyncIterator, Literal
+
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel, Field
 
-from agents.ollama_agent import OllamaConfig, run_resume_agent
+from agents.admission import ADMISSION, AdmissionRejected
+from agents.async_agent import aclose_http_client, run_resume_agent_async, run_resume_agent_stream_async
+from agents.llm_cache import cache_stats
+from agents.ollama_agent import OllamaConfig
+from agents.resilience import CircuitOpen, breakers_snapshot, ensure_closed
+from agents.router import DEFAULT_BASE_URL, shared_routers_snapshot
+from agents.usage import usage_summary
+from agents.warmup import start_warmup_scheduler, stop_warmup_scheduler, warmup_snapshot
 from core.constants import STATUS_CONCLUIDA, STATUS_EM_ANALISE
 from core.db import (
     delete_analise,
     fetch_analise_by_id,
     fetch_analises,
+    fetch_batch_run,
+    fetch_batch_runs,
     fetch_comparacao_by_id,
     fetch_comparacoes_by_analise,
     init_db,
@@ -21,7 +36,19 @@ from core.db import (
     seed_if_empty,
     update_analise,
 )
-from core.logic import compare_with_job, make_report_text, score_from_metrics, section_metrics
+from core.logic import (
+    compare_with_job,
+    make_report_text,
+    resume_skills_from_area,
+    risk_to_semantic_fit,
+    score_from_metrics,
+    section_metrics,
+)
+from workers.batch import BATCH_CONCURRENCY, BATCH_STALE_SECONDS, create_batch, run_batch, top_analise_ids
+from workers.pool import EMBEDDED_WORKERS, start_worker_pool, stop_worker_pool
+from workers.queue import get_job, list_jobs, queue_snapshot, submit_job
+
+logger = logging.getLogger(__name__)
 
 
 class AnaliseCreate(BaseModel):
@@ -41,13 +68,52 @@ class LLMAnalyzeRequest(BaseModel):
     area: str = Field(min_length=1)
     resume_skills: list[str] = Field(default_factory=list)
     section_metrics: dict[str, list] = Field(default_factory=dict)
+    sections: list[Literal["estrutura", "experiencia", "habilidades"]] | None = None
     vaga_titulo: str = Field(min_length=1)
     vaga_descricao: str = Field(min_length=1)
     model: str = "llama3.1:8b"
-    base_url: str = "http://localhost:11434"
+    base_url: str = DEFAULT_BASE_URL
+    temperature: float = 0.3
+    top_p: float = 0.9
+    num_predict: int = 700
+    planning_model: str = OllamaConfig.planning_model
+    planning_temperature: float = 0.1
+    planning_num_predict: int = 256
+    planning_fallback: Literal["final_model", "tools", "none"] = "final_model"
+    adaptive_num_predict: bool = True
+    digest_with_llm: bool = False
+    deadline_seconds: float = Field(default=0.0, ge=0)
+    use_cache: bool = True
+    priority: Literal["interactive", "batch"] = "interactive"
+    analise_id: int | None = None
+
+
+class JobSubmitRequest(LLMAnalyzeRequest):
+    kind: Literal["section", "report", "comparison_llm", "comparison"] = "report"
+    analise_id: int
+    target: dict[str, Any] = Field(default_factory=dict)
+
+
+class BatchRunRequest(BaseModel):
+    analise_ids: list[int] = Field(default_factory=list)
+    top: int | None = Field(default=None, ge=1)
+    vaga_titulo: str = ""
+    vaga_descricao: str = Field(min_length=1)
+    model: str = "llama3.1:8b"
+    base_url: str = DEFAULT_BASE_URL
     temperature: float = 0.3
     top_p: float = 0.9
     num_predict: int = 700
+    planning_model: str = OllamaConfig.planning_model
+    planning_temperature: float = 0.1
+    planning_num_predict: int = 256
+    planning_fallback: Literal["final_model", "tools", "none"] = "final_model"
+    adaptive_num_predict: bool = True
+    digest_with_llm: bool = False
+    batched_synthesis: bool = False
+    use_cache: bool = True
+    concurrency: int = Field(default=BATCH_CONCURRENCY, ge=1, le=32)
+    salvar_resultado: bool = True
 
 
 app = FastAPI(title="Resume AI Backend", version="1.1.0")
@@ -61,30 +127,38 @@ app.add_middleware(
 )
 
 
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected_handler(request: Request, exc: AdmissionRejected) -> JSONResponse:
+    return JSONResponse(
+        status_code=429,
+        content={"detail": str(exc), "estimated_wait_seconds": round(exc.estimated_wait, 1)},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+@app.exception_handler(CircuitOpen)
+async def circuit_open_handler(request: Request, exc: CircuitOpen) -> JSONResponse:
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
 @app.on_event("startup")
 def on_startup():
     init_db()
     seed_if_empty()
+    if EMBEDDED_WORKERS:
+        start_warmup_scheduler()
+        start_worker_pool()
 
 
-def _resume_skills_from_area(area: str) -> list[str]:
-    area_l = (area or "").lower()
-    if "dado" in area_l:
-        return ["Python", "SQL", "Power BI", "ETL", "Excel", "Dashboard"]
-    if "market" in area_l:
-        return ["SEO", "Google Ads", "CRM", "Analytics", "Conteudo"]
-    if "vend" in area_l:
-        return ["Prospeccao", "Pipeline", "Negociacao", "CRM", "Comercial"]
-    return ["Comunicacao", "Excel", "Analise"]
-
-
-def _risk_to_semantic_fit(ats_risk: str, compat: int) -> int:
-    risk_score = {
-        "baixo": 88,
-        "medio": 72,
-        "alto": 55,
-    }.get((ats_risk or "").lower(), 70)
-    return int((risk_score + compat) / 2)
+@app.on_event("shutdown")
+async def on_shutdown():
+    stop_warmup_scheduler()
+    stop_worker_pool()
+    await aclose_http_client()
 
 
 @app.get("/health")
@@ -147,17 +221,19 @@ def remove_analise(analise_id: int) -> dict[str, Any]:
 
 
 @app.post("/comparacoes/run")
-def run_comparacao(payload: ComparacaoRunRequest) -> dict[str, Any]:
-    analise = fetch_analise_by_id(payload.analise_id)
+async def run_comparacao(payload: ComparacaoRunRequest) -> dict[str, Any]:
+    analise = await asyncio.to_thread(fetch_analise_by_id, payload.analise_id)
     if not analise:
         raise HTTPException(status_code=404, detail="Analise nao encontrada")
 
     area = analise[2]
-    resume_skills = _resume_skills_from_area(area)
+    resume_skills = resume_skills_from_area(area)
     kw_result = compare_with_job(payload.vaga_descricao, resume_skills)
 
+    await asyncio.to_thread(ensure_closed, OllamaConfig().base_url)
+    await asyncio.to_thread(ADMISSION.ensure_admissible, "interactive")
     try:
-        llm_result = run_resume_agent(
+        llm_result = await run_resume_agent_async(
             candidate_name=analise[1],
             area=area,
             resume_skills=resume_skills,
@@ -165,12 +241,15 @@ def run_comparacao(payload: ComparacaoRunRequest) -> dict[str, Any]:
             job_title=payload.vaga_titulo,
             job_description=payload.vaga_descricao,
             config=OllamaConfig(),
+            analise_id=payload.analise_id,
         )
+    except (AdmissionRejected, CircuitOpen):
+        raise
     except Exception as exc:
         raise HTTPException(status_code=500, detail=f"Ollama indisponivel para comparacao: {exc}")
 
     final = llm_result.get("final", {})
-    semantic_fit = _risk_to_semantic_fit(final.get("ats_risk", "medio"), kw_result["compat"])
+    semantic_fit = risk_to_semantic_fit(final.get("ats_risk", "medio"), kw_result["compat"])
     lacunas = final.get("weaknesses", [])
     recomendacoes = final.get("next_actions", [])
 
@@ -178,10 +257,11 @@ def run_comparacao(payload: ComparacaoRunRequest) -> dict[str, Any]:
     base_score = score_from_metrics(metrics)
     final_score = int((base_score * 0.5) + (kw_result["compat"] * 0.25) + (semantic_fit * 0.25))
 
-    update_analise(payload.analise_id, STATUS_CONCLUIDA, final_score)
+    await asyncio.to_thread(update_analise, payload.analise_id, STATUS_CONCLUIDA, final_score)
 
     if payload.salvar_resultado:
-        insert_comparacao(
+        await asyncio.to_thread(
+            insert_comparacao,
             analise_id=payload.analise_id,
             vaga_titulo=payload.vaga_titulo,
             vaga_descricao=payload.vaga_descricao,
@@ -206,30 +286,200 @@ def run_comparacao(payload: ComparacaoRunRequest) -> dict[str, Any]:
     }
 
 
+def _llm_config(payload: LLMAnalyzeRequest) -> OllamaConfig:
+    return OllamaConfig(
+        model=payload.model,
+        base_url=payload.base_url,
+        temperature=payload.temperature,
+        top_p=payload.top_p,
+        num_predict=payload.num_predict,
+        planning_model=payload.planning_model,
+        planning_temperature=payload.planning_temperature,
+        planning_num_predict=payload.planning_num_predict,
+        planning_fallback=payload.planning_fallback,
+        adaptive_num_predict=payload.adaptive_num_predict,
+        digest_with_llm=payload.digest_with_llm,
+        deadline_seconds=payload.deadline_seconds,
+        use_cache=payload.use_cache,
+        priority=payload.priority,
+    )
+
+
+def _llm_agent_kwargs(payload: LLMAnalyzeRequest) -> dict[str, Any]:
+    return {
+        "candidate_name": payload.candidato,
+        "area": payload.area,
+        "resume_skills": payload.resume_skills,
+        "section_metrics": payload.section_metrics,
+        "job_title": payload.vaga_titulo,
+        "job_description": payload.vaga_descricao,
+        "sections": payload.sections,
+        "config": _llm_config(payload),
+        "analise_id": payload.analise_id,
+    }
+
+
+def _sse(event: str, data: dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
 @app.post("/llm/analyze")
-def llm_analyze(payload: LLMAnalyzeRequest) -> dict[str, Any]:
+async def llm_analyze(payload: LLMAnalyzeRequest) -> dict[str, Any]:
+    await asyncio.to_thread(ensure_closed, payload.base_url)
+    await asyncio.to_thread(ADMISSION.ensure_admissible, payload.priority)
     try:
-        config = OllamaConfig(
-            model=payload.model,
-            base_url=payload.base_url,
-            temperature=payload.temperature,
-            top_p=payload.top_p,
-            num_predict=payload.num_predict,
-        )
-        result = run_resume_agent(
-            candidate_name=payload.candidato,
-            area=payload.area,
-            resume_skills=payload.resume_skills,
-            section_metrics=payload.section_metrics,
-            job_title=payload.vaga_titulo,
-            job_description=payload.vaga_descricao,
-            config=config,
-        )
-        return result
+        return await run_resume_agent_async(**_llm_agent_kwargs(payload))
+    except (AdmissionRejected, CircuitOpen):
+        raise
     except Exception as exc:
         raise HTTPException(status_code=500, detail=str(exc))
 
 
+@app.post("/llm/analyze/stream")
+async def llm_analyze_stream(payload: LLMAnalyzeRequest) -> StreamingResponse:
+    await asyncio.to_thread(ensure_closed, payload.base_url)
+    await asyncio.to_thread(ADMISSION.ensure_admissible, payload.priority)
+
+    async def event_source() -> AsyncIterator[str]:
+        try:
+            async for event in run_resume_agent_stream_async(**_llm_agent_kwargs(payload)):
+                yield _sse(event["event"], event)
+        except Exception as exc:
+            yield _sse("error", {"event": "error", "detail": str(exc)})
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/jobs", status_code=202)
+def create_job(payload: JobSubmitRequest) -> dict[str, Any]:
+    if not fetch_analise_by_id(payload.analise_id):
+        raise HTTPException(status_code=404, detail="Analise nao encontrada")
+    kwargs = _llm_agent_kwargs(payload)
+    config = kwargs.pop("config")
+    kwargs.pop("analise_id")
+    job = submit_job(
+        payload.kind,
+        agent_kwargs=kwargs,
+        config=config,
+        analise_id=payload.analise_id,
+        target=payload.target,
+    )
+    return job.to_dict()
+
+
+@app.get("/jobs/stats")
+def jobs_stats() -> dict[str, int]:
+    return queue_snapshot()
+
+
+@app.get("/jobs/{job_id}")
+def get_job_status(job_id: int) -> dict[str, Any]:
+    job = get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job nao encontrado")
+    return job.to_dict()
+
+
+@app.get("/jobs")
+def list_job_status(analise_id: int | None = None, status: str | None = None, limit: int = 50) -> list[dict[str, Any]]:
+    return [job.to_dict() for job in list_jobs(analise_id=analise_id, status=status, limit=limit)]
+
+
+def _start_batch(batch_id: int, concurrency: int) -> None:
+    def _run() -> None:
+        try:
+            run_batch(batch_id, concurrency)
+        except Exception:
+            logger.exception("Lote %s falhou.", batch_id)
+
+    threading.Thread(target=_run, name=f"batch-{batch_id}", daemon=True).start()
+
+
+@app.post("/batches", status_code=202)
+def create_batch_run(payload: BatchRunRequest) -> dict[str, Any]:
+    analise_ids = payload.analise_ids or (top_analise_ids(payload.top) if payload.top else [])
+    config = OllamaConfig(
+        model=payload.model,
+        base_url=payload.base_url,
+        temperature=payload.temperature,
+        top_p=payload.top_p,
+        num_predict=payload.num_predict,
+        planning_model=payload.planning_model,
+        planning_temperature=payload.planning_temperature,
+        planning_num_predict=payload.planning_num_predict,
+        planning_fallback=payload.planning_fallback,
+        adaptive_num_predict=payload.adaptive_num_predict,
+        digest_with_llm=payload.digest_with_llm,
+        batched_synthesis=payload.batched_synthesis,
+        use_cache=payload.use_cache,
+    )
+    try:
+        batch_id = create_batch(
+            analise_ids,
+            payload.vaga_titulo,
+            payload.vaga_descricao,
+            config,
+            save_history=payload.salvar_resultado,
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+    _start_batch(batch_id, payload.concurrency)
+    return fetch_batch_run(batch_id)
+
+
+@app.post("/batches/{batch_id}/resume", status_code=202)
+def resume_batch_run(batch_id: int, concurrency: int = BATCH_CONCURRENCY) -> dict[str, Any]:
+    run = fetch_batch_run(batch_id)
+    if run is None:
+        raise HTTPException(status_code=404, detail="Lote nao encontrado")
+    if run["status"] == "running" and time.time() - (run["heartbeat_at"] or 0) < BATCH_STALE_SECONDS:
+        raise HTTPException(status_code=409, detail="Lote ja esta em execucao")
+    _start_batch(batch_id, concurrency)
+    return run
+
+
+@app.get("/batches/{batch_id}")
+def get_batch_run(batch_id: int) -> dict[str, Any]:
+    run = fetch_batch_run(batch_id)
+    if run is None:
+        raise HTTPException(status_code=404, detail="Lote nao encontrado")
+    return run
+
+
+@app.get("/batches")
+def list_batch_runs(limit: int = 20) -> list[dict[str, Any]]:
+    return fetch_batch_runs(limit)
+
+
+@app.get("/llm/admission/stats")
+def llm_admission_stats() -> dict[str, Any]:
+    return ADMISSION.snapshot()
+
+
+@app.get("/llm/cache/stats")
+def llm_cache_stats() -> dict[str, Any]:
+    return cache_stats()
+
+
+@app.get("/llm/endpoints")
+def llm_endpoints() -> dict[str, Any]:
+    return {"endpoints": shared_routers_snapshot(), "breakers": breakers_snapshot()}
+
+
+@app.get("/llm/metrics")
+def llm_metrics(analise_id: int | None = None, limit: int = 2000) -> dict[str, Any]:
+    return usage_summary(limit=limit, analise_id=analise_id)
+
+
+@app.get("/llm/warmup")
+def llm_warmup() -> dict[str, Any]:
+    return warmup_snapshot()
+
+
 @app.get("/comparacoes/analise/{analise_id}")
 def list_comparacoes_by_analise(analise_id: int) -> list[dict[str, Any]]:
     rows = fetch_comparacoes_by_analise(analise_id)
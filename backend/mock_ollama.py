@@ -0,0 +1,437 @@
+"""Local stand-in for the Ollama HTTP API with latency/failure injection and record/replay."""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any
+from urllib import request
+
+CHARS_PER_TOKEN = 4
+DEFAULT_KEEP_ALIVE_SECONDS = 300.0
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "lognormal")
+
+
+@dataclass
+class MockConfig:
+    models: tuple[str, ...] = ("llama3.1:8b",)
+    first_token_ms: float = 250.0
+    latency_dist: str = "fixed"
+    latency_spread: float = 0.3
+    tokens_per_second: float = 25.0
+    prompt_tokens_per_second: float = 400.0
+    cold_load_ms: float = 0.0
+    prefix_cache_slots: int = 4
+    trailing_tokens: int = 0
+    error_rate: float = 0.0
+    disconnect_rate: float = 0.0
+    seed: int = 0
+    record_to: str | None = None
+    replay_from: str | None = None
+    upstream: str | None = None
+    replay_timing: bool = False
+
+
+def request_key(body: dict[str, Any]) -> str:
+    material = {
+        "model": body.get("model"),
+        "messages": body.get("messages"),
+        "format": body.get("format"),
+        "options": body.get("options"),
+    }
+    return hashlib.sha256(json.dumps(material, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _sample_value(schema: dict[str, Any], rng: random.Random, depth: int = 0) -> Any:
+    kind = schema.get("type")
+    if "enum" in schema:
+        return rng.choice(schema["enum"])
+    if kind == "object":
+        return {key: _sample_value(sub, rng, depth + 1) for key, sub in schema.get("properties", {}).items()}
+    if kind == "array":
+        count = min(schema.get("maxItems", 3), rng.randint(2, 3))
+        return [_sample_value(schema.get("items", {"type": "string"}), rng, depth + 1) for _ in range(count)]
+    if kind in {"integer", "number"}:
+        return rng.randint(0, 100)
+    if kind == "boolean":
+        return rng.random() < 0.5
+    words = ["revisar", "resumo", "experiência", "resultado", "métrica", "habilidade", "vaga", "impacto"]
+    return "Texto simulado: " + " ".join(rng.choice(words) for _ in range(6)) + "."
+
+
+def synthetic_content(body: dict[str, Any]) -> str:
+    rng = random.Random(request_key(body))
+    schema = body.get("format")
+    if isinstance(schema, dict):
+        return json.dumps(_sample_value(schema, rng), ensure_ascii=False)
+    if schema == "json":
+        return json.dumps({"resposta": _sample_value({"type": "string"}, rng)}, ensure_ascii=False)
+    return _sample_value({"type": "string"}, rng)
+
+
+def _keep_alive_seconds(value: Any) -> float:
+    if value is None:
+        return DEFAULT_KEEP_ALIVE_SECONDS
+    if isinstance(value, (int, float)):
+        return float("inf") if value < 0 else float(value)
+    text = str(value).strip()
+    units = {"s": 1, "m": 60, "h": 3600}
+    if text and text[-1] in units:
+        return float(text[:-1]) * units[text[-1]]
+    return float(text)
+
+
+def render_prompt(messages: list[dict[str, Any]]) -> str:
+    return "".join(f"<|{m.get('role', '')}|>{m.get('content', '')}" for m in messages)
+
+
+def _common_prefix(a: str, b: str) -> int:
+    return len(os.path.commonprefix([a, b]))
+
+
+def _split_tokens(content: str) -> list[str]:
+    return [content[i : i + CHARS_PER_TOKEN] for i in range(0, len(content), CHARS_PER_TOKEN)] or [""]
+
+
+class Cassette:
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self.entries: dict[str, dict[str, Any]] = {}
+        if self.path.exists():
+            for line in self.path.read_text(encoding="utf-8").splitlines():
+                if line.strip():
+                    entry = json.loads(line)
+                    self.entries[entry["key"]] = entry
+
+    def get(self, key: str) -> dict[str, Any] | None:
+        return self.entries.get(key)
+
+    def append(self, entry: dict[str, Any]) -> None:
+        with self._lock:
+            self.entries[entry["key"]] = entry
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self.path.open("a", encoding="utf-8") as fh:
+                fh.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+class MockOllamaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], config: MockConfig):
+        super().__init__(address, MockOllamaHandler)
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.rng_lock = threading.Lock()
+        self.loaded_until: dict[str, float] = {}
+        self.prompt_slots: dict[str, list[str]] = {}
+        cassette_path = config.replay_from or config.record_to
+        self.cassette = Cassette(cassette_path) if cassette_path else None
+
+    def draw(self) -> float:
+        with self.rng_lock:
+            return self.rng.random()
+
+    def first_token_seconds(self) -> float:
+        base = self.config.first_token_ms / 1000
+        spread = self.config.latency_spread
+        with self.rng_lock:
+            if self.config.latency_dist == "uniform":
+                return max(0.0, self.rng.uniform(base * (1 - spread), base * (1 + spread)))
+            if self.config.latency_dist == "lognormal":
+                return base * math.exp(self.rng.gauss(0, spread) - spread**2 / 2)
+        return base
+
+    def load_seconds(self, model: str, keep_alive: Any) -> float:
+        now = time.monotonic()
+        with self.rng_lock:
+            warm = self.loaded_until.get(model, 0.0) > now
+            self.loaded_until[model] = now + _keep_alive_seconds(keep_alive)
+            if not warm:
+                self.prompt_slots.pop(model, None)
+        return 0.0 if warm else self.config.cold_load_ms / 1000
+
+    def cached_prefix_tokens(self, model: str, prompt: str) -> int:
+        if self.config.prefix_cache_slots <= 0:
+            return 0
+        with self.rng_lock:
+            slots = self.prompt_slots.setdefault(model, [])
+            best = max(slots, key=lambda cached: _common_prefix(cached, prompt), default="")
+            shared = _common_prefix(best, prompt)
+            if best:
+                slots.remove(best)
+            slots.append(prompt)
+            del slots[: -self.config.prefix_cache_slots]
+        return shared // CHARS_PER_TOKEN
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+class MockOllamaHandler(BaseHTTPRequestHandler):
+    server: MockOllamaServer
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def _send_json(self, status: int, payload: dict[str, Any]) -> None:
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self) -> None:
+        if self.path.rstrip("/") == "/api/tags":
+            self._send_json(200, {"models": [{"name": name, "model": name} for name in self.server.config.models]})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_json(400, {"error": "invalid JSON body"})
+            return
+        if self.path.rstrip("/") != "/api/chat":
+            self._send_json(404, {"error": "not found"})
+            return
+
+        config = self.server.config
+        if config.error_rate and self.server.draw() < config.error_rate:
+            self._send_json(500, {"error": "falha simulada"})
+            return
+
+        model = body.get("model", "")
+        if config.upstream and config.record_to:
+            self._proxy_and_record(body)
+            return
+        if model not in config.models:
+            self._send_json(404, {"error": f"model '{model}' not found"})
+            return
+
+        if not body.get("messages"):
+            load_s = self.server.load_seconds(model, body.get("keep_alive"))
+            time.sleep(load_s)
+            stats = {"load_duration": int(load_s * 1e9), "total_duration": int(load_s * 1e9)}
+            self._send_json(200, self._final_chunk(model, "", stats))
+            return
+
+        entry = self.server.cassette.get(request_key(body)) if config.replay_from else None
+        if config.replay_from and entry is None:
+            self._send_json(404, {"error": "cassette miss"})
+            return
+        self._respond(body, entry)
+
+    def _respond(self, body: dict[str, Any], entry: dict[str, Any] | None) -> None:
+        config = self.server.config
+        model = body["model"]
+        content = entry["content"] if entry else synthetic_content(body)
+        tokens = _split_tokens(content) + ["\n"] * config.trailing_tokens
+        num_predict = int((body.get("options") or {}).get("num_predict") or 0)
+        if num_predict > 0:
+            tokens = tokens[:num_predict]
+        content = "".join(tokens)
+        prompt = render_prompt(body.get("messages", []))
+        load_s = self.server.load_seconds(model, body.get("keep_alive"))
+        prompt_tokens = max(1, len(prompt) // CHARS_PER_TOKEN - self.server.cached_prefix_tokens(model, prompt))
+        prompt_s = prompt_tokens / config.prompt_tokens_per_second if config.prompt_tokens_per_second else 0.0
+        first_s = load_s + max(self.server.first_token_seconds(), prompt_s)
+        token_s = 1 / config.tokens_per_second if config.tokens_per_second else 0.0
+        delays = [first_s] + [token_s] * (len(tokens) - 1)
+        if entry and config.replay_timing and entry.get("delays"):
+            delays = list(entry["delays"])[: len(tokens)] + [token_s] * max(0, len(tokens) - len(entry["delays"]))
+
+        stats = {
+            "prompt_eval_count": prompt_tokens,
+            "eval_count": len(tokens),
+            "load_duration": int(load_s * 1e9),
+            "prompt_eval_duration": int(prompt_s * 1e9),
+            "eval_duration": int(sum(delays[1:]) * 1e9),
+            "total_duration": int(sum(delays) * 1e9),
+        }
+        disconnect_at = (
+            int(self.server.draw() * len(tokens))
+            if config.disconnect_rate and self.server.draw() < config.disconnect_rate
+            else None
+        )
+
+        if not body.get("stream", True):
+            time.sleep(sum(delays))
+            if disconnect_at is not None:
+                self.close_connection = True
+                return
+            self._send_json(200, self._final_chunk(model, content, stats))
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for idx, (token, delay) in enumerate(zip(tokens, delays)):
+                if idx == disconnect_at:
+                    self.close_connection = True
+                    return
+                time.sleep(delay)
+                self._write_chunk({"model": model, "message": {"role": "assistant", "content": token}, "done": False})
+            self._write_chunk(self._final_chunk(model, "", stats))
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+    def _final_chunk(self, model: str, content: str, stats: dict[str, Any]) -> dict[str, Any]:
+        return {
+            "model": model,
+            "message": {"role": "assistant", "content": content},
+            "done": True,
+            "done_reason": "stop",
+            **stats,
+        }
+
+    def _write_chunk(self, payload: dict[str, Any]) -> None:
+        data = (json.dumps(payload, ensure_ascii=False) + "\n").encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _proxy_and_record(self, body: dict[str, Any]) -> None:
+        config = self.server.config
+        upstream_body = dict(body, stream=True)
+        req = request.Request(
+            f"{config.upstream.rstrip('/')}/api/chat",
+            method="POST",
+            data=json.dumps(upstream_body).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+        )
+        parts: list[str] = []
+        delays: list[float] = []
+        stats: dict[str, Any] = {}
+        try:
+            with request.urlopen(req, timeout=600) as resp:
+                last = time.perf_counter()
+                for line in resp:
+                    if not line.strip():
+                        continue
+                    chunk = json.loads(line)
+                    now = time.perf_counter()
+                    if chunk.get("done"):
+                        stats = {k: v for k, v in chunk.items() if k.endswith(("_count", "_duration"))}
+                        if chunk.get("message", {}).get("content"):
+                            parts.append(chunk["message"]["content"])
+                            delays.append(now - last)
+                        break
+                    parts.append(chunk.get("message", {}).get("content", ""))
+                    delays.append(now - last)
+                    last = now
+        except OSError as exc:
+            self._send_json(502, {"error": f"upstream indisponível: {exc}"})
+            return
+
+        entry = {
+            "key": request_key(body),
+            "model": body.get("model"),
+            "content": "".join(parts),
+            "delays": [round(d, 4) for d in delays],
+            "stats": stats,
+            "recorded_at": time.time(),
+        }
+        self.server.cassette.append(entry)
+        if body.get("stream", True):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for token in parts:
+                message = {"role": "assistant", "content": token}
+                self._write_chunk({"model": entry["model"], "message": message, "done": False})
+            self._write_chunk(self._final_chunk(entry["model"], "", stats))
+            self.wfile.write(b"0\r\n\r\n")
+        else:
+            self._send_json(200, self._final_chunk(entry["model"], entry["content"], stats))
+
+
+def start_mock_server(config: MockConfig | None = None, host: str = "127.0.0.1", port: int = 0) -> MockOllamaServer:
+    server = MockOllamaServer((host, port), config or MockConfig())
+    threading.Thread(target=server.serve_forever, name="mock-ollama", daemon=True).start()
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Servidor Ollama simulado para testes de carga e benchmarks.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--models", default="llama3.1:8b", help="Modelos anunciados em /api/tags, separados por vírgula.")
+    parser.add_argument("--first-token-ms", type=float, default=250.0)
+    parser.add_argument("--latency-dist", choices=LATENCY_DISTRIBUTIONS, default="fixed")
+    parser.add_argument("--latency-spread", type=float, default=0.3)
+    parser.add_argument("--tokens-per-second", type=float, default=25.0)
+    parser.add_argument("--prompt-tokens-per-second", type=float, default=400.0)
+    parser.add_argument("--cold-load-ms", type=float, default=0.0)
+    parser.add_argument(
+        "--prefix-cache-slots",
+        type=int,
+        default=4,
+        help="Prompts recentes por modelo cujo prefixo comum não é reavaliado (0 desliga).",
+    )
+    parser.add_argument(
+        "--trailing-tokens",
+        type=int,
+        default=0,
+        help="Tokens de espaço em branco gerados depois da resposta, até o num_predict.",
+    )
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--disconnect-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--record-to", help="Arquivo .jsonl onde gravar as respostas do --upstream.")
+    parser.add_argument("--upstream", help="Ollama real usado no modo de gravação.")
+    parser.add_argument("--replay-from", help="Arquivo .jsonl gravado anteriormente.")
+    parser.add_argument("--replay-timing", action="store_true", help="Reproduz os intervalos gravados entre tokens.")
+    args = parser.parse_args()
+
+    if args.record_to and not args.upstream:
+        parser.error("--record-to exige --upstream")
+
+    config = MockConfig(
+        models=tuple(m.strip() for m in args.models.split(",") if m.strip()),
+        first_token_ms=args.first_token_ms,
+        latency_dist=args.latency_dist,
+        latency_spread=args.latency_spread,
+        tokens_per_second=args.tokens_per_second,
+        prompt_tokens_per_second=args.prompt_tokens_per_second,
+        cold_load_ms=args.cold_load_ms,
+        prefix_cache_slots=args.prefix_cache_slots,
+        trailing_tokens=args.trailing_tokens,
+        error_rate=args.error_rate,
+        disconnect_rate=args.disconnect_rate,
+        seed=args.seed,
+        record_to=args.record_to,
+        upstream=args.upstream,
+        replay_from=args.replay_from,
+        replay_timing=args.replay_timing,
+    )
+    server = MockOllamaServer((args.host, args.port), config)
+    print(f"Mock Ollama em {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
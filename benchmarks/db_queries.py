@@ -0,0 +1,99 @@
+"""SQLite throughput benchmark: queries/s of the core.db helpers on a throwaway database."""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Any
+
+from core import db
+
+SEED_ANALISES = 200
+PARSED = {"habilidades": ["Python", "SQL", "Airflow"], "texto": "Engenheira de dados com Python e SQL.\n" * 20}
+METRICS = {"estrutura": [["Resumo profissional", 60, "Resumo genérico", "Focar na vaga"]]}
+
+
+def _seed() -> list[int]:
+    db.init_db()
+    ids = [
+        db.insert_analise(f"Candidato {i}", "Dados", "Concluída", 50 + i % 50, PARSED, METRICS)
+        for i in range(SEED_ANALISES)
+    ]
+    for analise_id in ids[:50]:
+        db.insert_comparacao(analise_id, "Vaga", "Python SQL", 70, 65, ["python"], ["spark"], ["spark"], ["Estudar"])
+    return ids
+
+
+def page_rerun(analise_id: int) -> int:
+    db.fetch_analises()
+    db.fetch_analise_by_id(analise_id)
+    db.fetch_analise_artifacts(analise_id)
+    db.fetch_comparacoes_by_analise(analise_id)
+    db.fetch_analise_ai_payload(analise_id, "comparison")
+    db.fetch_llm_cache(f"bench-{analise_id}", 3600)
+    db.insert_llm_call_stats(analise_id, [{"stage": "final", "model": "bench", "completion_tokens": 100}])
+    db.update_analise_ai_payload(analise_id, "comparison", {"final_score": 70})
+    return 8
+
+
+def _worker(ids: list[int], seconds: float, offset: int, totals: dict[str, int], lock: threading.Lock) -> None:
+    done = locked = 0
+    deadline = time.perf_counter() + seconds
+    i = offset
+    while time.perf_counter() < deadline:
+        try:
+            done += page_rerun(ids[i % len(ids)])
+        except sqlite3.OperationalError as exc:
+            if "locked" not in str(exc):
+                raise
+            locked += 1
+        i += 1
+    with lock:
+        totals["queries"] += done
+        totals["locked_errors"] += locked
+
+
+def run(threads: int, seconds: float) -> dict[str, Any]:
+    ids = _seed()
+    totals = {"queries": 0, "locked_errors": 0}
+    lock = threading.Lock()
+    workers = [
+        threading.Thread(target=_worker, args=(ids, seconds, n * 7, totals, lock)) for n in range(max(1, threads))
+    ]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+    return {
+        "threads": threads,
+        "seconds": round(elapsed, 2),
+        "queries": totals["queries"],
+        "queries_per_second": round(totals["queries"] / elapsed, 1),
+        "locked_errors": totals["locked_errors"],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Mede consultas/s das funções de core.db num banco temporário.")
+    parser.add_argument("--threads", default="1,4", help="Números de threads separados por vírgula.")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for n, threads in enumerate(int(part) for part in args.threads.split(",") if part.strip()):
+            path = os.path.join(tmp, f"bench-{n}.db")
+            db._get_db_path = lambda path=path: path
+            results.append(run(threads, args.seconds))
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""Prompt-eval benchmark: legacy interleaved prompts vs the prefix-stable layout."""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import tempfile
+from dataclasses import replace
+from typing import Any, Callable
+
+from agents.context_builder import build_final_context, build_planning_context
+from agents.ollama_agent import (
+    OllamaConfig,
+    _build_safe_context,
+    _chat_json,
+    _final_messages,
+    _planning_messages,
+    _read_prompt,
+    _run_tools,
+    _tool_descriptions,
+)
+from agents.structured_output import FINAL_SCHEMA, PLANNING_SCHEMA
+from core import db
+
+CANDIDATES = [
+    ("Ana", "Dados", ["Python", "SQL", "Airflow"], "Engenheira de dados", "Pipelines ETL em Python, SQL e Airflow."),
+    ("Bruno", "Backend", ["Java", "Spring", "Docker"], "Dev backend", "APIs REST em Java com Spring e Docker."),
+    ("Carla", "Produto", ["Discovery", "SQL", "Jira"], "PM", "Gestão de backlog, discovery e métricas de produto."),
+    ("Diego", "Frontend", ["React", "TypeScript", "CSS"], "Dev frontend", "Interfaces em React com TypeScript."),
+]
+SECTION_METRICS = {
+    "estrutura": [("Resumo profissional", 60, "Resumo genérico", "Focar na vaga")],
+    "experiencia": [("Métricas de impacto", 45, "Poucos números", "Incluir resultados")],
+    "habilidades": [("Aderência à vaga", 70, "Boa cobertura", "Priorizar as exigidas")],
+}
+
+
+def legacy_planning_messages(safe_context: dict[str, Any]) -> list[dict[str, str]]:
+    built = build_planning_context(safe_context)
+    return [
+        {"role": "system", "content": _read_prompt("system_prompt.txt")},
+        {
+            "role": "user",
+            "content": (
+                f"Tools disponíveis:\n{_tool_descriptions()}\n\n"
+                f"Contexto:\n{built.context_json()}\n\n"
+                f"{_read_prompt('tool_selection_prompt.txt')}"
+            ),
+        },
+    ]
+
+
+def legacy_final_messages(safe_context: dict[str, Any], tool_results: list[dict[str, Any]]) -> list[dict[str, str]]:
+    built = build_final_context(safe_context, tool_results)
+    return [
+        {"role": "system", "content": _read_prompt("system_prompt.txt")},
+        {
+            "role": "user",
+            "content": (
+                f"Contexto base:\n{built.context_json()}\n\n"
+                f"Resultados de tools:\n{built.tool_summary_json()}\n\n"
+                f"{_read_prompt('final_response_prompt.txt')}"
+            ),
+        },
+    ]
+
+
+LAYOUTS: dict[str, tuple[Callable[..., list[dict[str, str]]], Callable[..., list[dict[str, str]]]]] = {
+    "legado": (legacy_planning_messages, legacy_final_messages),
+    "prefixo_estavel": (_planning_messages, _final_messages),
+}
+
+
+def run_layout(name: str, config: OllamaConfig, rounds: int) -> dict[str, Any]:
+    planning_messages, final_messages = LAYOUTS[name]
+    calls = []
+    for _ in range(rounds):
+        for candidate_name, area, skills, job_title, job_description in CANDIDATES:
+            safe_context = _build_safe_context(
+                candidate_name=candidate_name,
+                area=area,
+                resume_skills=skills,
+                section_metrics=SECTION_METRICS,
+                job_title=job_title,
+                job_description=job_description,
+            )
+            tool_results = _run_tools({}, safe_context)
+            for messages, schema in (
+                (planning_messages(safe_context), PLANNING_SCHEMA),
+                (final_messages(safe_context, tool_results), FINAL_SCHEMA),
+            ):
+                usage: dict[str, Any] = {}
+                _chat_json(config, messages, schema, usage)
+                calls.append(usage)
+
+    prompt_eval_ms = sum(call.get("prompt_eval_ms", 0) for call in calls)
+    prompt_tokens = sum(call.get("prompt_tokens", 0) for call in calls)
+    return {
+        "layout": name,
+        "calls": len(calls),
+        "prompt_tokens": prompt_tokens,
+        "prompt_eval_ms": prompt_eval_ms,
+        "prompt_eval_ms_per_call": round(prompt_eval_ms / len(calls), 1) if calls else 0.0,
+        "wall_ms": sum(call.get("wall_ms", 0) for call in calls),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compara o tempo de avaliação do prompt entre layouts.")
+    parser.add_argument("--base-url", help="Ollama a medir. Sem ele, usa o Ollama simulado com cache de prefixo.")
+    parser.add_argument("--model", default=OllamaConfig.model)
+    parser.add_argument("--rounds", type=int, default=2)
+    parser.add_argument("--num-predict", type=int, default=64)
+    args = parser.parse_args()
+
+    mock = None
+    base_url = args.base_url
+    if not base_url:
+        from backend.mock_ollama import MockConfig, start_mock_server
+
+        mock = start_mock_server(
+            MockConfig(models=(args.model,), first_token_ms=0, tokens_per_second=0, prompt_tokens_per_second=4000)
+        )
+        base_url = mock.url
+
+    config = replace(
+        OllamaConfig(),
+        model=args.model,
+        base_url=base_url,
+        num_predict=args.num_predict,
+        use_cache=False,
+        coalesce=False,
+        priority="batch",
+    )
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "bench.db")
+            db._get_db_path = lambda: path
+            db.init_db()
+            results = [run_layout(name, config, args.rounds) for name in LAYOUTS]
+    finally:
+        if mock is not None:
+            mock.shutdown()
+
+    baseline, candidate = results
+    if baseline["prompt_eval_ms"]:
+        saved = 1 - candidate["prompt_eval_ms"] / baseline["prompt_eval_ms"]
+        candidate["prompt_eval_saved"] = round(saved, 4)
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
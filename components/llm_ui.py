@@ -3,6 +3,12 @@ import re
 
 import streamlit as st
 
+from agents.resilience import breaker_state
+from workers.queue import JOB_STATUS_LABELS, Job, get_job
+
+JOB_POLL_SECONDS = 2
+JOB_STREAM_POLL_SECONDS = 0.5
+
 
 def _pick_first(data: dict, keys: list[str], default: str = "") -> str:
     for key in keys:
@@ -159,3 +165,109 @@ def render_rewrites(rewrites, label_key_pairs):
             """,
             unsafe_allow_html=True,
         )
+
+
+DEGRADATION_LABELS = {
+    "planning_skipped": "planejamento pulado (tools padrão)",
+    "planning_interrupted": "planejamento interrompido",
+    "final_shortened": "resposta encurtada",
+    "final_skipped": "resposta do modelo pulada",
+    "final_interrupted": "resposta interrompida",
+    "section_shortened": "reescrita encurtada",
+    "section_skipped": "reescrita do modelo pulada",
+    "section_interrupted": "reescrita interrompida",
+}
+
+STAGE_LABELS = {
+    "planning": "Planejando ferramentas...",
+    "tools": "Executando ferramentas...",
+    "final": "Escrevendo recomendações...",
+    "section": "Reescrevendo as seções...",
+    "coalesced": "Aguardando análise idêntica já em andamento...",
+}
+
+
+def _job_caption(job: Job) -> str:
+    label = JOB_STATUS_LABELS.get(job.status, job.status)
+    if job.status == "running" and job.stage:
+        return f"Job #{job.id}: {label} - {STAGE_LABELS.get(job.stage, job.stage)}"
+    if job.status == "queued" and job.error:
+        return f"Job #{job.id}: {label} (nova tentativa após: {job.error})"
+    return f"Job #{job.id}: {label}"
+
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def _job_progress(job_id: int):
+    job = get_job(job_id)
+    if job is None or job.status != "queued":
+        st.rerun()
+    st.info(_job_caption(job))
+
+
+@st.fragment(run_every=JOB_STREAM_POLL_SECONDS)
+def _job_stream(job_id: int):
+    job = get_job(job_id)
+    if job is None or job.status != "running":
+        st.rerun()
+    st.info(_job_caption(job))
+    if job.partial_text:
+        st.code(job.partial_text, language="json")
+
+
+def job_in_progress(job_key: str) -> bool:
+    job_id = st.session_state.get(job_key)
+    job = get_job(job_id) if job_id is not None else None
+    return bool(job and job.active)
+
+
+def render_job_progress(job_key: str) -> Job | None:
+    job_id = st.session_state.get(job_key)
+    if job_id is None:
+        return None
+    job = get_job(job_id)
+    if job is not None and job.active:
+        if job.status == "running":
+            _job_stream(job.id)
+        else:
+            _job_progress(job.id)
+        return None
+    st.session_state.pop(job_key, None)
+    if job is None:
+        return None
+    if job.status == "failed":
+        st.error(f"Falha na execução com Ollama: {job.error}")
+        return None
+    return job
+
+
+def render_llm_availability(base_url: str) -> bool:
+    state = breaker_state(base_url)
+    if state["state"] != "open":
+        return False
+    st.warning(
+        f"Ollama indisponível após falhas seguidas. As ações de IA voltam a ser liberadas em {state['retry_after']}s."
+    )
+    return True
+
+
+def render_run_details(result: dict):
+    result = result or {}
+    timings = result.get("timings", {})
+    final_timing = timings.get("final") or timings.get("section") or {}
+    if final_timing.get("ttft_ms") is not None:
+        st.caption(
+            f"Primeiro token em {final_timing['ttft_ms']} ms | "
+            f"resposta completa em {final_timing.get('total_ms', 0)} ms"
+        )
+    prompt_stats = result.get("prompt_stats") or {}
+    if prompt_stats:
+        raw_tokens = sum(stage.get("raw_tokens", 0) for stage in prompt_stats.values())
+        tokens = sum(stage.get("tokens", 0) for stage in prompt_stats.values())
+        st.caption(f"Contexto enviado ao modelo: ~{tokens} tokens (antes da compactação: ~{raw_tokens})")
+    output_errors = result.get("output_errors") or {}
+    if output_errors.get("final") or output_errors.get("section"):
+        st.caption("O modelo saiu do formato esperado; parte das recomendações usa o conteúdo padrão das ferramentas.")
+    if result.get("degraded"):
+        steps = ", ".join(DEGRADATION_LABELS.get(item, item) for item in result.get("degradations", []))
+        deadline = result.get("parameters", {}).get("deadline_seconds", 0)
+        st.caption(f"Prazo de {deadline:g}s: {steps}. Parte das recomendações usa o conteúdo padrão das tools.")
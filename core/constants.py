@@ -12,4 +12,5 @@ PAGE_OPTIONS = [
     ("Compara\u00e7\u00e3o com a Vaga", "comparacao"),
     ("Relat\u00f3rio Final", "relatorio"),
     ("Hist\u00f3rico de An\u00e1lises", "historico"),
+    ("M\u00e9tricas do LLM", "metricas_llm"),
 ]
@@ -1,80 +1,292 @@
 import json
 import os
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
 
 from core.constants import DB_PATH, STATUS_CONCLUIDA, STATUS_EM_ANALISE, STATUS_REVISAO
 
+BUSY_TIMEOUT_MS = 5000
+CACHE_SIZE_KIB = 16384
+MMAP_SIZE_BYTES = 128 * 1024 * 1024
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}",
+    "PRAGMA synchronous = NORMAL",
+    f"PRAGMA cache_size = -{CACHE_SIZE_KIB}",
+    f"PRAGMA mmap_size = {MMAP_SIZE_BYTES}",
+    "PRAGMA temp_store = MEMORY",
+)
+
+_local = threading.local()
+
 
 def _get_db_path() -> str:
     base_dir = os.path.dirname(os.path.dirname(__file__))
     return os.path.join(base_dir, DB_PATH)
 
 
-def get_conn():
-    return sqlite3.connect(_get_db_path())
+def _connect(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+    return conn
 
 
-def init_db():
+def get_conn() -> sqlite3.Connection:
+    path = _get_db_path()
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.path != path or _local.pid != os.getpid():
+        conn = _local.conn = _connect(path)
+        _local.path, _local.pid = path, os.getpid()
+    return conn
+
+
+@contextmanager
+def transaction():
     conn = get_conn()
-    cur = conn.cursor()
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS analises (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            candidato TEXT NOT NULL,
-            area TEXT NOT NULL,
-            status TEXT NOT NULL,
-            score INTEGER NOT NULL,
-            created_at TEXT NOT NULL,
-            parsed_json TEXT,
-            metrics_json TEXT,
-            ai_sections_json TEXT,
-            ai_comparison_json TEXT,
-            ai_report_json TEXT
+    if conn.in_transaction:
+        yield conn.cursor()
+        return
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn.cursor()
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+
+
+@contextmanager
+def _cursor(cur=None):
+    if cur is not None:
+        yield cur
+        return
+    with transaction() as cur:
+        yield cur
+
+
+def _read_cursor(row_factory=None) -> sqlite3.Cursor:
+    cur = get_conn().cursor()
+    cur.row_factory = row_factory
+    return cur
+
+
+def init_db():
+    with _cursor() as cur:
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS analises (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                candidato TEXT NOT NULL,
+                area TEXT NOT NULL,
+                status TEXT NOT NULL,
+                score INTEGER NOT NULL,
+                created_at TEXT NOT NULL,
+                parsed_json TEXT,
+                metrics_json TEXT,
+                ai_sections_json TEXT,
+                ai_comparison_json TEXT,
+                ai_report_json TEXT
+            )
+            """
         )
-        """
-    )
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS comparacoes (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            analise_id INTEGER NOT NULL,
-            vaga_titulo TEXT NOT NULL,
-            vaga_descricao TEXT NOT NULL,
-            compat INTEGER NOT NULL,
-            semantic_fit INTEGER NOT NULL,
-            presentes TEXT NOT NULL,
-            ausentes TEXT NOT NULL,
-            lacunas TEXT NOT NULL,
-            recomendacoes TEXT NOT NULL,
-            created_at TEXT NOT NULL
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS comparacoes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                analise_id INTEGER NOT NULL,
+                vaga_titulo TEXT NOT NULL,
+                vaga_descricao TEXT NOT NULL,
+                compat INTEGER NOT NULL,
+                semantic_fit INTEGER NOT NULL,
+                presentes TEXT NOT NULL,
+                ausentes TEXT NOT NULL,
+                lacunas TEXT NOT NULL,
+                recomendacoes TEXT NOT NULL,
+                created_at TEXT NOT NULL
+            )
+            """
         )
-        """
-    )
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS app_meta (
-            key TEXT PRIMARY KEY,
-            value TEXT NOT NULL
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS app_meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            )
+            """
         )
-        """
-    )
-    # Migração leve para bases já existentes sem as colunas novas.
-    cur.execute("PRAGMA table_info(analises)")
-    cols = {row[1] for row in cur.fetchall()}
-    if "parsed_json" not in cols:
-        cur.execute("ALTER TABLE analises ADD COLUMN parsed_json TEXT")
-    if "metrics_json" not in cols:
-        cur.execute("ALTER TABLE analises ADD COLUMN metrics_json TEXT")
-    if "ai_sections_json" not in cols:
-        cur.execute("ALTER TABLE analises ADD COLUMN ai_sections_json TEXT")
-    if "ai_comparison_json" not in cols:
-        cur.execute("ALTER TABLE analises ADD COLUMN ai_comparison_json TEXT")
-    if "ai_report_json" not in cols:
-        cur.execute("ALTER TABLE analises ADD COLUMN ai_report_json TEXT")
-    conn.commit()
-    conn.close()
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                cache_key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                response TEXT NOT NULL,
+                size_bytes INTEGER NOT NULL,
+                latency_ms INTEGER NOT NULL,
+                hit_count INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                last_hit_at REAL NOT NULL
+            )
+            """
+        )
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_hit ON llm_cache (last_hit_at)")
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS agent_flights (
+                flight_key TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                status TEXT NOT NULL,
+                result_json TEXT,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS llm_admission (
+                ticket TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                priority INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                enqueued_at REAL NOT NULL,
+                heartbeat_at REAL NOT NULL
+            )
+            """
+        )
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_llm_admission_status ON llm_admission (status, priority)")
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS llm_endpoint_stats (
+                owner TEXT NOT NULL,
+                router TEXT NOT NULL,
+                url TEXT NOT NULL,
+                snapshot_json TEXT NOT NULL,
+                last_used REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (owner, router, url)
+            )
+            """
+        )
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS llm_breakers (
+                base_url TEXT PRIMARY KEY,
+                failures INTEGER NOT NULL,
+                open_until REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS llm_call_stats (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                analise_id INTEGER,
+                stage TEXT NOT NULL,
+                model TEXT NOT NULL,
+                cached INTEGER NOT NULL DEFAULT 0,
+                prompt_tokens INTEGER NOT NULL DEFAULT 0,
+                completion_tokens INTEGER NOT NULL DEFAULT 0,
+                prompt_eval_ms INTEGER NOT NULL DEFAULT 0,
+                eval_ms INTEGER NOT NULL DEFAULT 0,
+                load_ms INTEGER NOT NULL DEFAULT 0,
+                wall_ms INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL
+            )
+            """
+        )
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_llm_call_stats_analise ON llm_call_stats (analise_id)")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_llm_call_stats_created ON llm_call_stats (created_at)")
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS llm_jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                analise_id INTEGER,
+                priority TEXT NOT NULL DEFAULT 'interactive',
+                dedupe_key TEXT NOT NULL,
+                status TEXT NOT NULL,
+                stage TEXT,
+                payload_json TEXT NOT NULL,
+                result_json TEXT,
+                error TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                worker TEXT,
+                created_at REAL NOT NULL,
+                available_at REAL NOT NULL,
+                started_at REAL,
+                heartbeat_at REAL,
+                finished_at REAL,
+                partial_text TEXT
+            )
+            """
+        )
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_llm_jobs_status ON llm_jobs (status, available_at)")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_llm_jobs_dedupe ON llm_jobs (dedupe_key, status)")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_llm_jobs_analise ON llm_jobs (analise_id, kind)")
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS batch_runs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                vaga_titulo TEXT NOT NULL,
+                vaga_descricao TEXT NOT NULL,
+                config_json TEXT NOT NULL,
+                save_history INTEGER NOT NULL DEFAULT 1,
+                status TEXT NOT NULL,
+                owner TEXT,
+                created_at REAL NOT NULL,
+                heartbeat_at REAL,
+                error TEXT
+            )
+            """
+        )
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS batch_items (
+                batch_id INTEGER NOT NULL,
+                analise_id INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                applied INTEGER NOT NULL DEFAULT 0,
+                result_json TEXT,
+                error TEXT,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (batch_id, analise_id)
+            )
+            """
+        )
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS resume_passages (
+                analise_id INTEGER NOT NULL,
+                position INTEGER NOT NULL,
+                text TEXT NOT NULL,
+                terms_json TEXT NOT NULL,
+                PRIMARY KEY (analise_id, position)
+            )
+            """
+        )
+        # Migração leve para bases já existentes sem as colunas novas.
+        cur.execute("PRAGMA table_info(analises)")
+        cols = {row[1] for row in cur.fetchall()}
+        if "parsed_json" not in cols:
+            cur.execute("ALTER TABLE analises ADD COLUMN parsed_json TEXT")
+        if "metrics_json" not in cols:
+            cur.execute("ALTER TABLE analises ADD COLUMN metrics_json TEXT")
+        if "ai_sections_json" not in cols:
+            cur.execute("ALTER TABLE analises ADD COLUMN ai_sections_json TEXT")
+        if "ai_comparison_json" not in cols:
+            cur.execute("ALTER TABLE analises ADD COLUMN ai_comparison_json TEXT")
+        if "ai_report_json" not in cols:
+            cur.execute("ALTER TABLE analises ADD COLUMN ai_report_json TEXT")
+        cur.execute("PRAGMA table_info(llm_jobs)")
+        if "partial_text" not in {row[1] for row in cur.fetchall()}:
+            cur.execute("ALTER TABLE llm_jobs ADD COLUMN partial_text TEXT")
+        cur.execute("PRAGMA table_info(batch_runs)")
+        if "error" not in {row[1] for row in cur.fetchall()}:
+            cur.execute("ALTER TABLE batch_runs ADD COLUMN error TEXT")
 
 
 def insert_analise(
@@ -85,35 +297,29 @@ def insert_analise(
     parsed_data: dict | None = None,
     metrics_data: dict | None = None,
 ) -> int:
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute(
-        """
-        INSERT INTO analises (candidato, area, status, score, created_at, parsed_json, metrics_json)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-        """,
-        (
-            candidato,
-            area,
-            status,
-            score,
-            datetime.now().strftime("%Y-%m-%d %H:%M"),
-            json.dumps(parsed_data, ensure_ascii=False) if parsed_data else None,
-            json.dumps(metrics_data, ensure_ascii=False) if metrics_data else None,
-        ),
-    )
-    analise_id = cur.lastrowid
-    conn.commit()
-    conn.close()
+    with _cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO analises (candidato, area, status, score, created_at, parsed_json, metrics_json)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                candidato,
+                area,
+                status,
+                score,
+                datetime.now().strftime("%Y-%m-%d %H:%M"),
+                json.dumps(parsed_data, ensure_ascii=False) if parsed_data else None,
+                json.dumps(metrics_data, ensure_ascii=False) if metrics_data else None,
+            ),
+        )
+        analise_id = cur.lastrowid
     return analise_id
 
 
-def update_analise(analise_id: int, status: str, score: int):
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("UPDATE analises SET status = ?, score = ? WHERE id = ?", (status, score, analise_id))
-    conn.commit()
-    conn.close()
+def update_analise(analise_id: int, status: str, score: int, cur=None):
+    with _cursor(cur) as cur:
+        cur.execute("UPDATE analises SET status = ?, score = ? WHERE id = ?", (status, score, analise_id))
 
 
 def update_analise_artifacts(
@@ -124,77 +330,66 @@ def update_analise_artifacts(
     area: str | None = None,
     score: int | None = None,
 ):
-    conn = get_conn()
-    cur = conn.cursor()
-    if candidato is not None and area is not None and score is not None:
-        cur.execute(
-            """
-            UPDATE analises
-            SET candidato = ?, area = ?, score = ?, parsed_json = ?, metrics_json = ?
-            WHERE id = ?
-            """,
-            (
-                candidato,
-                area,
-                score,
-                json.dumps(parsed_data, ensure_ascii=False),
-                json.dumps(metrics_data, ensure_ascii=False),
-                analise_id,
-            ),
-        )
-    else:
-        cur.execute(
-            """
-            UPDATE analises
-            SET parsed_json = ?, metrics_json = ?
-            WHERE id = ?
-            """,
-            (
-                json.dumps(parsed_data, ensure_ascii=False),
-                json.dumps(metrics_data, ensure_ascii=False),
-                analise_id,
-            ),
-        )
-    conn.commit()
-    conn.close()
+    with _cursor() as cur:
+        if candidato is not None and area is not None and score is not None:
+            cur.execute(
+                """
+                UPDATE analises
+                SET candidato = ?, area = ?, score = ?, parsed_json = ?, metrics_json = ?
+                WHERE id = ?
+                """,
+                (
+                    candidato,
+                    area,
+                    score,
+                    json.dumps(parsed_data, ensure_ascii=False),
+                    json.dumps(metrics_data, ensure_ascii=False),
+                    analise_id,
+                ),
+            )
+        else:
+            cur.execute(
+                """
+                UPDATE analises
+                SET parsed_json = ?, metrics_json = ?
+                WHERE id = ?
+                """,
+                (
+                    json.dumps(parsed_data, ensure_ascii=False),
+                    json.dumps(metrics_data, ensure_ascii=False),
+                    analise_id,
+                ),
+            )
 
 
 def delete_analise(analise_id: int):
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("DELETE FROM comparacoes WHERE analise_id = ?", (analise_id,))
-    cur.execute("DELETE FROM analises WHERE id = ?", (analise_id,))
-    conn.commit()
-    conn.close()
+    with _cursor() as cur:
+        cur.execute("DELETE FROM comparacoes WHERE analise_id = ?", (analise_id,))
+        cur.execute("DELETE FROM resume_passages WHERE analise_id = ?", (analise_id,))
+        cur.execute("DELETE FROM analises WHERE id = ?", (analise_id,))
 
 
 def fetch_analises():
-    conn = get_conn()
-    cur = conn.cursor()
+    cur = _read_cursor()
     cur.execute("SELECT id, candidato, area, status, score, created_at FROM analises ORDER BY id DESC")
     rows = cur.fetchall()
-    conn.close()
     return rows
 
 
 def fetch_analise_by_id(analise_id: int):
-    conn = get_conn()
-    cur = conn.cursor()
+    cur = _read_cursor()
     cur.execute(
         "SELECT id, candidato, area, status, score, created_at FROM analises WHERE id = ?",
         (analise_id,),
     )
     row = cur.fetchone()
-    conn.close()
     return row
 
 
 def fetch_analise_artifacts(analise_id: int) -> tuple[dict, dict]:
-    conn = get_conn()
-    cur = conn.cursor()
+    cur = _read_cursor()
     cur.execute("SELECT parsed_json, metrics_json FROM analises WHERE id = ?", (analise_id,))
     row = cur.fetchone()
-    conn.close()
     if not row:
         return {}, {}
 
@@ -211,12 +406,32 @@ def fetch_analise_artifacts(analise_id: int) -> tuple[dict, dict]:
     return parsed_data, metrics_data
 
 
+def replace_resume_passages(analise_id: int, passages: list[tuple[str, dict[str, int]]], cur=None):
+    with _cursor(cur) as cur:
+        cur.execute("DELETE FROM resume_passages WHERE analise_id = ?", (analise_id,))
+        cur.executemany(
+            "INSERT INTO resume_passages (analise_id, position, text, terms_json) VALUES (?, ?, ?, ?)",
+            [
+                (analise_id, position, text, json.dumps(terms, ensure_ascii=False))
+                for position, (text, terms) in enumerate(passages)
+            ],
+        )
+
+
+def fetch_resume_passages(analise_id: int) -> list[dict]:
+    cur = _read_cursor()
+    cur.execute(
+        "SELECT position, text, terms_json FROM resume_passages WHERE analise_id = ? ORDER BY position",
+        (analise_id,),
+    )
+    rows = [{"position": row[0], "text": row[1], "terms": json.loads(row[2])} for row in cur.fetchall()]
+    return rows
+
+
 def fetch_analise_ai_sections(analise_id: int) -> dict:
-    conn = get_conn()
-    cur = conn.cursor()
+    cur = _read_cursor()
     cur.execute("SELECT ai_sections_json FROM analises WHERE id = ?", (analise_id,))
     row = cur.fetchone()
-    conn.close()
     if not row or not row[0]:
         return {}
     try:
@@ -226,26 +441,32 @@ def fetch_analise_ai_sections(analise_id: int) -> dict:
         return {}
 
 
-def update_analise_ai_section(
+def update_analise_ai_sections(
     analise_id: int,
-    section_key: str,
+    section_keys: list[str],
     llm_result: dict,
     job_description: str,
 ):
-    current = fetch_analise_ai_sections(analise_id)
-    current[section_key] = {
-        "job_description": job_description,
-        "result": llm_result,
-        "updated_at": datetime.now().strftime("%Y-%m-%d %H:%M"),
-    }
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute(
-        "UPDATE analises SET ai_sections_json = ? WHERE id = ?",
-        (json.dumps(current, ensure_ascii=False), analise_id),
-    )
-    conn.commit()
-    conn.close()
+    with _cursor() as cur:
+        cur.execute("SELECT ai_sections_json FROM analises WHERE id = ?", (analise_id,))
+        row = cur.fetchone()
+        try:
+            current = json.loads(row[0]) if row and row[0] else {}
+        except Exception:
+            current = {}
+        if not isinstance(current, dict):
+            current = {}
+        updated_at = datetime.now().strftime("%Y-%m-%d %H:%M")
+        for section_key in section_keys:
+            current[section_key] = {
+                "job_description": job_description,
+                "result": llm_result,
+                "updated_at": updated_at,
+            }
+        cur.execute(
+            "UPDATE analises SET ai_sections_json = ? WHERE id = ?",
+            (json.dumps(current, ensure_ascii=False), analise_id),
+        )
 
 
 def fetch_analise_ai_payload(analise_id: int, payload_type: str) -> dict:
@@ -257,11 +478,9 @@ def fetch_analise_ai_payload(analise_id: int, payload_type: str) -> dict:
     if not col:
         return {}
 
-    conn = get_conn()
-    cur = conn.cursor()
+    cur = _read_cursor()
     cur.execute(f"SELECT {col} FROM analises WHERE id = ?", (analise_id,))
     row = cur.fetchone()
-    conn.close()
     if not row or not row[0]:
         return {}
     try:
@@ -271,7 +490,7 @@ def fetch_analise_ai_payload(analise_id: int, payload_type: str) -> dict:
         return {}
 
 
-def update_analise_ai_payload(analise_id: int, payload_type: str, payload: dict):
+def update_analise_ai_payload(analise_id: int, payload_type: str, payload: dict, cur=None):
     col_map = {
         "comparison": "ai_comparison_json",
         "report": "ai_report_json",
@@ -283,14 +502,11 @@ def update_analise_ai_payload(analise_id: int, payload_type: str, payload: dict)
     to_save = dict(payload or {})
     to_save["updated_at"] = datetime.now().strftime("%Y-%m-%d %H:%M")
 
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute(
-        f"UPDATE analises SET {col} = ? WHERE id = ?",
-        (json.dumps(to_save, ensure_ascii=False), analise_id),
-    )
-    conn.commit()
-    conn.close()
+    with _cursor(cur) as cur:
+        cur.execute(
+            f"UPDATE analises SET {col} = ? WHERE id = ?",
+            (json.dumps(to_save, ensure_ascii=False), analise_id),
+        )
 
 
 def insert_comparacao(
@@ -303,35 +519,33 @@ def insert_comparacao(
     ausentes: list[str],
     lacunas: list[str],
     recomendacoes: list[str],
+    cur=None,
 ):
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute(
-        """
-        INSERT INTO comparacoes
-        (analise_id, vaga_titulo, vaga_descricao, compat, semantic_fit, presentes, ausentes, lacunas, recomendacoes, created_at)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """,
-        (
-            analise_id,
-            vaga_titulo,
-            vaga_descricao,
-            compat,
-            semantic_fit,
-            json.dumps(presentes, ensure_ascii=False),
-            json.dumps(ausentes, ensure_ascii=False),
-            json.dumps(lacunas, ensure_ascii=False),
-            json.dumps(recomendacoes, ensure_ascii=False),
-            datetime.now().strftime("%Y-%m-%d %H:%M"),
-        ),
-    )
-    conn.commit()
-    conn.close()
+    with _cursor(cur) as cur:
+        cur.execute(
+            """
+            INSERT INTO comparacoes
+            (analise_id, vaga_titulo, vaga_descricao, compat, semantic_fit, presentes, ausentes,
+                lacunas, recomendacoes, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                analise_id,
+                vaga_titulo,
+                vaga_descricao,
+                compat,
+                semantic_fit,
+                json.dumps(presentes, ensure_ascii=False),
+                json.dumps(ausentes, ensure_ascii=False),
+                json.dumps(lacunas, ensure_ascii=False),
+                json.dumps(recomendacoes, ensure_ascii=False),
+                datetime.now().strftime("%Y-%m-%d %H:%M"),
+            ),
+        )
 
 
 def fetch_comparacoes_by_analise(analise_id: int):
-    conn = get_conn()
-    cur = conn.cursor()
+    cur = _read_cursor()
     cur.execute(
         """
         SELECT id, vaga_titulo, compat, semantic_fit, created_at
@@ -342,7 +556,6 @@ def fetch_comparacoes_by_analise(analise_id: int):
         (analise_id,),
     )
     rows = cur.fetchall()
-    conn.close()
     return rows
 
 
@@ -355,27 +568,24 @@ def load_json_field(raw: str) -> list[str]:
 
 
 def fetch_comparacao_by_id(comparacao_id: int):
-    conn = get_conn()
-    cur = conn.cursor()
+    cur = _read_cursor()
     cur.execute(
         """
-        SELECT id, analise_id, vaga_titulo, vaga_descricao, compat, semantic_fit, presentes, ausentes, lacunas, recomendacoes, created_at
+        SELECT id, analise_id, vaga_titulo, vaga_descricao, compat, semantic_fit, presentes, ausentes,
+            lacunas, recomendacoes, created_at
         FROM comparacoes
         WHERE id = ?
         """,
         (comparacao_id,),
     )
     row = cur.fetchone()
-    conn.close()
     return row
 
 
 def seed_if_empty():
-    conn = get_conn()
-    cur = conn.cursor()
+    cur = _read_cursor()
     cur.execute("SELECT value FROM app_meta WHERE key = 'demo_seed_done'")
     meta = cur.fetchone()
-    conn.close()
     if meta and meta[0] == "1":
         return
 
@@ -397,10 +607,602 @@ def seed_if_empty():
     ]
     for candidato, area, status, score in samples:
         insert_analise(candidato, area, status, score)
-    conn = get_conn()
-    cur = conn.cursor()
+    with _cursor() as cur:
+        cur.execute(
+            "INSERT OR REPLACE INTO app_meta (key, value) VALUES ('demo_seed_done', '1')"
+        )
+
+
+def _increment_meta_counter(cur, key: str, amount: int = 1):
     cur.execute(
-        "INSERT OR REPLACE INTO app_meta (key, value) VALUES ('demo_seed_done', '1')"
+        """
+        INSERT INTO app_meta (key, value) VALUES (?, ?)
+        ON CONFLICT(key) DO UPDATE SET value = CAST(CAST(value AS INTEGER) + ? AS TEXT)
+        """,
+        (key, str(amount), amount),
     )
-    conn.commit()
-    conn.close()
+
+
+def upsert_app_meta(key: str, value: str):
+    with _cursor() as cur:
+        cur.execute("INSERT OR REPLACE INTO app_meta (key, value) VALUES (?, ?)", (key, value))
+
+
+def fetch_app_meta(key: str) -> str | None:
+    cur = _read_cursor()
+    cur.execute("SELECT value FROM app_meta WHERE key = ?", (key,))
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def fetch_llm_cache(cache_key: str, max_age_seconds: float) -> str | None:
+    now = time.time()
+    with _cursor() as cur:
+        cur.execute(
+            "SELECT response, latency_ms FROM llm_cache WHERE cache_key = ? AND created_at >= ?",
+            (cache_key, now - max_age_seconds),
+        )
+        row = cur.fetchone()
+        if row:
+            cur.execute(
+                "UPDATE llm_cache SET hit_count = hit_count + 1, last_hit_at = ? WHERE cache_key = ?",
+                (now, cache_key),
+            )
+            _increment_meta_counter(cur, "llm_cache_hits")
+            _increment_meta_counter(cur, "llm_cache_saved_ms", int(row[1]))
+        else:
+            _increment_meta_counter(cur, "llm_cache_misses")
+    return row[0] if row else None
+
+
+def upsert_llm_cache(cache_key: str, model: str, response: str, latency_ms: int):
+    now = time.time()
+    with _cursor() as cur:
+        cur.execute(
+            """
+            INSERT OR REPLACE INTO llm_cache
+            (cache_key, model, response, size_bytes, latency_ms, hit_count, created_at, last_hit_at)
+            VALUES (?, ?, ?, ?, ?, 0, ?, ?)
+            """,
+            (cache_key, model, response, len(response.encode("utf-8")), latency_ms, now, now),
+        )
+
+
+def evict_llm_cache(max_entries: int, max_bytes: int, max_age_seconds: float) -> int:
+    with _cursor() as cur:
+        cur.execute("DELETE FROM llm_cache WHERE created_at < ?", (time.time() - max_age_seconds,))
+        removed = cur.rowcount
+        cur.execute(
+            """
+            DELETE FROM llm_cache WHERE cache_key IN (
+                SELECT cache_key FROM llm_cache ORDER BY last_hit_at DESC LIMIT -1 OFFSET ?
+            )
+            """,
+            (max_entries,),
+        )
+        removed += cur.rowcount
+        cur.execute(
+            """
+            DELETE FROM llm_cache WHERE cache_key IN (
+                SELECT cache_key FROM (
+                    SELECT cache_key, SUM(size_bytes) OVER (ORDER BY last_hit_at DESC) AS running_bytes
+                    FROM llm_cache
+                )
+                WHERE running_bytes > ?
+            )
+            """,
+            (max_bytes,),
+        )
+        removed += cur.rowcount
+    return removed
+
+
+def fetch_llm_cache_stats() -> dict:
+    cur = _read_cursor()
+    cur.execute("SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM llm_cache")
+    entries, size_bytes = cur.fetchone()
+    cur.execute(
+        "SELECT key, value FROM app_meta WHERE key IN ('llm_cache_hits', 'llm_cache_misses', 'llm_cache_saved_ms')"
+    )
+    counters = {key: int(value) for key, value in cur.fetchall()}
+
+    saved_ms = counters.get("llm_cache_saved_ms", 0)
+    hits = counters.get("llm_cache_hits", 0)
+    misses = counters.get("llm_cache_misses", 0)
+    lookups = hits + misses
+    return {
+        "entries": entries,
+        "size_bytes": size_bytes,
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        "saved_seconds": round(saved_ms / 1000, 1),
+    }
+
+
+def claim_agent_flight(
+    flight_key: str,
+    owner: str,
+    stale_seconds: float,
+    result_ttl_seconds: float,
+) -> tuple[str, str | None]:
+    now = time.time()
+    with _cursor() as cur:
+        cur.execute(
+            """
+            DELETE FROM agent_flights
+            WHERE flight_key = ?
+              AND ((status = 'running' AND updated_at < ?) OR (status = 'done' AND updated_at < ?))
+            """,
+            (flight_key, now - stale_seconds, now - result_ttl_seconds),
+        )
+        cur.execute(
+            "INSERT OR IGNORE INTO agent_flights (flight_key, owner, status, updated_at) VALUES (?, ?, 'running', ?)",
+            (flight_key, owner, now),
+        )
+        if cur.rowcount == 1:
+            return "leader", None
+
+        cur.execute("SELECT status, result_json FROM agent_flights WHERE flight_key = ?", (flight_key,))
+        row = cur.fetchone()
+    if row and row[0] == "done":
+        return "done", row[1]
+    return "running", None
+
+
+def complete_agent_flight(flight_key: str, owner: str, result_json: str):
+    with _cursor() as cur:
+        cur.execute(
+            """
+            UPDATE agent_flights SET status = 'done', result_json = ?, updated_at = ?
+            WHERE flight_key = ? AND owner = ?
+            """,
+            (result_json, time.time(), flight_key, owner),
+        )
+
+
+def release_agent_flight(flight_key: str, owner: str):
+    with _cursor() as cur:
+        cur.execute("DELETE FROM agent_flights WHERE flight_key = ? AND owner = ?", (flight_key, owner))
+
+
+def claim_admission_slot(ticket: str, owner: str, priority: int, limit: int, stale_seconds: float) -> bool:
+    now = time.time()
+    with _cursor() as cur:
+        cur.execute("DELETE FROM llm_admission WHERE heartbeat_at < ?", (now - stale_seconds,))
+        cur.execute(
+            """
+            INSERT OR IGNORE INTO llm_admission (ticket, owner, priority, status, enqueued_at, heartbeat_at)
+            VALUES (?, ?, ?, 'waiting', ?, ?)
+            """,
+            (ticket, owner, priority, now, now),
+        )
+        cur.execute("SELECT status, enqueued_at FROM llm_admission WHERE ticket = ?", (ticket,))
+        status, enqueued_at = cur.fetchone()
+        if status == "running":
+            return True
+        cur.execute("SELECT COUNT(*) FROM llm_admission WHERE status = 'running'")
+        running = cur.fetchone()[0]
+        cur.execute(
+            """
+            SELECT COUNT(*) FROM llm_admission
+            WHERE status = 'waiting'
+              AND (priority < ? OR (priority = ? AND (enqueued_at < ? OR (enqueued_at = ? AND ticket < ?))))
+            """,
+            (priority, priority, enqueued_at, enqueued_at, ticket),
+        )
+        ahead = cur.fetchone()[0]
+        if running + ahead >= limit:
+            return False
+        cur.execute(
+            "UPDATE llm_admission SET status = 'running', heartbeat_at = ? WHERE ticket = ?",
+            (now, ticket),
+        )
+    return True
+
+
+def release_admission(ticket: str):
+    with _cursor() as cur:
+        cur.execute("DELETE FROM llm_admission WHERE ticket = ?", (ticket,))
+
+
+def heartbeat_admission(tickets: list[str]):
+    if not tickets:
+        return
+    with _cursor() as cur:
+        cur.executemany(
+            "UPDATE llm_admission SET heartbeat_at = ? WHERE ticket = ?",
+            [(time.time(), ticket) for ticket in tickets],
+        )
+
+
+def fetch_admission_counts(stale_seconds: float) -> dict:
+    since = time.time() - stale_seconds
+    cur = _read_cursor()
+    cur.execute(
+        """
+        SELECT status, priority, COUNT(*) FROM llm_admission
+        WHERE heartbeat_at >= ?
+        GROUP BY status, priority
+        """,
+        (since,),
+    )
+    rows = cur.fetchall()
+    cur.execute("SELECT COUNT(DISTINCT owner) FROM llm_admission WHERE heartbeat_at >= ?", (since,))
+    owners = cur.fetchone()[0]
+    return {
+        "running": sum(count for status, _, count in rows if status == "running"),
+        "waiting": {priority: count for status, priority, count in rows if status == "waiting"},
+        "owners": owners,
+    }
+
+
+def upsert_breaker_state(base_url: str, failures: int, open_until: float):
+    with _cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO llm_breakers (base_url, failures, open_until, updated_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT(base_url) DO UPDATE SET
+                failures = excluded.failures, open_until = excluded.open_until, updated_at = excluded.updated_at
+            """,
+            (base_url, failures, open_until, time.time()),
+        )
+
+
+def fetch_breaker_states(base_url: str | None = None) -> dict[str, dict]:
+    cur = _read_cursor(sqlite3.Row)
+    if base_url is None:
+        cur.execute("SELECT base_url, failures, open_until FROM llm_breakers")
+    else:
+        cur.execute("SELECT base_url, failures, open_until FROM llm_breakers WHERE base_url = ?", (base_url,))
+    return {row["base_url"]: dict(row) for row in cur.fetchall()}
+
+
+def upsert_endpoint_stats(owner: str, rows: list[tuple[str, str, str, float]], stale_seconds: float):
+    now = time.time()
+    with _cursor() as cur:
+        cur.execute("DELETE FROM llm_endpoint_stats WHERE updated_at < ?", (now - stale_seconds,))
+        cur.executemany(
+            """
+            INSERT OR REPLACE INTO llm_endpoint_stats (owner, router, url, snapshot_json, last_used, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            [(owner, router, url, snapshot_json, last_used, now) for router, url, snapshot_json, last_used in rows],
+        )
+
+
+def fetch_endpoint_stats(stale_seconds: float) -> list[dict]:
+    cur = _read_cursor(sqlite3.Row)
+    cur.execute(
+        """
+        SELECT owner, router, url, snapshot_json, last_used FROM llm_endpoint_stats
+        WHERE updated_at >= ? ORDER BY router, url, owner
+        """,
+        (time.time() - stale_seconds,),
+    )
+    return [dict(row) for row in cur.fetchall()]
+
+
+LLM_CALL_STATS_COLUMNS = (
+    "stage",
+    "model",
+    "cached",
+    "prompt_tokens",
+    "completion_tokens",
+    "prompt_eval_ms",
+    "eval_ms",
+    "load_ms",
+    "wall_ms",
+)
+
+
+def insert_llm_call_stats(analise_id: int | None, calls: list[dict]):
+    if not calls:
+        return
+    now = time.time()
+    with _cursor() as cur:
+        cur.executemany(
+            f"""
+            INSERT INTO llm_call_stats (analise_id, {", ".join(LLM_CALL_STATS_COLUMNS)}, created_at)
+            VALUES (?, {", ".join("?" for _ in LLM_CALL_STATS_COLUMNS)}, ?)
+            """,
+            [(analise_id, *(call.get(col, 0) for col in LLM_CALL_STATS_COLUMNS), now) for call in calls],
+        )
+
+
+def fetch_llm_completion_tokens(model: str, stage: str, limit: int = 200) -> list[int]:
+    cur = _read_cursor()
+    cur.execute(
+        """
+        SELECT completion_tokens FROM llm_call_stats
+        WHERE model = ? AND stage = ? AND cached = 0 AND completion_tokens > 0
+        ORDER BY id DESC LIMIT ?
+        """,
+        (model, stage, limit),
+    )
+    rows = [row[0] for row in cur.fetchall()]
+    return rows
+
+
+def fetch_llm_call_timings(model: str, stage: str, limit: int = 200) -> list[tuple[int, int, int]]:
+    cur = _read_cursor()
+    cur.execute(
+        """
+        SELECT completion_tokens, eval_ms, wall_ms FROM llm_call_stats
+        WHERE model = ? AND stage = ? AND cached = 0 AND eval_ms > 0 AND wall_ms > 0
+        ORDER BY id DESC LIMIT ?
+        """,
+        (model, stage, limit),
+    )
+    rows = [tuple(row) for row in cur.fetchall()]
+    return rows
+
+
+def fetch_llm_call_stats(limit: int = 2000, analise_id: int | None = None) -> list[dict]:
+    cur = _read_cursor(sqlite3.Row)
+    if analise_id is None:
+        cur.execute("SELECT * FROM llm_call_stats ORDER BY id DESC LIMIT ?", (limit,))
+    else:
+        cur.execute(
+            "SELECT * FROM llm_call_stats WHERE analise_id = ? ORDER BY id DESC LIMIT ?",
+            (analise_id, limit),
+        )
+    rows = [dict(row) for row in cur.fetchall()]
+    return rows
+
+
+def insert_llm_job(
+    kind: str,
+    analise_id: int | None,
+    priority: str,
+    dedupe_key: str,
+    payload_json: str,
+) -> tuple[int, bool]:
+    now = time.time()
+    with _cursor() as cur:
+        cur.execute(
+            """
+            SELECT id FROM llm_jobs
+            WHERE dedupe_key = ? AND status IN ('queued', 'running')
+            ORDER BY id DESC LIMIT 1
+            """,
+            (dedupe_key,),
+        )
+        row = cur.fetchone()
+        if row:
+            return row[0], False
+        cur.execute(
+            """
+            INSERT INTO llm_jobs (kind, analise_id, priority, dedupe_key,
+                status, payload_json, created_at, available_at)
+            VALUES (?, ?, ?, ?, 'queued', ?, ?, ?)
+            """,
+            (kind, analise_id, priority, dedupe_key, payload_json, now, now),
+        )
+        job_id = cur.lastrowid
+    return job_id, True
+
+
+def claim_llm_job(worker: str, stale_seconds: float) -> dict | None:
+    now = time.time()
+    with _cursor() as cur:
+        cur.row_factory = sqlite3.Row
+        cur.execute(
+            """
+            UPDATE llm_jobs SET status = 'queued', worker = NULL, stage = NULL, partial_text = NULL
+            WHERE status = 'running' AND heartbeat_at < ?
+            """,
+            (now - stale_seconds,),
+        )
+        cur.execute(
+            """
+            SELECT id FROM llm_jobs
+            WHERE status = 'queued' AND available_at <= ?
+            ORDER BY CASE priority WHEN 'interactive' THEN 0 ELSE 1 END, id
+            LIMIT 1
+            """,
+            (now,),
+        )
+        row = cur.fetchone()
+        if not row:
+            return None
+        cur.execute(
+            """
+            UPDATE llm_jobs
+            SET status = 'running', worker = ?, attempts = attempts + 1, started_at = ?, heartbeat_at = ?
+            WHERE id = ?
+            """,
+            (worker, now, now, row["id"]),
+        )
+        cur.execute("SELECT * FROM llm_jobs WHERE id = ?", (row["id"],))
+        job = dict(cur.fetchone())
+    return job
+
+
+def heartbeat_llm_job(job_id: int, worker: str, stage: str | None = None, partial_text: str | None = None) -> bool:
+    with _cursor() as cur:
+        cur.execute(
+            """
+            UPDATE llm_jobs SET heartbeat_at = ?, stage = COALESCE(?, stage), partial_text = COALESCE(?, partial_text)
+            WHERE id = ? AND worker = ? AND status = 'running'
+            """,
+            (time.time(), stage, partial_text, job_id, worker),
+        )
+        owned = cur.rowcount == 1
+    return owned
+
+
+def finish_llm_job(job_id: int, worker: str, status: str, result_json: str | None = None, error: str | None = None):
+    with _cursor() as cur:
+        cur.execute(
+            """
+            UPDATE llm_jobs SET status = ?, result_json = ?, error = ?, finished_at = ?, partial_text = NULL
+            WHERE id = ? AND worker = ? AND status = 'running'
+            """,
+            (status, result_json, error, time.time(), job_id, worker),
+        )
+
+
+def requeue_llm_job(job_id: int, worker: str, available_at: float, error: str):
+    with _cursor() as cur:
+        cur.execute(
+            """
+            UPDATE llm_jobs
+            SET status = 'queued', worker = NULL, stage = NULL, partial_text = NULL, error = ?, available_at = ?
+            WHERE id = ? AND worker = ? AND status = 'running'
+            """,
+            (error, available_at, job_id, worker),
+        )
+
+
+def fetch_llm_job(job_id: int) -> dict | None:
+    cur = _read_cursor(sqlite3.Row)
+    cur.execute("SELECT * FROM llm_jobs WHERE id = ?", (job_id,))
+    row = cur.fetchone()
+    return dict(row) if row else None
+
+
+def fetch_llm_jobs(
+    analise_id: int | None = None,
+    status: str | None = None,
+    limit: int = 50,
+) -> list[dict]:
+    clauses, params = [], []
+    if analise_id is not None:
+        clauses.append("analise_id = ?")
+        params.append(analise_id)
+    if status is not None:
+        clauses.append("status = ?")
+        params.append(status)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    cur = _read_cursor(sqlite3.Row)
+    cur.execute(f"SELECT * FROM llm_jobs {where} ORDER BY id DESC LIMIT ?", (*params, limit))
+    rows = [dict(row) for row in cur.fetchall()]
+    return rows
+
+
+def fetch_llm_job_counts() -> dict[str, int]:
+    cur = _read_cursor()
+    cur.execute("SELECT status, COUNT(*) FROM llm_jobs GROUP BY status")
+    counts = {status: count for status, count in cur.fetchall()}
+    return counts
+
+
+def insert_batch_run(
+    vaga_titulo: str,
+    vaga_descricao: str,
+    config_json: str,
+    save_history: bool,
+    analise_ids: list[int],
+) -> int:
+    now = time.time()
+    with _cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO batch_runs (vaga_titulo, vaga_descricao, config_json, save_history, status, created_at)
+            VALUES (?, ?, ?, ?, 'pending', ?)
+            """,
+            (vaga_titulo, vaga_descricao, config_json, int(save_history), now),
+        )
+        batch_id = cur.lastrowid
+        cur.executemany(
+            "INSERT OR IGNORE INTO batch_items (batch_id, analise_id, status, updated_at) VALUES (?, ?, 'pending', ?)",
+            [(batch_id, analise_id, now) for analise_id in analise_ids],
+        )
+    return batch_id
+
+
+def claim_batch_run(batch_id: int, owner: str, stale_seconds: float) -> bool:
+    now = time.time()
+    with _cursor() as cur:
+        cur.execute(
+            """
+            UPDATE batch_runs SET status = 'running', owner = ?, heartbeat_at = ?, error = NULL
+            WHERE id = ? AND (status != 'running' OR heartbeat_at < ? OR owner = ?)
+            """,
+            (owner, now, batch_id, now - stale_seconds, owner),
+        )
+        return cur.rowcount == 1
+
+
+def finish_batch_run(batch_id: int, owner: str, status: str, error: str | None = None):
+    with _cursor() as cur:
+        cur.execute(
+            "UPDATE batch_runs SET status = ?, heartbeat_at = ?, error = ? WHERE id = ? AND owner = ?",
+            (status, time.time(), error, batch_id, owner),
+        )
+
+
+def checkpoint_batch_item(
+    batch_id: int,
+    analise_id: int,
+    owner: str,
+    status: str,
+    result_json: str | None = None,
+    error: str | None = None,
+):
+    now = time.time()
+    with _cursor() as cur:
+        cur.execute(
+            """
+            UPDATE batch_items SET status = ?, result_json = ?, error = ?, updated_at = ?
+            WHERE batch_id = ? AND analise_id = ?
+            """,
+            (status, result_json, error, now, batch_id, analise_id),
+        )
+        cur.execute("UPDATE batch_runs SET heartbeat_at = ? WHERE id = ? AND owner = ?", (now, batch_id, owner))
+
+
+def apply_batch_items(batch_id: int, applied: list[dict]):
+    if not applied:
+        return
+    with _cursor() as cur:
+        for item in applied:
+            update_analise(item["analise_id"], STATUS_CONCLUIDA, item["final_score"], cur=cur)
+            update_analise_ai_payload(item["analise_id"], "comparison", item["payload"], cur=cur)
+            if item.get("comparacao_row"):
+                insert_comparacao(**item["comparacao_row"], cur=cur)
+        cur.executemany(
+            "UPDATE batch_items SET applied = 1 WHERE batch_id = ? AND analise_id = ?",
+            [(batch_id, item["analise_id"]) for item in applied],
+        )
+
+
+def fetch_batch_run(batch_id: int) -> dict | None:
+    cur = _read_cursor(sqlite3.Row)
+    cur.execute("SELECT * FROM batch_runs WHERE id = ?", (batch_id,))
+    row = cur.fetchone()
+    if not row:
+        return None
+    run = dict(row)
+    cur.execute(
+        "SELECT status, applied, COUNT(*) FROM batch_items WHERE batch_id = ? GROUP BY status, applied",
+        (batch_id,),
+    )
+    run["items"] = {"pending": 0, "done": 0, "failed": 0, "applied": 0}
+    for status, applied, count in cur.fetchall():
+        run["items"][status] = run["items"].get(status, 0) + count
+        if applied:
+            run["items"]["applied"] += count
+    run["total"] = sum(run["items"][key] for key in ("pending", "done", "failed"))
+    return run
+
+
+def fetch_batch_items(batch_id: int, status: str | None = None) -> list[dict]:
+    cur = _read_cursor(sqlite3.Row)
+    if status is None:
+        cur.execute("SELECT * FROM batch_items WHERE batch_id = ? ORDER BY analise_id", (batch_id,))
+    else:
+        cur.execute(
+            "SELECT * FROM batch_items WHERE batch_id = ? AND status = ? ORDER BY analise_id",
+            (batch_id, status),
+        )
+    rows = [dict(row) for row in cur.fetchall()]
+    return rows
+
+
+def fetch_batch_runs(limit: int = 20) -> list[dict]:
+    cur = _read_cursor(sqlite3.Row)
+    cur.execute("SELECT id FROM batch_runs ORDER BY id DESC LIMIT ?", (limit,))
+    ids = [row["id"] for row in cur.fetchall()]
+    return [fetch_batch_run(batch_id) for batch_id in ids]
@@ -251,6 +251,7 @@ def parse_resume_real(uploaded_name: str | None, uploaded_bytes: bytes | None):
         "educacao": education,
         "habilidades": skills,
         "certificacoes": certifications,
+        "texto": "\n".join(lines),
     }
 
 
@@ -387,6 +388,36 @@ def compare_with_job(description: str, resume_skills: list[str]):
     return {"compat": compat, "presentes": presentes, "ausentes": ausentes, "job_keywords": job_keywords}
 
 
+def resume_skills_from_area(area: str) -> list[str]:
+    area_l = (area or "").lower()
+    if "dado" in area_l:
+        return ["Python", "SQL", "Power BI", "ETL", "Excel", "Dashboard"]
+    if "market" in area_l:
+        return ["SEO", "Google Ads", "CRM", "Analytics", "Conteudo"]
+    if "vend" in area_l:
+        return ["Prospeccao", "Pipeline", "Negociacao", "CRM", "Comercial"]
+    return ["Comunicacao", "Excel", "Analise"]
+
+
+def risk_to_semantic_fit(ats_risk: str, compat: int) -> int:
+    risk_score = {"baixo": 88, "medio": 72, "alto": 55}.get((ats_risk or "").lower(), 70)
+    return int((risk_score + compat) / 2)
+
+
+def consolidate_comparison(kw_result: dict, llm_final: dict, metrics: dict, vaga_titulo: str) -> tuple[dict, int]:
+    semantic_fit = risk_to_semantic_fit(llm_final.get("ats_risk", "medio"), kw_result["compat"])
+    comparacao = {
+        **kw_result,
+        "semantic_fit": semantic_fit,
+        "lacunas": llm_final.get("weaknesses", []),
+        "recomendacoes": llm_final.get("next_actions", []),
+        "vaga_titulo": vaga_titulo or "Vaga sem título",
+    }
+    base_score = score_from_metrics(metrics)
+    final_score = int((base_score * 0.5) + (kw_result["compat"] * 0.25) + (semantic_fit * 0.25))
+    return comparacao, final_score
+
+
 def make_report_text(row, parsed, comparacao, score) -> str:
     candidato = row[1] if row else parsed.get("dados", {}).get("Nome", "Nao informado")
     area = row[2] if row else "Nao informada"
@@ -1,15 +1,23 @@
 import streamlit as st
 
-from agents.ollama_agent import OllamaConfig, run_resume_agent
-from components.llm_ui import render_rewrites
+from agents.ollama_agent import OllamaConfig
+from agents.router import DEFAULT_BASE_URL
+from agents.structured_output import SECTION_KEYS
+from components.llm_ui import (
+    job_in_progress,
+    render_job_progress,
+    render_llm_availability,
+    render_rewrites,
+    render_run_details,
+)
 from components.widgets import metric_card
 from core.db import (
     fetch_analise_ai_sections,
     fetch_analise_artifacts,
     fetch_analises,
-    update_analise_ai_section,
 )
 from core.logic import score_from_metrics, section_metrics
+from workers.queue import submit_job
 
 
 def _candidate_options():
@@ -78,14 +86,21 @@ def _render_metrics_grid(items: list[tuple]):
 def _build_config() -> OllamaConfig:
     return OllamaConfig(
         model=st.session_state.get("ollama_model", "llama3.1:8b"),
-        base_url=st.session_state.get("ollama_base_url", "http://localhost:11434"),
+        base_url=st.session_state.get("ollama_base_url", DEFAULT_BASE_URL),
         temperature=float(st.session_state.get("ollama_temperature", 0.3)),
         top_p=float(st.session_state.get("ollama_top_p", 0.9)),
         num_predict=int(st.session_state.get("ollama_num_predict", 700)),
+        planning_model=st.session_state.get("ollama_planning_model", OllamaConfig.planning_model),
+        planning_temperature=float(st.session_state.get("ollama_planning_temperature", 0.1)),
+        planning_num_predict=int(st.session_state.get("ollama_planning_num_predict", 256)),
+        planning_fallback=st.session_state.get("ollama_planning_fallback", "final_model"),
+        adaptive_num_predict=bool(st.session_state.get("ollama_adaptive_num_predict", True)),
+        digest_with_llm=bool(st.session_state.get("ollama_digest_with_llm", False)),
+        use_cache=bool(st.session_state.get("ollama_use_cache", True)),
     )
 
 
-def _run_llm(selected: dict, job_description: str) -> dict:
+def _agent_kwargs(selected: dict, job_description: str) -> dict:
     parsed_map = st.session_state.get("parsed_by_analysis", {})
     metrics_map = st.session_state.get("metrics_by_analysis", {})
     parsed = parsed_map.get(selected["id"])
@@ -101,34 +116,32 @@ def _run_llm(selected: dict, job_description: str) -> dict:
     parsed = parsed or st.session_state.get("parsed", {})
     skills = parsed.get("habilidades", [])
     metrics = metrics or section_metrics(parsed)
-    return run_resume_agent(
-        candidate_name=selected["candidato"],
-        area=selected["area"],
-        resume_skills=skills,
-        section_metrics=metrics,
-        job_title="Vaga alvo",
-        job_description=job_description,
-        config=_build_config(),
-    )
+    return {
+        "candidate_name": selected["candidato"],
+        "area": selected["area"],
+        "resume_skills": skills,
+        "section_metrics": metrics,
+        "job_title": "Vaga alvo",
+        "job_description": job_description,
+    }
 
 
-def _render_ai_block(section_key: str, selected: dict):
-    st.markdown("---")
-    st.markdown("### Otimização Inteligente")
-    st.caption("Reescrita e recomendações geradas por LLM para esta seção.")
+def _saved_job_description(saved_sections: dict) -> str:
+    slots = [slot for slot in saved_sections.values() if isinstance(slot, dict)]
+    latest = max(slots, key=lambda slot: slot.get("updated_at") or "", default={})
+    return latest.get("job_description", "")
 
-    input_key = f"analysis_job_desc_{selected['id']}_{section_key}"
-    result_key = f"analysis_llm_result_{selected['id']}_{section_key}"
 
-    saved_sections = fetch_analise_ai_sections(selected["id"])
-    saved_section = saved_sections.get(section_key, {}) if isinstance(saved_sections, dict) else {}
-    saved_result = saved_section.get("result")
-    saved_job_desc = saved_section.get("job_description", "")
+def _render_ai_controls(selected: dict, saved_sections: dict) -> str:
+    st.markdown("### Otimização Inteligente")
+    st.caption("Uma única geração preenche a reescrita das três seções para a vaga informada.")
+
+    input_key = f"analysis_job_desc_{selected['id']}"
+    job_key = f"analysis_job_{selected['id']}"
 
+    saved_job_desc = _saved_job_description(saved_sections)
     if saved_job_desc and input_key not in st.session_state:
         st.session_state[input_key] = saved_job_desc
-    if saved_result and result_key not in st.session_state:
-        st.session_state[result_key] = saved_result
 
     job_desc = st.text_area(
         "Descrição da vaga para orientar a reescrita",
@@ -136,40 +149,51 @@ def _render_ai_block(section_key: str, selected: dict):
         placeholder="Cole aqui a descrição da vaga para gerar recomendações reais.",
     )
 
-    if st.button("Gerar recomendações da seção", key=f"analysis_btn_{selected['id']}_{section_key}", type="primary"):
+    llm_blocked = render_llm_availability(_build_config().base_url)
+    if st.button(
+        "Gerar recomendações das seções",
+        key=f"analysis_btn_{selected['id']}",
+        type="primary",
+        disabled=llm_blocked or job_in_progress(job_key),
+    ):
         if not job_desc.strip():
             st.warning("Cole a descrição da vaga para executar a IA.")
         else:
-            try:
-                with st.spinner("Pensando..."):
-                    llm_result = _run_llm(selected, job_desc)
-                    st.session_state[result_key] = llm_result
-                    update_analise_ai_section(
-                        analise_id=selected["id"],
-                        section_key=section_key,
-                        llm_result=llm_result,
-                        job_description=job_desc,
-                    )
-            except Exception as exc:
-                st.error(f"Falha na execução com Ollama: {exc}")
-
-    result = st.session_state.get(result_key)
+            job = submit_job(
+                "section",
+                agent_kwargs={**_agent_kwargs(selected, job_desc), "sections": list(SECTION_KEYS)},
+                config=_build_config(),
+                analise_id=selected["id"],
+                target={"section_keys": list(SECTION_KEYS)},
+            )
+            st.session_state[job_key] = job.id
+
+    render_job_progress(job_key)
+    return job_desc
+
+
+def _render_ai_block(section_key: str, saved_sections: dict, job_desc: str):
+    st.markdown("---")
+    st.caption("Reescrita e recomendações geradas por LLM para esta seção.")
+
+    saved_section = saved_sections.get(section_key) or {}
+    result = saved_section.get("result")
     if not result:
+        st.info("Informe a descrição da vaga acima e gere as recomendações das seções.")
+        return
+    if saved_section.get("job_description", "").strip() != job_desc.strip():
+        st.warning("A descrição da vaga mudou desde a última geração. Gere novamente para atualizar esta seção.")
         return
 
     final = result.get("final", {})
     rewrites = final.get("section_rewrites", {})
-    section_label = {
-        "estrutura": "estrutura",
-        "experiencia": "experiencia",
-        "habilidades": "habilidades",
-    }[section_key]
 
     st.markdown("**Resumo**")
     st.write(final.get("summary", "N/A"))
 
     st.markdown("**Reescrita sugerida para esta seção**")
-    render_rewrites(rewrites, [("Reescrita", section_label)])
+    render_rewrites(rewrites, [("Reescrita", section_key)])
+    render_run_details(result)
 
     updated_at = saved_section.get("updated_at")
     if updated_at:
@@ -227,17 +251,19 @@ def render():
     consolidated_score = score_from_metrics(metrics)
 
     _render_context_header(selected, consolidated_score)
+    saved_sections = fetch_analise_ai_sections(selected["id"])
+    job_desc = _render_ai_controls(selected, saved_sections)
 
     tabs = st.tabs(["Estrutura", "Experiência", "Habilidades"])
 
     with tabs[0]:
         _render_metrics_grid(metrics["estrutura"])
-        _render_ai_block("estrutura", selected)
+        _render_ai_block("estrutura", saved_sections, job_desc)
 
     with tabs[1]:
         _render_metrics_grid(metrics["experiencia"])
-        _render_ai_block("experiencia", selected)
+        _render_ai_block("experiencia", saved_sections, job_desc)
 
     with tabs[2]:
         _render_metrics_grid(metrics["habilidades"])
-        _render_ai_block("habilidades", selected)
+        _render_ai_block("habilidades", saved_sections, job_desc)
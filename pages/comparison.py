@@ -1,18 +1,27 @@
 import streamlit as st
 
-from agents.ollama_agent import OllamaConfig, run_resume_agent
-from components.llm_ui import render_rewrites, stringify_value
-from core.constants import STATUS_CONCLUIDA
+from agents.llm_cache import CACHE_MAX_TEMPERATURE
+from agents.ollama_agent import PLANNING_FALLBACKS, OllamaConfig
+from agents.resilience import breaker_state
+from agents.router import DEFAULT_BASE_URL, parse_endpoints
+from components.llm_ui import (
+    job_in_progress,
+    render_job_progress,
+    render_llm_availability,
+    render_rewrites,
+    render_run_details,
+    stringify_value,
+)
 from core.db import (
     fetch_analise_ai_payload,
     fetch_analise_artifacts,
     fetch_analises,
     fetch_comparacoes_by_analise,
-    insert_comparacao,
-    update_analise,
-    update_analise_ai_payload,
 )
-from core.logic import compare_with_job, score_from_metrics, section_metrics
+from core.logic import resume_skills_from_area, section_metrics
+from workers.queue import submit_job
+
+COMPARISON_DEADLINE_SECONDS = 15
 
 DEFAULT_VAGAS = [
     {"titulo": "Analista de Dados Pleno", "descricao": "Python SQL ETL Dashboard Power BI Analise de dados Comunicacao"},
@@ -40,22 +49,6 @@ def _ensure_vagas_state():
     st.session_state["vagas_cadastradas"] = normalized
 
 
-def _resume_skills_from_area(area: str):
-    area_l = (area or "").lower()
-    if "dado" in area_l:
-        return ["Python", "SQL", "Power BI", "ETL", "Excel", "Dashboard"]
-    if "market" in area_l:
-        return ["SEO", "Google Ads", "CRM", "Analytics", "Conteudo"]
-    if "vend" in area_l:
-        return ["Prospeccao", "Pipeline", "Negociacao", "CRM", "Comercial"]
-    return ["Comunicacao", "Excel", "Analise"]
-
-
-def _risk_to_semantic_fit(ats_risk: str, compat: int) -> int:
-    risk_score = {"baixo": 88, "medio": 72, "alto": 55}.get((ats_risk or "").lower(), 70)
-    return int((risk_score + compat) / 2)
-
-
 def _load_artifacts(analise_id: int):
     parsed_map = st.session_state.get("parsed_by_analysis", {})
     metrics_map = st.session_state.get("metrics_by_analysis", {})
@@ -74,6 +67,18 @@ def _load_artifacts(analise_id: int):
     return parsed, metrics
 
 
+def _agent_kwargs(selected: dict, vaga_titulo: str, vaga_descricao: str) -> dict:
+    parsed, metrics = _load_artifacts(selected["id"])
+    return {
+        "candidate_name": selected["candidato"],
+        "area": selected["area"],
+        "resume_skills": parsed.get("habilidades") or resume_skills_from_area(selected["area"]),
+        "section_metrics": metrics,
+        "job_title": vaga_titulo or "Vaga sem título",
+        "job_description": vaga_descricao,
+    }
+
+
 def _render_llm_panel(selected: dict, vaga_titulo: str, vaga_descricao: str):
     st.markdown("---")
     st.markdown("### IA Generativa para Comparação")
@@ -86,49 +91,108 @@ def _render_llm_panel(selected: dict, vaga_titulo: str, vaga_descricao: str):
 
     with st.expander("Configuração do modelo", expanded=False):
         model = st.text_input("Modelo Ollama", value=st.session_state.get("ollama_model", "llama3.1:8b"))
-        base_url = st.text_input("Base URL", value=st.session_state.get("ollama_base_url", "http://localhost:11434"))
+        base_url = st.text_input(
+            "Base URL",
+            value=st.session_state.get("ollama_base_url", DEFAULT_BASE_URL),
+            help="Para distribuir a carga entre vários servidores Ollama, separe os endereços por vírgula.",
+        )
+        try:
+            base_url = ",".join(parse_endpoints(base_url))
+        except ValueError as exc:
+            st.error(str(exc))
+            base_url = st.session_state.get("ollama_base_url", DEFAULT_BASE_URL)
         temperature = st.slider("Temperature", min_value=0.0, max_value=1.0, value=0.3, step=0.1)
         top_p = st.slider("Top-p", min_value=0.1, max_value=1.0, value=0.9, step=0.1)
         num_predict = st.number_input("Max tokens (num_predict)", min_value=100, max_value=4000, value=700)
+        deadline_seconds = st.number_input(
+            "Prazo da análise (s)",
+            min_value=0,
+            max_value=600,
+            value=int(st.session_state.get("ollama_deadline_seconds", COMPARISON_DEADLINE_SECONDS)),
+            help="Sem tempo, pula o planejamento, encurta a resposta ou usa só as tools. 0 desliga.",
+        )
+        st.markdown("**Planejamento (escolha das tools)**")
+        planning_model = st.text_input(
+            "Modelo do planejamento",
+            value=st.session_state.get("ollama_planning_model", OllamaConfig.planning_model),
+            help="Um modelo menor e mais rápido basta para escolher as tools. Vazio usa o modelo acima.",
+        )
+        planning_temperature = st.slider(
+            "Temperature do planejamento", min_value=0.0, max_value=1.0, value=0.1, step=0.1
+        )
+        planning_num_predict = st.number_input(
+            "Max tokens do planejamento", min_value=64, max_value=2000, value=256
+        )
+        fallback_options = list(PLANNING_FALLBACKS)
+        planning_fallback = st.selectbox(
+            "Se o modelo do planejamento falhar",
+            options=fallback_options,
+            index=fallback_options.index(st.session_state.get("ollama_planning_fallback", "final_model")),
+            format_func=PLANNING_FALLBACKS.get,
+        )
+        adaptive_num_predict = st.checkbox(
+            "Ajustar max tokens pelo histórico",
+            value=st.session_state.get("ollama_adaptive_num_predict", True),
+            help="Usa o p95 do tamanho das respostas anteriores de cada etapa, sem passar dos limites acima.",
+        )
+        digest_with_llm = st.checkbox(
+            "Extrair requisitos de vagas longas com o modelo do planejamento",
+            value=st.session_state.get("ollama_digest_with_llm", False),
+            help="Vagas longas já são resumidas por trecho sem LLM; isto soma uma chamada curta por trecho.",
+        )
+        use_cache = st.checkbox(
+            "Reutilizar respostas em cache",
+            value=st.session_state.get("ollama_use_cache", True),
+            help=f"Ignorado quando a temperature passa de {CACHE_MAX_TEMPERATURE}.",
+        )
         st.session_state["ollama_temperature"] = float(temperature)
         st.session_state["ollama_top_p"] = float(top_p)
         st.session_state["ollama_num_predict"] = int(num_predict)
+        st.session_state["ollama_planning_model"] = planning_model.strip()
+        st.session_state["ollama_planning_temperature"] = float(planning_temperature)
+        st.session_state["ollama_planning_num_predict"] = int(planning_num_predict)
+        st.session_state["ollama_planning_fallback"] = planning_fallback
+        st.session_state["ollama_adaptive_num_predict"] = bool(adaptive_num_predict)
+        st.session_state["ollama_digest_with_llm"] = bool(digest_with_llm)
+        st.session_state["ollama_deadline_seconds"] = int(deadline_seconds)
+        st.session_state["ollama_use_cache"] = bool(use_cache)
 
-    if st.button("Gerar análise", type="primary", key=f"comparison_llm_btn_{selected['id']}"):
+    job_key = f"comparison_llm_job_{selected['id']}"
+    llm_blocked = breaker_state(base_url)["state"] == "open" or job_in_progress(job_key)
+    if st.button("Gerar análise", type="primary", key=f"comparison_llm_btn_{selected['id']}", disabled=llm_blocked):
         if not vaga_descricao.strip():
             st.warning("Forneça descrição da vaga para rodar a análise.")
             return
 
-        parsed, metrics = _load_artifacts(selected["id"])
-        resume_skills = parsed.get("habilidades") or _resume_skills_from_area(selected["area"])
         config = OllamaConfig(
             model=model.strip(),
             base_url=base_url.strip(),
             temperature=float(temperature),
             top_p=float(top_p),
             num_predict=int(num_predict),
+            planning_model=planning_model.strip(),
+            planning_temperature=float(planning_temperature),
+            planning_num_predict=int(planning_num_predict),
+            planning_fallback=planning_fallback,
+            adaptive_num_predict=bool(adaptive_num_predict),
+            digest_with_llm=bool(digest_with_llm),
+            deadline_seconds=float(deadline_seconds),
+            use_cache=bool(use_cache),
+        )
+        job = submit_job(
+            "comparison_llm",
+            agent_kwargs=_agent_kwargs(selected, vaga_titulo, vaga_descricao),
+            config=config,
+            analise_id=selected["id"],
+            target={"vaga_titulo": vaga_titulo},
         )
-        with st.spinner("Pensando..."):
-            try:
-                result = run_resume_agent(
-                    candidate_name=selected["candidato"],
-                    area=selected["area"],
-                    resume_skills=resume_skills,
-                    section_metrics=metrics,
-                    job_title=vaga_titulo or "Vaga sem título",
-                    job_description=vaga_descricao,
-                    config=config,
-                )
-                st.session_state[f"comparison_llm_{selected['id']}"] = result
-                update_analise_ai_payload(
-                    selected["id"],
-                    "comparison",
-                    {"llm_result": result, "vaga_titulo": vaga_titulo, "vaga_descricao": vaga_descricao},
-                )
-                st.session_state["ollama_model"] = model.strip()
-                st.session_state["ollama_base_url"] = base_url.strip()
-            except Exception as exc:
-                st.error(f"Erro na execução com Ollama: {exc}")
+        st.session_state[job_key] = job.id
+        st.session_state["ollama_model"] = model.strip()
+        st.session_state["ollama_base_url"] = base_url.strip()
+
+    finished = render_job_progress(job_key)
+    if finished is not None:
+        st.session_state[f"comparison_llm_{selected['id']}"] = finished.result["llm_result"]
 
     result = st.session_state.get(f"comparison_llm_{selected['id']}")
     if not result:
@@ -147,6 +211,7 @@ def _render_llm_panel(selected: dict, vaga_titulo: str, vaga_descricao: str):
         st.write("\n".join(f"- {stringify_value(x)}" for x in final.get("weaknesses", [])) or "-")
     st.markdown("**Sugestões de reescrita por seção**")
     render_rewrites(final.get("section_rewrites", {}), [("Estrutura", "estrutura"), ("Experiência", "experiencia"), ("Habilidades", "habilidades")])
+    render_run_details(result)
 
 
 def render():
@@ -187,71 +252,47 @@ def render():
         vaga_descricao = st.text_area("Descrição da vaga", height=160)
 
     salvar_resultado = st.checkbox("Salvar resultado no histórico", value=True)
-    if st.button("Executar comparação", type="primary", key=f"comparison_run_{selected['id']}"):
+    job_key = f"comparison_job_{selected['id']}"
+    llm_blocked = render_llm_availability(st.session_state.get("ollama_base_url", DEFAULT_BASE_URL))
+    if st.button(
+        "Executar comparação",
+        type="primary",
+        key=f"comparison_run_{selected['id']}",
+        disabled=llm_blocked or job_in_progress(job_key),
+    ):
         if not vaga_descricao.strip():
             st.warning("Forneça descrição da vaga para executar a comparação.")
         else:
-            parsed, metrics = _load_artifacts(selected["id"])
-            resume_skills = parsed.get("habilidades") or _resume_skills_from_area(selected["area"])
-            resultado = compare_with_job(vaga_descricao, resume_skills)
-            try:
-                llm_data = run_resume_agent(
-                    candidate_name=selected["candidato"],
-                    area=selected["area"],
-                    resume_skills=resume_skills,
-                    section_metrics=metrics,
-                        job_title=vaga_titulo or "Vaga sem título",
-                    job_description=vaga_descricao,
-                    config=OllamaConfig(
-                        model=st.session_state.get("ollama_model", "llama3.1:8b"),
-                        base_url=st.session_state.get("ollama_base_url", "http://localhost:11434"),
-                        temperature=float(st.session_state.get("ollama_temperature", 0.3)),
-                        top_p=float(st.session_state.get("ollama_top_p", 0.9)),
-                        num_predict=int(st.session_state.get("ollama_num_predict", 700)),
-                    ),
-                )
-            except Exception as exc:
-                st.error(f"Ollama indisponível. {exc}")
-                return
-
-            final = llm_data.get("final", {})
-            semantic_fit = _risk_to_semantic_fit(final.get("ats_risk", "medio"), resultado["compat"])
-            comparacao = {
-                **resultado,
-                "semantic_fit": semantic_fit,
-                "lacunas": final.get("weaknesses", []),
-                "recomendacoes": final.get("next_actions", []),
-                "vaga_titulo": vaga_titulo or "Vaga sem título",
-            }
-            base_score = score_from_metrics(metrics)
-            final_score = int((base_score * 0.5) + (resultado["compat"] * 0.25) + (semantic_fit * 0.25))
-            st.session_state[f"comparacao_{selected['id']}"] = comparacao
-            st.session_state[f"final_score_{selected['id']}"] = final_score
-            st.session_state[f"comparison_llm_{selected['id']}"] = llm_data
-            update_analise(selected["id"], STATUS_CONCLUIDA, final_score)
-            update_analise_ai_payload(
-                selected["id"],
+            job = submit_job(
                 "comparison",
-                {
-                    "comparacao": comparacao,
-                    "final_score": final_score,
-                    "llm_result": llm_data,
-                    "vaga_titulo": vaga_titulo,
-                    "vaga_descricao": vaga_descricao,
-                },
+                agent_kwargs=_agent_kwargs(selected, vaga_titulo, vaga_descricao),
+                config=OllamaConfig(
+                    model=st.session_state.get("ollama_model", "llama3.1:8b"),
+                    base_url=st.session_state.get("ollama_base_url", DEFAULT_BASE_URL),
+                    temperature=float(st.session_state.get("ollama_temperature", 0.3)),
+                    top_p=float(st.session_state.get("ollama_top_p", 0.9)),
+                    num_predict=int(st.session_state.get("ollama_num_predict", 700)),
+                    planning_model=st.session_state.get("ollama_planning_model", OllamaConfig.planning_model),
+                    planning_temperature=float(st.session_state.get("ollama_planning_temperature", 0.1)),
+                    planning_num_predict=int(st.session_state.get("ollama_planning_num_predict", 256)),
+                    planning_fallback=st.session_state.get("ollama_planning_fallback", "final_model"),
+                    adaptive_num_predict=bool(st.session_state.get("ollama_adaptive_num_predict", True)),
+                    digest_with_llm=bool(st.session_state.get("ollama_digest_with_llm", False)),
+                    deadline_seconds=float(
+                        st.session_state.get("ollama_deadline_seconds", COMPARISON_DEADLINE_SECONDS)
+                    ),
+                    use_cache=bool(st.session_state.get("ollama_use_cache", True)),
+                ),
+                analise_id=selected["id"],
+                target={"vaga_titulo": vaga_titulo, "save_history": salvar_resultado},
             )
-            if salvar_resultado:
-                insert_comparacao(
-                    analise_id=selected["id"],
-                    vaga_titulo=vaga_titulo or "Vaga sem título",
-                    vaga_descricao=vaga_descricao,
-                    compat=resultado["compat"],
-                    semantic_fit=semantic_fit,
-                    presentes=resultado["presentes"],
-                    ausentes=resultado["ausentes"],
-                    lacunas=final.get("weaknesses", []),
-                    recomendacoes=final.get("next_actions", []),
-                )
+            st.session_state[job_key] = job.id
+
+    finished = render_job_progress(job_key)
+    if finished is not None:
+        st.session_state[f"comparacao_{selected['id']}"] = finished.result["comparacao"]
+        st.session_state[f"final_score_{selected['id']}"] = finished.result["final_score"]
+        st.session_state[f"comparison_llm_{selected['id']}"] = finished.result["llm_result"]
 
     resultado = st.session_state.get(f"comparacao_{selected['id']}")
     if resultado:
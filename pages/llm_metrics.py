@@ -0,0 +1,143 @@
+import streamlit as st
+
+from agents.llm_cache import cache_stats
+from agents.router import shared_routers_snapshot
+from agents.usage import COLD_LOAD_THRESHOLD_MS, SUMMARY_WINDOW, usage_summary
+from agents.warmup import warmup_snapshot
+from workers.queue import JOB_STATUS_LABELS, queue_snapshot
+
+STAGE_LABELS = {"planning": "Planejamento", "final": "Síntese final", "batch": "Síntese em lote"}
+
+
+def _render_overall(overall: dict):
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Chamadas", overall["calls"], help=f"{overall['cached_calls']} respondidas pelo cache")
+    c2.metric("Geração (tokens/s)", overall["completion_tokens_per_s"])
+    c3.metric("Latência p50 / p95", f"{overall['p50_ms']} / {overall['p95_ms']} ms")
+    c4.metric(
+        "Cargas a frio",
+        overall["cold_loads"],
+        delta=f"{overall['cold_load_rate'] * 100:.1f}% das chamadas",
+        delta_color="off",
+        help=f"Chamadas em que o Ollama levou {COLD_LOAD_THRESHOLD_MS} ms ou mais para carregar o modelo.",
+    )
+
+
+def _render_by_stage(groups: list[dict]):
+    st.markdown("#### Por modelo e etapa")
+    st.dataframe(
+        [
+            {
+                "Modelo": group["model"],
+                "Etapa": STAGE_LABELS.get(group["stage"], group["stage"]),
+                "Chamadas": group["calls"],
+                "Cache": group["cached_calls"],
+                "Tokens prompt": group["prompt_tokens"],
+                "Tokens gerados": group["completion_tokens"],
+                "Prompt tokens/s": group["prompt_tokens_per_s"],
+                "Geração tokens/s": group["completion_tokens_per_s"],
+                "Cargas a frio": group["cold_loads"],
+                "p50 (ms)": group["p50_ms"],
+                "p95 (ms)": group["p95_ms"],
+            }
+            for group in groups
+        ],
+        use_container_width=True,
+        hide_index=True,
+    )
+
+
+def _render_cache():
+    stats = cache_stats()
+    st.markdown("#### Cache de respostas")
+    c1, c2, c3 = st.columns(3)
+    c1.metric("Entradas", stats["entries"])
+    c2.metric("Taxa de acerto", f"{stats['hit_rate'] * 100:.0f}%")
+    c3.metric("Tempo economizado", f"{stats['saved_seconds']} s")
+
+
+def _render_jobs():
+    counts = queue_snapshot()
+    st.markdown("#### Fila de jobs")
+    for col, (status, label) in zip(st.columns(len(JOB_STATUS_LABELS)), JOB_STATUS_LABELS.items()):
+        col.metric(label, counts[status])
+
+
+def _render_endpoints():
+    snapshot = shared_routers_snapshot()
+    if not snapshot:
+        return
+    st.markdown("#### Servidores Ollama")
+    st.caption(
+        "Limite de chamadas simultâneas ajustado por servidor: cresce enquanto a latência até o primeiro token "
+        "se mantém e cai quando ela dispara ou o servidor falha. Os números somam todos os processos ativos."
+    )
+    st.dataframe(
+        [
+            {
+                "Endereço": endpoint["url"],
+                "Disponível": "Sim" if endpoint["healthy"] else f"Não ({endpoint['ejected_for_seconds']} s)",
+                "Em andamento": endpoint["outstanding"],
+                "Limite": endpoint["limit"],
+                "Chamadas/min": endpoint["calls_per_minute"],
+                "Geração tokens/s": endpoint["tokens_per_second"],
+                "Latência base por etapa (ms)": ", ".join(
+                    f"{stage}: {ms}" for stage, ms in endpoint["baseline_latency_ms"].items()
+                ),
+                "Falhas seguidas": endpoint["failures"],
+                "Processos": endpoint["processes"],
+                "Modelos": ", ".join(endpoint["models"] or []),
+                "Último erro": endpoint["last_error"] or "",
+            }
+            for endpoints in snapshot.values()
+            for endpoint in endpoints
+        ],
+        use_container_width=True,
+        hide_index=True,
+    )
+
+
+def _render_warmup():
+    snapshot = warmup_snapshot()
+    if not snapshot["enabled"]:
+        return
+    st.markdown("#### Pré-carregamento de modelos")
+    window = "dentro" if snapshot["business_hours"] else "fora"
+    st.caption(
+        f"{snapshot['pings']} pings de aquecimento ({window} do horário comercial); "
+        f"{snapshot['cold_ping_rate'] * 100:.0f}% encontraram o modelo descarregado."
+    )
+    st.dataframe(
+        [
+            {
+                "Endereço": target["endpoint"],
+                "Modelo": target["model"],
+                "keep_alive": target["keep_alive"],
+                "Último ping": "Pendente"
+                if target["last"] is None
+                else ("OK" if target["last"]["ok"] else f"Falhou: {target['last']['error']}"),
+                "Carga (ms)": (target["last"] or {}).get("load_ms"),
+            }
+            for target in snapshot["targets"]
+        ],
+        use_container_width=True,
+        hide_index=True,
+    )
+
+
+def render():
+    st.subheader("Métricas do LLM")
+    st.caption(f"Tokens e latência das últimas {SUMMARY_WINDOW} chamadas ao Ollama.")
+
+    analise_filter = st.number_input("Filtrar por análise (0 = todas)", min_value=0, step=1, value=0)
+    summary = usage_summary(analise_id=int(analise_filter) or None)
+    if not summary["window"]:
+        st.info("Nenhuma chamada ao Ollama registrada ainda.")
+    else:
+        _render_overall(summary["overall"])
+        _render_by_stage(summary["by_stage"])
+
+    _render_jobs()
+    _render_cache()
+    _render_endpoints()
+    _render_warmup()
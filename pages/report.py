@@ -1,15 +1,23 @@
 import streamlit as st
 
-from agents.ollama_agent import OllamaConfig, run_resume_agent
-from components.llm_ui import render_rewrites, stringify_value
+from agents.ollama_agent import OllamaConfig
+from agents.router import DEFAULT_BASE_URL
+from components.llm_ui import (
+    job_in_progress,
+    render_job_progress,
+    render_llm_availability,
+    render_rewrites,
+    render_run_details,
+    stringify_value,
+)
 from core.db import (
     fetch_analise_ai_payload,
     fetch_analise_artifacts,
     fetch_analise_by_id,
     fetch_analises,
-    update_analise_ai_payload,
 )
 from core.logic import score_from_metrics, section_metrics
+from workers.queue import submit_job
 
 
 def _score_classification(score: int) -> tuple[str, str]:
@@ -74,10 +82,17 @@ def _render_section_panel(metrics: dict):
 def _build_config() -> OllamaConfig:
     return OllamaConfig(
         model=st.session_state.get("ollama_model", "llama3.1:8b"),
-        base_url=st.session_state.get("ollama_base_url", "http://localhost:11434"),
+        base_url=st.session_state.get("ollama_base_url", DEFAULT_BASE_URL),
         temperature=float(st.session_state.get("ollama_temperature", 0.3)),
         top_p=float(st.session_state.get("ollama_top_p", 0.9)),
         num_predict=int(st.session_state.get("ollama_num_predict", 700)),
+        planning_model=st.session_state.get("ollama_planning_model", OllamaConfig.planning_model),
+        planning_temperature=float(st.session_state.get("ollama_planning_temperature", 0.1)),
+        planning_num_predict=int(st.session_state.get("ollama_planning_num_predict", 256)),
+        planning_fallback=st.session_state.get("ollama_planning_fallback", "final_model"),
+        adaptive_num_predict=bool(st.session_state.get("ollama_adaptive_num_predict", True)),
+        digest_with_llm=bool(st.session_state.get("ollama_digest_with_llm", False)),
+        use_cache=bool(st.session_state.get("ollama_use_cache", True)),
     )
 
 
@@ -91,6 +106,7 @@ def _render_ai_block(selected: dict, metrics: dict, parsed: dict):
 
     text_key = f"report_job_desc_{selected['id']}"
     result_key = f"report_llm_result_{selected['id']}"
+    job_key = f"report_job_{selected['id']}"
     if saved_desc and text_key not in st.session_state:
         st.session_state[text_key] = saved_desc
     if saved_result and result_key not in st.session_state:
@@ -102,30 +118,34 @@ def _render_ai_block(selected: dict, metrics: dict, parsed: dict):
         placeholder="Cole aqui a descrição da vaga para gerar recomendações reais.",
     )
 
-    if st.button("Gerar recomendações", type="primary", key=f"report_btn_{selected['id']}"):
+    llm_blocked = render_llm_availability(_build_config().base_url)
+    if st.button(
+        "Gerar recomendações",
+        type="primary",
+        key=f"report_btn_{selected['id']}",
+        disabled=llm_blocked or job_in_progress(job_key),
+    ):
         if not job_desc.strip():
             st.warning("Cole a descrição da vaga para executar a IA.")
         else:
-            skills = parsed.get("habilidades", [])
-            try:
-                with st.spinner("Pensando..."):
-                    llm_result = run_resume_agent(
-                        candidate_name=selected["candidato"],
-                        area=selected["area"],
-                        resume_skills=skills,
-                        section_metrics=metrics,
-                        job_title="Vaga alvo",
-                        job_description=job_desc,
-                        config=_build_config(),
-                    )
-                    st.session_state[result_key] = llm_result
-                    update_analise_ai_payload(
-                        selected["id"],
-                        "report",
-                        {"llm_result": llm_result, "job_description": job_desc},
-                    )
-            except Exception as exc:
-                st.error(f"Erro na execução com Ollama: {exc}")
+            job = submit_job(
+                "report",
+                agent_kwargs={
+                    "candidate_name": selected["candidato"],
+                    "area": selected["area"],
+                    "resume_skills": parsed.get("habilidades", []),
+                    "section_metrics": metrics,
+                    "job_title": "Vaga alvo",
+                    "job_description": job_desc,
+                },
+                config=_build_config(),
+                analise_id=selected["id"],
+            )
+            st.session_state[job_key] = job.id
+
+    finished = render_job_progress(job_key)
+    if finished is not None:
+        st.session_state[result_key] = finished.result["llm_result"]
 
     llm_result = st.session_state.get(result_key)
     if not llm_result:
@@ -148,6 +168,7 @@ def _render_ai_block(selected: dict, metrics: dict, parsed: dict):
         final.get("section_rewrites", {}),
         [("Estrutura", "estrutura"), ("Experiência", "experiencia"), ("Habilidades", "habilidades")],
     )
+    render_run_details(llm_result)
 
 
 def render():
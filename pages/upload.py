@@ -1,5 +1,6 @@
 import streamlit as st
 
+from agents.resume_index import index_resume
 from core.constants import STATUS_EM_ANALISE
 from core.db import insert_analise, update_analise_artifacts
 from core.logic import parse_resume_real, score_from_metrics, section_metrics
@@ -42,6 +43,7 @@ def render():
                 parsed_data=parsed,
                 metrics_data=metrics,
             )
+            index_resume(analise_id, parsed.get("texto", ""))
             st.session_state["parsed"] = parsed
             st.session_state["parsed_source_sig"] = current_sig
             st.session_state["section_metrics"] = metrics
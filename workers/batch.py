@@ -0,0 +1,312 @@
+"""Resumable batch of agent comparisons for many candidates against one vacancy."""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import socket
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import asdict, replace
+from typing import Any, Callable
+
+from agents.batch_synthesis import BACKEND_ERRORS, BATCH_MAX_CANDIDATES, run_batched_synthesis
+from agents.ollama_agent import OllamaConfig, run_resume_agent
+from core.db import (
+    apply_batch_items,
+    checkpoint_batch_item,
+    claim_batch_run,
+    fetch_analise_artifacts,
+    fetch_analise_by_id,
+    fetch_analises,
+    fetch_batch_items,
+    fetch_batch_run,
+    finish_batch_run,
+    init_db,
+    insert_batch_run,
+)
+from core.logic import compare_with_job, consolidate_comparison, resume_skills_from_area, section_metrics
+
+BATCH_CONCURRENCY = int(os.getenv("LLM_BATCH_CONCURRENCY", "4"))
+BATCH_APPLY_SIZE = 20
+BATCH_STALE_SECONDS = 300
+
+
+def create_batch(
+    analise_ids: list[int],
+    vaga_titulo: str,
+    vaga_descricao: str,
+    config: OllamaConfig,
+    save_history: bool = True,
+) -> int:
+    if not analise_ids:
+        raise ValueError("Informe ao menos uma análise para o lote.")
+    if not vaga_descricao.strip():
+        raise ValueError("Forneça a descrição da vaga para o lote.")
+    config = replace(config, priority="batch")
+    return insert_batch_run(
+        vaga_titulo,
+        vaga_descricao,
+        json.dumps(asdict(config)),
+        save_history,
+        list(dict.fromkeys(analise_ids)),
+    )
+
+
+def top_analise_ids(limit: int) -> list[int]:
+    rows = sorted(fetch_analises(), key=lambda r: r[4], reverse=True)
+    return [r[0] for r in rows[:limit]]
+
+
+def _candidate_inputs(analise_id: int) -> dict[str, Any]:
+    row = fetch_analise_by_id(analise_id)
+    if not row:
+        raise ValueError(f"Análise {analise_id} não encontrada.")
+    parsed, metrics = fetch_analise_artifacts(analise_id)
+    return {
+        "analise_id": analise_id,
+        "candidate_name": row[1],
+        "area": row[2],
+        "resume_skills": (parsed or {}).get("habilidades") or resume_skills_from_area(row[2]),
+        "section_metrics": metrics or section_metrics(parsed or None),
+    }
+
+
+def _comparison(inputs: dict[str, Any], vaga_titulo: str, vaga_descricao: str, llm_result: dict) -> dict[str, Any]:
+    resultado = compare_with_job(vaga_descricao, inputs["resume_skills"])
+    comparacao, final_score = consolidate_comparison(
+        resultado, llm_result.get("final", {}), inputs["section_metrics"], vaga_titulo
+    )
+    return {"comparacao": comparacao, "final_score": final_score, "llm_result": llm_result}
+
+
+def _single_run(inputs: dict[str, Any], vaga_titulo: str, vaga_descricao: str, config: OllamaConfig) -> dict:
+    return run_resume_agent(
+        **inputs,
+        job_title=vaga_titulo or "Vaga sem título",
+        job_description=vaga_descricao,
+        config=config,
+    )
+
+
+def _compare_one(analise_id: int, vaga_titulo: str, vaga_descricao: str, config: OllamaConfig) -> dict[str, Any]:
+    inputs = _candidate_inputs(analise_id)
+    return _comparison(inputs, vaga_titulo, vaga_descricao, _single_run(inputs, vaga_titulo, vaga_descricao, config))
+
+
+def _compare_group(
+    analise_ids: list[int],
+    vaga_titulo: str,
+    vaga_descricao: str,
+    config: OllamaConfig,
+) -> dict[int, dict[str, Any] | Exception]:
+    outcomes: dict[int, dict[str, Any] | Exception] = {}
+    inputs: dict[int, dict[str, Any]] = {}
+    for analise_id in analise_ids:
+        try:
+            inputs[analise_id] = _candidate_inputs(analise_id)
+        except Exception as exc:
+            outcomes[analise_id] = exc
+    try:
+        batched = run_batched_synthesis(
+            list(inputs.values()), vaga_titulo or "Vaga sem título", vaga_descricao, config
+        )
+    except BACKEND_ERRORS as exc:
+        outcomes.update((analise_id, exc) for analise_id in inputs)
+        return outcomes
+    except Exception:
+        batched = {}
+    for analise_id, item in inputs.items():
+        try:
+            llm_result = batched.get(analise_id) or _single_run(item, vaga_titulo, vaga_descricao, config)
+            outcomes[analise_id] = _comparison(item, vaga_titulo, vaga_descricao, llm_result)
+        except Exception as exc:
+            outcomes[analise_id] = exc
+    return outcomes
+
+
+def _run_group(
+    analise_ids: list[int],
+    vaga_titulo: str,
+    vaga_descricao: str,
+    config: OllamaConfig,
+) -> dict[int, dict[str, Any] | Exception]:
+    if config.batched_synthesis and len(analise_ids) > 1:
+        return _compare_group(analise_ids, vaga_titulo, vaga_descricao, config)
+    try:
+        return {analise_ids[0]: _compare_one(analise_ids[0], vaga_titulo, vaga_descricao, config)}
+    except Exception as exc:
+        return {analise_ids[0]: exc}
+
+
+def _applied_item(run: dict[str, Any], analise_id: int, result: dict[str, Any]) -> dict[str, Any]:
+    comparacao = result["comparacao"]
+    item = {
+        "analise_id": analise_id,
+        "final_score": result["final_score"],
+        "payload": {
+            "comparacao": comparacao,
+            "final_score": result["final_score"],
+            "llm_result": result["llm_result"],
+            "vaga_titulo": run["vaga_titulo"],
+            "vaga_descricao": run["vaga_descricao"],
+        },
+    }
+    if run["save_history"]:
+        item["comparacao_row"] = {
+            "analise_id": analise_id,
+            "vaga_titulo": comparacao["vaga_titulo"],
+            "vaga_descricao": run["vaga_descricao"],
+            "compat": comparacao["compat"],
+            "semantic_fit": comparacao["semantic_fit"],
+            "presentes": comparacao["presentes"],
+            "ausentes": comparacao["ausentes"],
+            "lacunas": comparacao["lacunas"],
+            "recomendacoes": comparacao["recomendacoes"],
+        }
+    return item
+
+
+def _apply_checkpointed(run: dict[str, Any]) -> None:
+    pending = [
+        _applied_item(run, item["analise_id"], json.loads(item["result_json"]))
+        for item in fetch_batch_items(run["id"], status="done")
+        if not item["applied"]
+    ]
+    for start in range(0, len(pending), BATCH_APPLY_SIZE):
+        apply_batch_items(run["id"], pending[start : start + BATCH_APPLY_SIZE])
+
+
+def _run_claimed(
+    run: dict[str, Any],
+    owner: str,
+    concurrency: int,
+    on_progress: Callable[[dict[str, Any]], None] | None,
+) -> None:
+    batch_id = run["id"]
+    config = OllamaConfig(**json.loads(run["config_json"]))
+    _apply_checkpointed(run)
+    todo = [
+        item["analise_id"]
+        for item in fetch_batch_items(batch_id)
+        if item["status"] in {"pending", "failed"}
+    ]
+
+    group_size = BATCH_MAX_CANDIDATES if config.batched_synthesis else 1
+    groups = [todo[start : start + group_size] for start in range(0, len(todo), group_size)]
+    ready: list[dict[str, Any]] = []
+    pool = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix=f"batch-{batch_id}")
+    try:
+        futures = [
+            pool.submit(_run_group, group, run["vaga_titulo"], run["vaga_descricao"], config) for group in groups
+        ]
+        for future in as_completed(futures):
+            for analise_id, result in future.result().items():
+                if isinstance(result, Exception):
+                    checkpoint_batch_item(batch_id, analise_id, owner, "failed", error=str(result))
+                    continue
+                checkpoint_batch_item(
+                    batch_id,
+                    analise_id,
+                    owner,
+                    "done",
+                    result_json=json.dumps(result, ensure_ascii=False, default=str),
+                )
+                ready.append(_applied_item(run, analise_id, result))
+                if len(ready) >= BATCH_APPLY_SIZE:
+                    apply_batch_items(batch_id, ready)
+                    ready = []
+            if on_progress is not None:
+                on_progress(fetch_batch_run(batch_id))
+        apply_batch_items(batch_id, ready)
+    except BaseException:
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise
+    pool.shutdown()
+
+
+def run_batch(
+    batch_id: int,
+    concurrency: int = BATCH_CONCURRENCY,
+    on_progress: Callable[[dict[str, Any]], None] | None = None,
+) -> dict[str, Any]:
+    run = fetch_batch_run(batch_id)
+    if run is None:
+        raise ValueError(f"Lote {batch_id} não encontrado.")
+    owner = f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+    if not claim_batch_run(batch_id, owner, BATCH_STALE_SECONDS):
+        raise RuntimeError(f"Lote {batch_id} já está em execução em outro processo.")
+
+    try:
+        _run_claimed(run, owner, concurrency, on_progress)
+    except Exception as exc:
+        finish_batch_run(batch_id, owner, "failed", error=f"{type(exc).__name__}: {exc}")
+        raise
+    except BaseException:
+        finish_batch_run(batch_id, owner, "interrupted")
+        raise
+
+    summary = fetch_batch_run(batch_id)
+    finish_batch_run(batch_id, owner, "done" if not summary["items"]["failed"] else "partial")
+    return fetch_batch_run(batch_id)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Gera recomendações de IA para vários candidatos contra uma vaga.")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--ids", help="IDs das análises separados por vírgula.")
+    target.add_argument("--top", type=int, help="Usa as N análises com maior score.")
+    target.add_argument("--resume", type=int, metavar="BATCH_ID", help="Retoma um lote interrompido.")
+    parser.add_argument("--vaga-titulo", default="")
+    parser.add_argument("--vaga-descricao", help="Descrição da vaga (ou @arquivo.txt).")
+    parser.add_argument("--model", default=OllamaConfig.model)
+    parser.add_argument("--planning-model", default=OllamaConfig.planning_model, help="Modelo menor para o planejamento.")
+    parser.add_argument("--base-url", default=OllamaConfig.base_url)
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY)
+    parser.add_argument("--no-history", action="store_true", help="Não grava o resultado em comparacoes.")
+    parser.add_argument(
+        "--batched",
+        action="store_true",
+        help="Sintetiza vários candidatos por chamada ao Ollama (reexecuta um a um se falhar).",
+    )
+    args = parser.parse_args()
+
+    init_db()
+    if args.resume:
+        batch_id = args.resume
+    else:
+        descricao = args.vaga_descricao or ""
+        if descricao.startswith("@"):
+            with open(descricao[1:], encoding="utf-8") as fh:
+                descricao = fh.read()
+        ids = [int(part) for part in args.ids.split(",") if part.strip()] if args.ids else top_analise_ids(args.top)
+        batch_id = create_batch(
+            ids,
+            args.vaga_titulo,
+            descricao,
+            OllamaConfig(
+                model=args.model,
+                base_url=args.base_url,
+                planning_model=args.planning_model,
+                batched_synthesis=args.batched,
+            ),
+            save_history=not args.no_history,
+        )
+        print(f"Lote {batch_id} criado com {len(ids)} análises.")
+
+    def _progress(run: dict[str, Any]) -> None:
+        items = run["items"]
+        print(f"Lote {batch_id}: {items['done']}/{run['total']} concluídas, {items['failed']} com falha.", flush=True)
+
+    try:
+        summary = run_batch(batch_id, args.concurrency, on_progress=_progress)
+    except Exception as exc:
+        print(f"Lote {batch_id} falhou: {type(exc).__name__}: {exc}", file=sys.stderr)
+        raise SystemExit(1) from exc
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
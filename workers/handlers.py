@@ -0,0 +1,83 @@
+"""Persist finished agent runs according to the job kind."""
+
+from __future__ import annotations
+
+from typing import Any, Callable
+
+from core.constants import STATUS_CONCLUIDA
+from core.db import insert_comparacao, update_analise, update_analise_ai_payload, update_analise_ai_sections
+from core.logic import compare_with_job, consolidate_comparison
+
+
+def _save_section(analise_id: int, agent: dict[str, Any], target: dict[str, Any], llm_result: dict) -> dict:
+    update_analise_ai_sections(
+        analise_id=analise_id,
+        section_keys=target.get("section_keys") or [target["section_key"]],
+        llm_result=llm_result,
+        job_description=agent["job_description"],
+    )
+    return {"llm_result": llm_result}
+
+
+def _save_report(analise_id: int, agent: dict[str, Any], target: dict[str, Any], llm_result: dict) -> dict:
+    update_analise_ai_payload(
+        analise_id,
+        "report",
+        {"llm_result": llm_result, "job_description": agent["job_description"]},
+    )
+    return {"llm_result": llm_result}
+
+
+def _save_comparison_llm(analise_id: int, agent: dict[str, Any], target: dict[str, Any], llm_result: dict) -> dict:
+    update_analise_ai_payload(
+        analise_id,
+        "comparison",
+        {
+            "llm_result": llm_result,
+            "vaga_titulo": target.get("vaga_titulo", ""),
+            "vaga_descricao": agent["job_description"],
+        },
+    )
+    return {"llm_result": llm_result}
+
+
+def _save_comparison(analise_id: int, agent: dict[str, Any], target: dict[str, Any], llm_result: dict) -> dict:
+    vaga_titulo = target.get("vaga_titulo", "")
+    vaga_descricao = agent["job_description"]
+    resultado = compare_with_job(vaga_descricao, agent["resume_skills"])
+    final = llm_result.get("final", {})
+    comparacao, final_score = consolidate_comparison(resultado, final, agent["section_metrics"], vaga_titulo)
+
+    update_analise(analise_id, STATUS_CONCLUIDA, final_score)
+    update_analise_ai_payload(
+        analise_id,
+        "comparison",
+        {
+            "comparacao": comparacao,
+            "final_score": final_score,
+            "llm_result": llm_result,
+            "vaga_titulo": vaga_titulo,
+            "vaga_descricao": vaga_descricao,
+        },
+    )
+    if target.get("save_history", True):
+        insert_comparacao(
+            analise_id=analise_id,
+            vaga_titulo=vaga_titulo or "Vaga sem título",
+            vaga_descricao=vaga_descricao,
+            compat=resultado["compat"],
+            semantic_fit=comparacao["semantic_fit"],
+            presentes=resultado["presentes"],
+            ausentes=resultado["ausentes"],
+            lacunas=comparacao["lacunas"],
+            recomendacoes=comparacao["recomendacoes"],
+        )
+    return {"llm_result": llm_result, "comparacao": comparacao, "final_score": final_score}
+
+
+JOB_HANDLERS: dict[str, Callable[[int, dict[str, Any], dict[str, Any], dict], dict]] = {
+    "section": _save_section,
+    "report": _save_report,
+    "comparison_llm": _save_comparison_llm,
+    "comparison": _save_comparison,
+}
@@ -0,0 +1,140 @@
+"""Worker processes that drain the persistent LLM job queue."""
+
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+import os
+import socket
+import threading
+import time
+
+from agents.ollama_agent import OllamaConfig, run_resume_agent_stream
+from agents.warmup import start_warmup_scheduler, stop_warmup_scheduler
+from agents.resilience import CircuitOpen, OllamaUnavailable, backoff_delay
+from core.db import claim_llm_job, finish_llm_job, heartbeat_llm_job, init_db, requeue_llm_job
+from workers.handlers import JOB_HANDLERS
+from workers.queue import Job, job_from_row
+
+WORKER_PROCESSES = int(os.getenv("LLM_WORKERS", "2"))
+EMBEDDED_WORKERS = os.getenv("LLM_EMBEDDED_WORKERS", "0") == "1"
+POLL_SECONDS = 1.0
+HEARTBEAT_SECONDS = 10.0
+STALE_SECONDS = 60.0
+MAX_JOB_ATTEMPTS = 3
+PARTIAL_FLUSH_SECONDS = 0.5
+STREAMED_STAGES = ("final", "section")
+
+
+def _worker_name() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+
+def _run_agent(job: Job, worker: str) -> dict:
+    config = OllamaConfig(**job.payload["config"])
+    result: dict = {}
+    streamed = ""
+    flushed_at = 0.0
+    for event in run_resume_agent_stream(**job.payload["agent"], config=config, analise_id=job.analise_id):
+        if event["event"] == "status":
+            heartbeat_llm_job(job.id, worker, event.get("stage"))
+        elif event["event"] == "token" and event.get("stage") in STREAMED_STAGES:
+            streamed += event.get("content", "")
+            if time.monotonic() - flushed_at >= PARTIAL_FLUSH_SECONDS:
+                heartbeat_llm_job(job.id, worker, partial_text=streamed)
+                flushed_at = time.monotonic()
+        elif event["event"] == "done":
+            result = event.get("result") or {}
+    return result
+
+
+def execute_job(job: Job, worker: str) -> None:
+    stopped = threading.Event()
+
+    def _beat() -> None:
+        while not stopped.wait(HEARTBEAT_SECONDS):
+            heartbeat_llm_job(job.id, worker)
+
+    threading.Thread(target=_beat, name=f"llm-job-{job.id}-heartbeat", daemon=True).start()
+    try:
+        llm_result = _run_agent(job, worker)
+        stored = JOB_HANDLERS[job.kind](job.analise_id, job.payload["agent"], job.payload["target"], llm_result)
+    except CircuitOpen as exc:
+        requeue_llm_job(job.id, worker, time.time() + exc.retry_after, str(exc))
+    except OllamaUnavailable as exc:
+        if exc.retryable and job.attempts < MAX_JOB_ATTEMPTS:
+            requeue_llm_job(job.id, worker, time.time() + backoff_delay(job.attempts + 2), str(exc))
+        else:
+            finish_llm_job(job.id, worker, "failed", error=str(exc))
+    except Exception as exc:
+        finish_llm_job(job.id, worker, "failed", error=str(exc))
+    else:
+        finish_llm_job(job.id, worker, "done", result_json=json.dumps(stored, ensure_ascii=False, default=str))
+    finally:
+        stopped.set()
+
+
+def run_worker(stop_event: threading.Event | None = None, once: bool = False) -> int:
+    init_db()
+    worker = _worker_name()
+    processed = 0
+    while stop_event is None or not stop_event.is_set():
+        row = claim_llm_job(worker, STALE_SECONDS)
+        if row is None:
+            if once:
+                break
+            time.sleep(POLL_SECONDS)
+            continue
+        execute_job(job_from_row(row), worker)
+        processed += 1
+    return processed
+
+
+_pool: list[multiprocessing.Process] = []
+_pool_lock = threading.Lock()
+
+
+def start_worker_pool(processes: int = WORKER_PROCESSES) -> list[multiprocessing.Process]:
+    with _pool_lock:
+        _pool[:] = [proc for proc in _pool if proc.is_alive()]
+        ctx = multiprocessing.get_context("spawn")
+        while len(_pool) < processes:
+            proc = ctx.Process(target=run_worker, name=f"llm-worker-{len(_pool)}", daemon=True)
+            proc.start()
+            _pool.append(proc)
+        return list(_pool)
+
+
+def stop_worker_pool(timeout: float = 5.0) -> None:
+    with _pool_lock:
+        for proc in _pool:
+            proc.terminate()
+        for proc in _pool:
+            proc.join(timeout)
+        _pool.clear()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Processa a fila persistente de análises com LLM.")
+    parser.add_argument("--processes", type=int, default=max(1, WORKER_PROCESSES))
+    parser.add_argument("--once", action="store_true", help="Encerra quando a fila estiver vazia.")
+    args = parser.parse_args()
+
+    if args.once:
+        print(f"{run_worker(once=True)} jobs processados.")
+        return
+    init_db()
+    start_warmup_scheduler()
+    procs = start_worker_pool(args.processes)
+    print(f"{len(procs)} workers processando a fila de LLM.")
+    try:
+        for proc in procs:
+            proc.join()
+    except KeyboardInterrupt:
+        stop_worker_pool()
+        stop_warmup_scheduler()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Persistent SQLite queue of LLM agent jobs."""
+
+from __future__ import annotations
+
+import hashlib
+import json
+from dataclasses import asdict, dataclass, field
+from typing import Any
+
+from agents.ollama_agent import OllamaConfig, with_deadline
+from core.db import fetch_llm_job, fetch_llm_job_counts, fetch_llm_jobs, insert_llm_job
+
+JOB_KINDS = ("section", "report", "comparison_llm", "comparison")
+JOB_STATUS_LABELS = {
+    "queued": "Na fila",
+    "running": "Em execução",
+    "done": "Concluído",
+    "failed": "Falhou",
+}
+
+
+@dataclass
+class Job:
+    id: int
+    kind: str
+    status: str
+    analise_id: int | None
+    priority: str
+    stage: str | None = None
+    payload: dict[str, Any] = field(default_factory=dict)
+    result: dict[str, Any] | None = None
+    error: str | None = None
+    attempts: int = 0
+    created_at: float = 0.0
+    started_at: float | None = None
+    finished_at: float | None = None
+    partial_text: str | None = None
+
+    @property
+    def active(self) -> bool:
+        return self.status in {"queued", "running"}
+
+    def to_dict(self) -> dict[str, Any]:
+        return asdict(self)
+
+
+def job_from_row(row: dict[str, Any]) -> Job:
+    return Job(
+        id=row["id"],
+        kind=row["kind"],
+        status=row["status"],
+        analise_id=row["analise_id"],
+        priority=row["priority"],
+        stage=row["stage"],
+        payload=json.loads(row["payload_json"] or "{}"),
+        result=json.loads(row["result_json"]) if row["result_json"] else None,
+        error=row["error"],
+        attempts=row["attempts"],
+        created_at=row["created_at"],
+        started_at=row["started_at"],
+        finished_at=row["finished_at"],
+        partial_text=row["partial_text"],
+    )
+
+
+def submit_job(
+    kind: str,
+    *,
+    agent_kwargs: dict[str, Any],
+    config: OllamaConfig,
+    analise_id: int | None = None,
+    target: dict[str, Any] | None = None,
+) -> Job:
+    if kind not in JOB_KINDS:
+        raise ValueError(f"Tipo de job desconhecido: {kind!r}.")
+    if analise_id is None:
+        raise ValueError("Informe a análise à qual o job pertence.")
+    payload = {"agent": agent_kwargs, "config": asdict(config), "target": target or {}}
+    payload_json = json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str)
+    dedupe_key = hashlib.sha256(f"{kind}|{analise_id}|{payload_json}".encode("utf-8")).hexdigest()
+    payload["config"] = asdict(with_deadline(config))
+    payload_json = json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str)
+    job_id, _ = insert_llm_job(kind, analise_id, config.priority, dedupe_key, payload_json)
+    return get_job(job_id)
+
+
+def get_job(job_id: int) -> Job | None:
+    row = fetch_llm_job(job_id)
+    return job_from_row(row) if row else None
+
+
+def list_jobs(analise_id: int | None = None, status: str | None = None, limit: int = 50) -> list[Job]:
+    return [job_from_row(row) for row in fetch_llm_jobs(analise_id=analise_id, status=status, limit=limit)]
+
+
+def queue_snapshot() -> dict[str, int]:
+    counts = fetch_llm_job_counts()
+    return {status: counts.get(status, 0) for status in JOB_STATUS_LABELS}